@@ -0,0 +1,487 @@
+"""
+WebSphere Servlet Cache Policy Generator (Jython/Python)
+Reads the HTTP access logs of the web server tier (NCSA common or combined
+format, as IBM HTTP Server writes for webserver1) and proposes the servlet
+cache entries of a cachespec.xml for the dynamic cache that
+websphere_performance_tuning.py sizes.
+
+Only successful GET requests under the application's context root count;
+static files (cachespec.static.extensions) are left to the web server. Each
+URI is ranked by the requests the cache could answer:
+    requests        successful GET requests for the URI
+    variants        distinct parameter values requested, the cache entries
+    repeat rate     share of requests for a variant requested before, the
+                    hit rate an unbounded cache would reach
+    response size   mean bytes per response, the memory per entry
+
+A URI with enough requests and repeats becomes a cache entry whose cache-id
+holds its parameters; parameters sent with every request are required. The
+timeout lets a variant that is requested at the URI's typical rate on one
+cluster member be hit cachespec.timeout.target percent of the time, within
+cachespec.timeout.min and cachespec.timeout.max. The number of entries each
+member then holds is estimated from the request rate of every variant and
+can be written as tuning.cache.memory.entries (memoryCacheSizeInEntries) in
+a properties file that websphere_performance_tuning.py and
+websphere_config_apply.py read with -recommendations.
+
+The logs are streamed line by line and the variants kept per URI are
+capped, so logs of any size are analyzed in bounded memory; rotated logs
+may be gzip compressed. The generated cachespec.xml belongs in the WEB-INF
+directory of the web module at the context root. Review it before
+deploying: the access log does not show whether a response differs by user,
+cookie or header.
+
+Usage:
+    python websphere_cachespec_generator.py [access_log ...] [-contextroot path] [-members n] [-top n] [-output cachespec.xml] [-recommendations file]
+"""
+
+# Import required modules
+import sys
+import os
+import re
+import io
+import math
+import time
+import calendar
+
+try:
+    import gzip
+except ImportError:
+    gzip = None
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_env_config as envConfig
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+accessLogFile = env.get("cachespec.access.log")
+contextRoot = env.get("app.context.root")
+clusterMembers = len(env.getList("cluster.members"))
+minimumRequests = env.getInt("cachespec.min.requests")       # Requests a URI needs to be cached
+minimumRepeatRate = env.getInt("cachespec.min.repeat.rate")  # Percent of requests that repeat a variant
+timeoutTarget = env.getInt("cachespec.timeout.target")       # Percent of a variant's requests its timeout should hit
+minimumTimeout = env.getInt("cachespec.timeout.min")         # Seconds
+maximumTimeout = env.getInt("cachespec.timeout.max")         # Seconds; the longest a response may be stale
+ignoredParameters = env.getList("cachespec.ignore.parameters")
+staticExtensions = env.getList("cachespec.static.extensions")
+sizingHeadroom = float(env.get("cachespec.headroom"))
+currentEntries = env.getInt("tuning.cache.memory.entries")
+
+# Memory bounds
+maxUris = 20000       # URIs tracked, and paths remembered; requests for further URIs are counted only
+maxVariants = 20000   # Variants tracked per URI; further ones are counted as requested once
+entryStep = 100       # Cache entry counts are rounded to this
+
+# host ident user [time] "method uri protocol" status bytes ...
+logPattern = re.compile(r'^\S+ \S+ (\S+) \[([^\]]+)\] "(\S+) (\S+)[^"]*" (\d{3}) (\d+|-)')
+
+# Path segments that are IDs rather than resources: numbers, long hex strings and UUIDs
+idSegmentPattern = re.compile(r"^(\d+|[0-9a-fA-F]{16,}|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27})$")
+
+monthNumbers = {"Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+                "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12}
+
+class UriStatistics:
+    """Requests for one URI: its variants, parameters and response sizes"""
+    def __init__(self, path, hasIds):
+        self.path = path
+        self.hasIds = hasIds
+        self.requests = 0
+        self.bytes = 0
+        self.authenticated = 0
+        self.variants = {}        # Sorted name=value query (after the path, for paths with IDs): requests
+        self.untracked = 0        # Requests for variants beyond maxVariants
+
+class AccessStatistics:
+    """Totals over every log and the URIs under the context root"""
+    def __init__(self):
+        self.lines = 0
+        self.unparsed = 0
+        self.skipped = {"method": 0, "status": 0, "static": 0, "outside": 0, "overflow": 0}
+        self.uris = {}
+        self.first = None
+        self.last = None
+        self.files = 0
+        self.dayCache = {}
+
+class Candidate:
+    """A URI evaluated as a cache entry"""
+    def __init__(self, uri):
+        self.uri = uri
+        self.distinct = 0
+        self.repeatRate = 0.0
+        self.meanSize = 0.0
+        self.timeout = 0
+        self.hits = 0.0
+        self.entries = 0.0
+        self.memory = 0.0
+        self.components = []      # [name, required]
+        self.signatures = {}      # Comma-joined parameter names: requests
+        self.notes = []
+        self.rejected = None      # Why the URI is not cached
+
+def openLog(path):
+    """Open an access log, uncompressing .gz files, for reading lines of text"""
+    if path.endswith(".gz"):
+        if gzip is None:
+            raise IOError("No gzip module to read %s" % path)
+        stream = gzip.open(path, "rb")
+    else:
+        stream = open(path, "rb")
+    if sys.version_info[0] >= 3:
+        # Request lines are ASCII; anything else is read as it is, not decoded
+        stream = io.TextIOWrapper(stream, encoding="latin-1")
+    return stream
+
+def parseTime(text, dayCache):
+    """Return epoch seconds for an access log time such as 10/Oct/2024:13:55:36 -0700, or None"""
+    day = text[:11]
+    if day not in dayCache:
+        try:
+            dayCache[day] = calendar.timegm((int(day[7:11]), monthNumbers[day[3:6]], int(day[:2]), 0, 0, 0, 0, 0, 0))
+        except (ValueError, KeyError):
+            dayCache[day] = None
+    if dayCache[day] is None:
+        return None
+    try:
+        return dayCache[day] + int(text[12:14]) * 3600 + int(text[15:17]) * 60 + int(text[18:20])
+    except ValueError:
+        return None
+
+def classifyPath(path, root):
+    """Return [URI below the context root with IDs replaced by {id}, true if it had IDs], or None to skip the path"""
+    if root:
+        if path != root and not path.startswith(root + "/"):
+            return None
+        path = path[len(root):] or "/"
+    if ";" in path:
+        path = path.split(";")[0]
+    name = path.rsplit("/", 1)[-1]
+    if "." in name and name.rsplit(".", 1)[1].lower() in staticExtensions:
+        return ["", False]
+    hasIds = False
+    segments = path.split("/")
+    for index in range(len(segments)):
+        if segments[index] and idSegmentPattern.match(segments[index]):
+            segments[index] = "{id}"
+            hasIds = True
+    if hasIds:
+        path = "/".join(segments)
+    return [path, hasIds]
+
+def getVariant(query):
+    """Return the query as sorted name=value pairs without the ignored parameters"""
+    if not query:
+        return ""
+    pairs = [pair for pair in query.split("&") if pair and pair.split("=", 1)[0] not in ignoredParameters]
+    pairs.sort()
+    return "&".join(pairs)
+
+def analyzeFile(path, stats, root):
+    """Add the requests of one access log to stats"""
+    # Paths repeat far more often than they differ, so each is classified once
+    paths = {}
+    firstTime = None
+    lastTime = None
+    logIn = openLog(path)
+    try:
+        for line in logIn:
+            stats.lines = stats.lines + 1
+            match = logPattern.match(line)
+            if match is None:
+                stats.unparsed = stats.unparsed + 1
+                continue
+            user, lastTime, method, target, status, size = match.groups()
+            if firstTime is None:
+                firstTime = lastTime
+            if method != "GET":
+                stats.skipped["method"] = stats.skipped["method"] + 1
+                continue
+            if status != "200":
+                stats.skipped["status"] = stats.skipped["status"] + 1
+                continue
+            
+            requestPath, separator, query = target.partition("?")
+            classified = paths.get(requestPath)
+            if classified is None:
+                if len(paths) >= maxUris:
+                    paths.clear()
+                classified = paths[requestPath] = classifyPath(requestPath, root) or [None, False]
+            relative, hasIds = classified
+            if relative is None:
+                stats.skipped["outside"] = stats.skipped["outside"] + 1
+                continue
+            if not relative:
+                stats.skipped["static"] = stats.skipped["static"] + 1
+                continue
+            
+            uri = stats.uris.get(relative)
+            if uri is None:
+                if len(stats.uris) >= maxUris:
+                    stats.skipped["overflow"] = stats.skipped["overflow"] + 1
+                    continue
+                uri = stats.uris[relative] = UriStatistics(relative, hasIds)
+            uri.requests = uri.requests + 1
+            if size != "-":
+                uri.bytes = uri.bytes + int(size)
+            if user != "-":
+                uri.authenticated = uri.authenticated + 1
+            
+            # A path with IDs is a different response for every ID
+            variant = getVariant(query)
+            if hasIds:
+                variant = requestPath + "?" + variant
+            if variant in uri.variants:
+                uri.variants[variant] = uri.variants[variant] + 1
+            elif len(uri.variants) < maxVariants:
+                uri.variants[variant] = 1
+            else:
+                uri.untracked = uri.untracked + 1
+    finally:
+        logIn.close()
+    
+    # Lines are written in time order, so the first and last give the span
+    for text in [firstTime, lastTime]:
+        seconds = text and parseTime(text, stats.dayCache)
+        if seconds:
+            if stats.first is None or seconds < stats.first:
+                stats.first = seconds
+            if stats.last is None or seconds > stats.last:
+                stats.last = seconds
+    stats.files = stats.files + 1
+
+def getParameters(uri):
+    """Return [{name: [requests carrying it, distinct values]}, {comma-joined names: requests}] from a URI's variants"""
+    parameters = {}
+    signatures = {}
+    for variant, count in uri.variants.items():
+        names = []
+        for pair in variant.split("?")[-1].split("&"):
+            if not pair:
+                continue
+            name, separator, value = pair.partition("=")
+            parameter = parameters.get(name)
+            if parameter is None:
+                parameter = parameters[name] = [0, {}]
+            parameter[0] = parameter[0] + count
+            parameter[1][value] = 1
+            if name not in names:
+                names.append(name)
+        signature = ",".join(names)
+        signatures[signature] = signatures.get(signature, 0) + count
+    for name in parameters.keys():
+        parameters[name][1] = len(parameters[name][1])
+    return [parameters, signatures]
+
+def evaluate(uri, duration, members):
+    """Return the Candidate for a URI: its timeout, expected hits and cache entries per member"""
+    candidate = Candidate(uri)
+    counts = list(uri.variants.values())
+    candidate.distinct = len(counts) + uri.untracked
+    candidate.repeatRate = (uri.requests - candidate.distinct) * 100.0 / uri.requests
+    candidate.meanSize = uri.bytes / float(uri.requests)
+    
+    # The time between requests for the same variant on one member, at the
+    # median of the repeated requests; with requests arriving at random, a
+    # timeout of k intervals is hit k / (k + 1) of the time
+    repeated = [count for count in counts if count > 1]
+    repeated.sort()
+    repeated.reverse()
+    interval = float(duration * members)
+    remaining = sum(repeated) / 2.0
+    for count in repeated:
+        remaining = remaining - count
+        if remaining <= 0:
+            interval = duration * members / float(count)
+            break
+    share = min(timeoutTarget, 99) / 100.0
+    candidate.timeout = int(min(max(interval * share / (1 - share), minimumTimeout), maximumTimeout))
+    
+    # Each variant is held by a member for the share of time it is cached
+    # and misses once per timeout, at least on its first request; untracked
+    # variants were requested once
+    for count in counts:
+        requestsPerTimeout = count / float(duration * members) * candidate.timeout
+        candidate.entries = candidate.entries + (1 - math.exp(-requestsPerTimeout))
+        candidate.hits = candidate.hits + count - max(count / (1 + requestsPerTimeout), 1)
+    candidate.entries = candidate.entries + uri.untracked * (1 - math.exp(-candidate.timeout / float(duration * members)))
+    candidate.memory = candidate.entries * candidate.meanSize
+    
+    # Variants beyond maxVariants are not seen, so a parameter is required
+    # only if every tracked request carried it
+    parameters, candidate.signatures = getParameters(uri)
+    names = list(parameters.keys())
+    names.sort()
+    for name in names:
+        requests, values = parameters[name]
+        candidate.components.append([name, requests == uri.requests - uri.untracked])
+        if requests >= 20 and (uri.untracked or values >= 0.9 * requests):
+            candidate.notes.append("Parameter %s has a new value on nearly every request; if it only defeats caching, add it to cachespec.ignore.parameters" % name)
+    if uri.authenticated:
+        candidate.notes.append("%.0f%% of the requests are authenticated; check that the response does not differ by user" % (uri.authenticated * 100.0 / uri.requests))
+    
+    if uri.hasIds:
+        candidate.rejected = "path contains IDs; cache it by pathInfo in the servlet's own entry"
+    elif uri.requests < minimumRequests:
+        candidate.rejected = "fewer than %d requests" % minimumRequests
+    elif candidate.repeatRate < minimumRepeatRate:
+        candidate.rejected = "repeat rate below %d%%" % minimumRepeatRate
+    return candidate
+
+def rankCandidates(stats, members):
+    """Return the Candidates of every URI, most expected hits first"""
+    duration = max((stats.last or 0) - (stats.first or 0), 1)
+    candidates = [evaluate(uri, duration, members) for uri in stats.uris.values()]
+    candidates.sort(key=lambda candidate: (-candidate.hits, candidate.uri.path))
+    return candidates
+
+def getCacheSize(candidates):
+    """Return [entries, bytes] per member for the accepted candidates, and the memoryCacheSizeInEntries to set"""
+    entries = 0.0
+    memory = 0.0
+    for candidate in candidates:
+        if candidate.rejected is None:
+            entries = entries + candidate.entries
+            memory = memory + candidate.memory
+    recommended = int(math.ceil(entries * sizingHeadroom / entryStep)) * entryStep
+    return [entries, memory, max(recommended, entryStep)]
+
+def formatSignatures(candidate):
+    """Return the parameter combinations of a URI with their share of its requests"""
+    uri = candidate.uri
+    signatures = list(candidate.signatures.items())
+    signatures.sort(key=lambda item: -item[1])
+    tracked = max(uri.requests - uri.untracked, 1)
+    return ", ".join(["%s %.0f%%" % (names or "(none)", count * 100.0 / tracked) for names, count in signatures[:5]])
+
+def printRanking(stats, candidates, top, root, members):
+    """Print the request totals, the ranked URIs and the cache size estimate"""
+    duration = max((stats.last or 0) - (stats.first or 0), 0)
+    print("Analyzed %d line(s) in %d file(s) covering %.1f hours under %s" % (stats.lines, stats.files, duration / 3600.0, root or "/"))
+    print("  Skipped: %d not GET, %d not 200, %d static, %d outside the context root, %d unparsed, %d beyond %d URIs" % (
+          stats.skipped["method"], stats.skipped["status"], stats.skipped["static"], stats.skipped["outside"],
+          stats.unparsed, stats.skipped["overflow"], maxUris))
+    print("")
+    print("  %-40s %9s %9s %7s %9s %9s %8s %9s" % ("URI", "Requests", "Variants", "Repeat", "Mean KB", "Hits", "Timeout", "Entries"))
+    for candidate in candidates[:top]:
+        uri = candidate.uri
+        print("  %-40s %9d %9d %6.1f%% %9.1f %9d %7ds %9d" % (uri.path, uri.requests, candidate.distinct, candidate.repeatRate,
+              candidate.meanSize / 1024, candidate.hits, candidate.timeout, math.ceil(candidate.entries)))
+        print("      parameters: %s" % formatSignatures(candidate))
+        if candidate.rejected:
+            print("      not cached: %s" % candidate.rejected)
+        for note in candidate.notes:
+            print("      %s" % note)
+    
+    accepted = [candidate for candidate in candidates if candidate.rejected is None]
+    requests = 0
+    for uri in stats.uris.values():
+        requests = requests + uri.requests
+    hits = 0.0
+    for candidate in accepted:
+        hits = hits + candidate.hits
+    entries, memory, recommended = getCacheSize(candidates)
+    print("")
+    print("%d cache entr%s expected to answer %.1f%% of %d dynamic request(s) with %d member(s)" % (
+          len(accepted), len(accepted) == 1 and "y" or "ies", requests and hits * 100.0 / requests or 0, requests, members))
+    print("Cache size per member: %d entries, %.1f MB; memoryCacheSizeInEntries %d (currently %d)" % (
+          math.ceil(entries), memory / (1024 * 1024), recommended, currentEntries))
+
+def escapeXml(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+def writeCacheSpec(candidates, output, description):
+    """Write the accepted candidates as servlet cache entries of a cachespec.xml"""
+    out = open(output, "w")
+    try:
+        out.write('<?xml version="1.0" ?>\n')
+        out.write('<!DOCTYPE cache SYSTEM "cachespec.dtd">\n')
+        out.write("<!-- Generated by websphere_cachespec_generator.py: %s -->\n" % escapeXml(description).replace("--", "- -"))
+        out.write("<cache>\n")
+        for candidate in candidates:
+            if candidate.rejected is not None:
+                continue
+            uri = candidate.uri
+            out.write("    <!-- %d requests, %d variants, %.1f%% repeated, %.1f KB per response -->\n" % (
+                      uri.requests, candidate.distinct, candidate.repeatRate, candidate.meanSize / 1024))
+            for note in candidate.notes:
+                out.write("    <!-- %s -->\n" % escapeXml(note).replace("--", "- -"))
+            out.write("    <cache-entry>\n")
+            out.write("        <class>servlet</class>\n")
+            out.write("        <name>%s</name>\n" % escapeXml(uri.path))
+            out.write("        <cache-id>\n")
+            for name, required in candidate.components:
+                out.write('            <component id="%s" type="parameter">\n' % escapeXml(name))
+                out.write("                <required>%s</required>\n" % (required and "true" or "false"))
+                out.write("            </component>\n")
+            out.write("            <timeout>%d</timeout>\n" % candidate.timeout)
+            out.write("        </cache-id>\n")
+            out.write("    </cache-entry>\n")
+        out.write("</cache>\n")
+    finally:
+        out.close()
+
+def writeRecommendations(path, recommended, entries, memory, description):
+    """Write the cache size as a properties file for -recommendations"""
+    out = open(path, "w")
+    try:
+        out.write("# Dynamic cache size from websphere_cachespec_generator.py\n")
+        out.write("# %s\n" % description)
+        out.write("# Estimated %d entries, %.1f MB per member\n" % (math.ceil(entries), memory / (1024 * 1024)))
+        out.write("tuning.cache.memory.entries=%d\n" % recommended)
+    finally:
+        out.close()
+
+# Main execution
+if __name__ == "__main__":
+    options = sys.argv[1:]
+    if "-help" in options:
+        print("Usage: %s [access_log ...] [-contextroot path] [-members n] [-top n] [-output cachespec.xml] [-recommendations file]" % sys.argv[0])
+        print("  access_log       - NCSA access logs, oldest first; .gz files are read compressed (default %s)" % accessLogFile)
+        print("  -contextroot     - Context root of the web module (default %s)" % contextRoot)
+        print("  -members         - Cluster members sharing the requests (default %d)" % clusterMembers)
+        print("  -top             - URIs to print (default 20)")
+        print("  -output          - Write the cache entries as a cachespec.xml")
+        print("  -recommendations - Write memoryCacheSizeInEntries as a properties file for websphere_performance_tuning.py")
+        sys.exit(2)
+    
+    valueOptions = ["-contextroot", "-members", "-top", "-output", "-recommendations"]
+    files = [option for index, option in enumerate(options)
+             if not option.startswith("-") and (index == 0 or options[index - 1] not in valueOptions)]
+    if not files:
+        files = [accessLogFile]
+    root = envConfig.getOption(options, "-contextroot", contextRoot).rstrip("/")
+    members = max(int(envConfig.getOption(options, "-members", clusterMembers)), 1)
+    
+    stats = AccessStatistics()
+    started = time.time()
+    try:
+        for path in files:
+            analyzeFile(path, stats, root)
+    except (IOError, OSError):
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    if not stats.uris:
+        print("ERROR: No successful GET requests under %s in %s" % (root or "/", ", ".join(files)))
+        sys.exit(1)
+    
+    candidates = rankCandidates(stats, members)
+    printRanking(stats, candidates, int(envConfig.getOption(options, "-top", 20)), root, members)
+    print("Analyzed in %.2fs" % (time.time() - started))
+    
+    description = "Source: %s, context root %s, %d member(s), generated %s" % (
+        ", ".join(files), root or "/", members, time.strftime("%Y-%m-%d %H:%M:%S"))
+    output = envConfig.getOption(options, "-output")
+    if output:
+        writeCacheSpec(candidates, output, description)
+        print("Cache policy written to %s; copy it to WEB-INF/cachespec.xml of the web module" % output)
+    recommendations = envConfig.getOption(options, "-recommendations")
+    if recommendations:
+        entries, memory, recommended = getCacheSize(candidates)
+        writeRecommendations(recommendations, recommended, entries, memory, description)
+        print("Cache size written to %s; pass it to websphere_performance_tuning.py with -recommendations" % recommendations)
@@ -0,0 +1,413 @@
+"""
+WebSphere wsadmin Call Tracing (Jython/Python)
+Opt-in instrumentation for the wsadmin scripts. It wraps the AdminConfig,
+AdminControl, AdminTask and AdminApp scripting objects and records every
+call: the method, its arguments with passwords and other secrets redacted,
+its latency, the thread, and the script function that made it.
+
+When the script exits (or, in the command server, when its job ends), the raw trace is written to
+<trace.calls.file>_<script>_<time>.trace, one tab-separated line per call.
+The profile is printed and written beside it as .txt. It shows the slowest
+calls, the calls and time per script function and per method, and the
+duration of every configuration save and node synchronization.
+
+Tracing is off unless the script runs with the -trace argument or the
+WAS_TRACE environment variable is set to anything but 0 or false. When it is
+off, install() leaves the scripting objects untouched.
+
+Usage from a wsadmin script, before the helper modules bind the scripting objects:
+    import websphere_call_trace as callTrace
+    callTrace.install(globals())
+    configCache.bindAdminObjects(globals())
+
+Tracing a run:
+    wsadmin -lang jython -f websphere_performance_tuning.py all -cluster WebCluster01 -sync -trace
+    WAS_TRACE=1 wsadmin -lang jython -f websphere_cluster_management.py start
+
+Standalone (Python or Jython), to print the profile of a saved trace again:
+    python websphere_call_trace.py trace-file [-slowest n]
+"""
+
+# Import required modules
+import sys
+import os
+import re
+import time
+import atexit
+import threading
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_env_config as envConfig
+
+# Scripting objects wrapped by install()
+tracedObjects = ["AdminConfig", "AdminControl", "AdminTask", "AdminApp"]
+
+# AdminControl operations recorded under their own name, e.g. AdminControl.invoke:sync
+invokeMethods = ["invoke", "invoke_jmx"]
+
+# Longest argument text kept per call
+maxArgumentLength = 500
+
+redactedValue = "****"
+traceHeader = "# offset s\tms\tthread\tfunction\tcaller\tcall\toutcome\targuments"
+
+# Trace paths taken by the tracers of this process, which may start in the same second
+usedPaths = []
+
+# Tracers whose trace is not written yet; one exit handler finishes them all
+activeTracers = []
+
+
+def isEnabled(arguments=None):
+    """Return true if tracing was asked for with -trace or WAS_TRACE"""
+    if arguments is None:
+        arguments = sys.argv
+    if "-trace" in arguments:
+        return True
+    return os.environ.get("WAS_TRACE", "").lower() not in ["", "0", "false"]
+
+def install(namespace, env=None):
+    """Wrap the scripting objects in a script's global namespace if tracing is enabled; return the tracer or None"""
+    if not isEnabled():
+        return None
+    if env is None:
+        env = envConfig.loadConfig()
+    scriptName = "wsadmin"
+    if namespace.get("__file__"):
+        scriptName = os.path.splitext(os.path.basename(namespace["__file__"]))[0]
+    tracer = CallTracer(scriptName, env.get("trace.calls.file"), env.getInt("trace.calls.slowest"),
+                        env.getList("trace.calls.redact"))
+    for name in tracedObjects:
+        if name in namespace.keys() and not isinstance(namespace[name], TracedObject):
+            namespace[name] = TracedObject(tracer, name, namespace[name])
+    activeTracers.append(tracer)
+    print("Tracing wsadmin calls to %s" % tracer.tracePath)
+    return tracer
+
+def finishTracers():
+    """Write the trace and profile of every tracer not finished yet, e.g. at the end of a command server job"""
+    for tracer in activeTracers[:]:
+        tracer.finish()
+
+atexit.register(finishTracers)
+
+class TracedObject:
+    """Stand-in for a scripting object that passes every method call through the tracer"""
+    def __init__(self, tracer, name, target):
+        self.tracer = tracer
+        self.name = name
+        self.target = target
+
+    def __getattr__(self, methodName):
+        method = getattr(self.target, methodName)
+        tracer = self.tracer
+        callName = "%s.%s" % (self.name, methodName)
+        def tracedMethod(*arguments):
+            return tracer.call(callName, method, arguments)
+        return tracedMethod
+
+class CallTracer:
+    """Records the calls made through the TracedObjects and writes the trace and profile"""
+    def __init__(self, scriptName, basePath, slowest, secretNames):
+        self.scriptName = scriptName
+        self.slowest = slowest
+        self.secretPattern = re.compile("|".join([re.escape(name) for name in secretNames]) or "(?!)", re.I)
+        self.secretAssignment = re.compile(r"(-?[\w.]*(?:%s)[\w.]*)(\s*=\s*|\s+)(\"[^\"]*\"|'[^']*'|[^\s\]]+)"
+                                           % self.secretPattern.pattern, re.I)
+        self.command = " ".join([scriptName] + [str(argument) for argument in self.redact(list(sys.argv))])
+        self.started = time.time()
+        self.startedText = time.strftime("%Y-%m-%d %H:%M:%S")
+        basePath = "%s_%s_%s" % (os.path.expanduser(basePath), scriptName, time.strftime("%Y%m%d_%H%M%S"))
+        path = basePath
+        run = 1
+        while path in usedPaths or os.path.exists(path + ".trace"):
+            run = run + 1
+            path = "%s_%d" % (basePath, run)
+        usedPaths.append(path)
+        basePath = path
+        self.tracePath = basePath + ".trace"
+        self.profilePath = basePath + ".txt"
+        self.records = []
+        self.lock = threading.Lock()
+        self.finished = 0
+
+    def call(self, callName, method, arguments):
+        """Run one scripting object call and record it"""
+        if callName.split(".")[1] in invokeMethods and len(arguments) > 1:
+            callName = "%s:%s" % (callName, arguments[1])
+        function, caller = findCaller()
+        started = time.time()
+        outcome = "ok"
+        try:
+            try:
+                return method(*arguments)
+            except:
+                outcome = "error: %s" % sys.exc_info()[1]
+                raise
+        finally:
+            elapsed = time.time() - started
+            record = [started - self.started, elapsed * 1000, threading.currentThread().getName(),
+                      function, caller, callName, cleanText(outcome), self.formatArguments(arguments)]
+            self.lock.acquire()
+            try:
+                self.records.append(record)
+            finally:
+                self.lock.release()
+
+    def redact(self, value):
+        """Return value with the values of secret-named arguments and attributes replaced"""
+        if envConfig.isString(value):
+            return self.secretAssignment.sub(lambda match: match.group(1) + match.group(2) + redactedValue, value)
+        if not isinstance(value, (list, tuple)):
+            return value
+        redacted = []
+        hideNext = 0
+        for item in value:
+            if hideNext and not isinstance(item, (list, tuple)):
+                redacted.append(redactedValue)
+                hideNext = 0
+                continue
+            hideNext = envConfig.isString(item) and self.secretPattern.search(item) is not None
+            redacted.append(self.redact(item))
+        return redacted
+
+    def formatArguments(self, arguments):
+        """Return the redacted arguments of a call as one line of text"""
+        text = ", ".join([formatValue(argument) for argument in self.redact(list(arguments))])
+        text = cleanText(text)
+        if len(text) > maxArgumentLength:
+            text = text[:maxArgumentLength] + "..."
+        return text
+
+    def finish(self):
+        """Write the raw trace and the profile, and print the profile; runs once"""
+        if self.finished:
+            return
+        self.finished = 1
+        if self in activeTracers:
+            activeTracers.remove(self)
+        self.lock.acquire()
+        try:
+            records = self.records[:]
+        finally:
+            self.lock.release()
+        header = ["Started %s by %s" % (self.startedText, self.command),
+                  "Run time %.1f s" % (time.time() - self.started)]
+        try:
+            writeTrace(self.tracePath, header, records)
+            profile = formatProfile(header, records, self.slowest)
+            profileFile = open(self.profilePath, "w")
+            try:
+                profileFile.write("\n".join(profile) + "\n")
+            finally:
+                profileFile.close()
+        except (IOError, OSError):
+            print("ERROR: Could not write the call trace: %s" % sys.exc_info()[1])
+            return
+        print("")
+        for line in profile:
+            print(line)
+        print("")
+        print("Call trace written to %s, profile to %s" % (self.tracePath, self.profilePath))
+
+def findCaller():
+    """Return [script function, module.function] that called the scripting object"""
+    try:
+        frame = sys._getframe(1)
+    except (AttributeError, ValueError):
+        return ["?", "?"]
+    moduleGlobals = globals()
+    while frame is not None and frame.f_globals is moduleGlobals:
+        frame = frame.f_back
+    caller = getFrameName(frame)
+    
+    # Calls made through the helper modules belong to the script function
+    # that called the helper
+    while frame is not None and frame.f_globals.get("__name__") != "__main__":
+        frame = frame.f_back
+    if frame is None:
+        return [caller, caller]
+    return [getFrameName(frame), caller]
+
+def getFrameName(frame):
+    """Return module.function for a stack frame, without the module for the script itself"""
+    if frame is None:
+        return "?"
+    name = frame.f_code.co_name
+    if name == "<module>" or name == "?":
+        name = "(top level)"
+    module = frame.f_globals.get("__name__", "")
+    if module and module != "__main__":
+        name = "%s.%s" % (module, name)
+    return name
+
+def formatValue(value):
+    """Return an argument as text: strings as they are, lists in brackets"""
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ", ".join([formatValue(item) for item in value])
+    if envConfig.isString(value):
+        return value
+    return repr(value)
+
+def cleanText(text):
+    """Return text on one line without the tabs that separate trace fields"""
+    return text.replace("\t", " ").replace("\r", " ").replace("\n", "\\n")
+
+def writeTrace(path, header, records):
+    """Write the raw trace: header comments, then one tab-separated line per call in start order"""
+    records = records[:]
+    records.sort()
+    traceFile = open(path, "w")
+    try:
+        for line in header:
+            traceFile.write("# %s\n" % line)
+        traceFile.write(traceHeader + "\n")
+        for record in records:
+            fields = ["%.3f" % record[0], "%.1f" % record[1]] + record[2:]
+            traceFile.write("\t".join(fields) + "\n")
+    finally:
+        traceFile.close()
+
+def readTrace(path):
+    """Return [header lines, records] of a trace written by writeTrace"""
+    header = []
+    records = []
+    traceFile = open(path)
+    try:
+        for line in traceFile:
+            line = line.rstrip("\r\n")
+            if line.startswith("#"):
+                if line != traceHeader:
+                    header.append(line[1:].strip())
+                continue
+            fields = line.split("\t", 7)
+            if len(fields) < 8:
+                continue
+            records.append([float(fields[0]), float(fields[1])] + fields[2:])
+    finally:
+        traceFile.close()
+    return [header, records]
+
+def getNodeName(arguments):
+    """Return the node of the NodeSync MBean named in a call's arguments"""
+    match = re.search(r"node=([^,\]]+)", arguments)
+    if match:
+        return match.group(1)
+    return "?"
+
+def summarize(records, field):
+    """Return [name, calls, total ms, max ms] per value of a record field, most time first"""
+    totals = {}
+    for record in records:
+        total = totals.setdefault(record[field], [record[field], 0, 0.0, 0.0])
+        total[1] = total[1] + 1
+        total[2] = total[2] + record[1]
+        total[3] = max(total[3], record[1])
+    summary = list(totals.values())
+    summary.sort(key=lambda total: (-total[2], total[0]))
+    return summary
+
+def formatSummary(title, summary):
+    """Return the lines of a calls and time table"""
+    width = max([len(title)] + [len(total[0]) for total in summary])
+    lines = ["%-*s %7s %11s %9s %9s" % (width, title, "calls", "total ms", "mean ms", "max ms")]
+    for name, calls, total, maximum in summary:
+        lines.append("%-*s %7d %11.1f %9.1f %9.1f" % (width, name, calls, total, total / calls, maximum))
+    return lines
+
+def getSyncDurations(records):
+    """Return [node, started, sync ms, ms until in sync, checks, outcome] per node synchronization"""
+    syncs = []
+    current = {}
+    records = records[:]
+    records.sort()
+    for record in records:
+        if record[5] == "AdminControl.invoke:sync":
+            node = getNodeName(record[7])
+            current[node] = [node, record[0], record[1], record[1], 0, record[6]]
+            syncs.append(current[node])
+        elif record[5] == "AdminControl.invoke:isNodeSynchronized":
+            sync = current.get(getNodeName(record[7]))
+            if sync is not None:
+                sync[3] = (record[0] + record[1] / 1000.0 - sync[1]) * 1000
+                sync[4] = sync[4] + 1
+                if record[6] != "ok":
+                    sync[5] = record[6]
+    return syncs
+
+def formatProfile(header, records, slowest):
+    """Return the lines of the aggregated profile of the traced calls"""
+    lines = ["wsadmin call profile"] + header
+    totalTime = 0.0
+    for record in records:
+        totalTime = totalTime + record[1]
+    errors = [record for record in records if record[6] != "ok"]
+    lines.append("%d call(s), %.1f s in calls (summed over threads), %d failed" % (len(records), totalTime / 1000, len(errors)))
+    if not records:
+        return lines
+    
+    byTime = records[:]
+    byTime.sort(key=lambda record: -record[1])
+    lines.append("")
+    lines.append("Slowest calls:")
+    lines.append("%9s %9s  %-30s %s" % ("at s", "ms", "function", "call"))
+    for record in byTime[:slowest]:
+        lines.append("%9.1f %9.1f  %-30s %s(%s)" % (record[0], record[1], record[3], record[5], record[7]))
+    
+    lines.append("")
+    lines.extend(formatSummary("Function", summarize(records, 3)))
+    lines.append("")
+    lines.extend(formatSummary("Method", summarize(records, 5)))
+    
+    saves = [record for record in records if record[5] == "AdminConfig.save"]
+    saves.sort()
+    lines.append("")
+    lines.append("Configuration saves:")
+    if not saves:
+        lines.append("  none")
+    for record in saves:
+        lines.append("%9.1f %9.1f  %-30s %s" % (record[0], record[1], record[3], record[6]))
+    
+    syncs = getSyncDurations(records)
+    lines.append("")
+    lines.append("Node synchronizations:")
+    if not syncs:
+        lines.append("  none")
+    else:
+        lines.append("%9s %-20s %9s %14s %7s  %s" % ("at s", "node", "sync ms", "in sync ms", "checks", "outcome"))
+    for node, started, syncTime, inSyncTime, checks, outcome in syncs:
+        lines.append("%9.1f %-20s %9.1f %14.1f %7d  %s" % (started, node, syncTime, inSyncTime, checks, outcome))
+    
+    if errors:
+        lines.append("")
+        lines.append("Failed calls:")
+        for record in errors:
+            lines.append("%9.1f  %-30s %s: %s" % (record[0], record[3], record[5], record[6]))
+    return lines
+
+# Main execution
+if __name__ == "__main__":
+    options = sys.argv[1:]
+    files = [option for index, option in enumerate(options)
+             if not option.startswith("-") and (index == 0 or options[index - 1] != "-slowest")]
+    if "-help" in options or len(files) != 1:
+        print("Usage: %s trace-file [-slowest n]" % sys.argv[0])
+        print("  trace-file - Raw trace written by a wsadmin script run with -trace or WAS_TRACE")
+        print("  -slowest   - Number of slowest calls to list (default trace.calls.slowest)")
+        sys.exit(2)
+    
+    slowest = envConfig.getOption(options, "-slowest")
+    if slowest is None:
+        slowest = envConfig.loadConfig().getInt("trace.calls.slowest")
+    try:
+        header, records = readTrace(files[0])
+    except (IOError, OSError):
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    for line in formatProfile(header, records, int(slowest)):
+        print(line)
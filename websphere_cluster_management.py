@@ -8,89 +8,135 @@ import sys
 import os
 import time
 
-# Configuration parameters
-cellName = "YourCellName"
-nodeName1 = "Node01"
-nodeName2 = "Node02"
-clusterName = "WebCluster01"
-serverPrefix = "AppServer"
-numServers = 2
-webServerName = "webserver1"
-webServerHostName = "webserver.example.com"
-webServerPort = "80"
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_config_cache as configCache
+import websphere_desired_state as desiredState
+import websphere_node_sync as nodeSync
+import websphere_env_config as envConfig
+import websphere_call_trace as callTrace
+import websphere_tuning_targets as tuningTargets
+callTrace.install(globals())
+configCache.bindAdminObjects(globals())
+nodeSync.bindAdminObjects(globals())
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+cellName = env.get("was.cell")
+clusterName = env.get("cluster.name")
+memberNames = env.getList("cluster.members")
+serverPrefix = env.get("cluster.member.prefix")  # Names members beyond memberNames
+numServers = len(memberNames)
+clusterNodes = env.getList("cluster.nodes")  # Members are spread over these nodes in turn
+webServerName = env.get("webserver.name")
+webServerNodeName = env.get("webserver.node")
+webServerHostName = env.get("webserver.host")
+webServerPort = env.get("webserver.port")
+
+# Readiness polling (seconds)
+clusterStartTimeout = 600
+clusterStopTimeout = 300
+pollMinInterval = 2
+pollMaxInterval = 15
+
+# Cluster member template
+memberTemplateName = "default"  # Server template for the first member of a new cluster
+memberWeight = "2"
+memberJvmAttributes = tuningTargets.getMemberJvmTargets(env)
 
 def createCluster():
     """Create a new cluster and cluster members"""
     print "Creating cluster: %s" % clusterName
     
     # Check if cluster already exists
-    existingClusters = AdminConfig.list("ServerCluster").splitlines()
-    for cluster in existingClusters:
-        if clusterName == AdminConfig.showAttribute(cluster, "name"):
-            print "Cluster %s already exists" % clusterName
-            return cluster
-    
-    # Create the cluster
-    clusterID = AdminConfig.create("ServerCluster", AdminConfig.getid("/Cell:%s/" % cellName), [["name", clusterName]])
-    AdminConfig.save()
-    print "Cluster created successfully"
+    cluster = configCache.findByName("ServerCluster", None, clusterName)
+    if cluster:
+        print "Cluster %s already exists" % clusterName
+        return cluster
+    
+    # Create the cluster; it is saved together with its members
+    clusterID = configCache.create("ServerCluster", configCache.getid("/Cell:%s/" % cellName), [["name", clusterName]])
+    print "Cluster staged"
     
     # Create cluster members
-    for i in range(1, numServers + 1):
-        nodeName = nodeName1 if i % 2 == 1 else nodeName2
-        serverName = "%s%d" % (serverPrefix, i)
-        createClusterMember(clusterID, nodeName, serverName)
+    createClusterMembers(clusterID, clusterNodes, numServers)
     
     return clusterID
 
-def createClusterMember(clusterID, nodeName, serverName):
-    """Create a cluster member on the specified node"""
-    print "Creating cluster member: %s on node %s" % (serverName, nodeName)
-    
-    # Create the cluster member
-    memberAttrs = [
-        ["memberName", serverName],
-        ["nodeName", nodeName],
-        ["weight", "2"],
-        ["replicatorEntry", "true"]
-    ]
+def planNewMembers(existingMembers, nodes, count):
+    """Return [node, server] pairs that bring the cluster up to count members, spread over nodes in turn"""
+    newMembers = []
+    index = 1
+    while len(existingMembers) + len(newMembers) < count:
+        if index <= len(memberNames):
+            serverName = memberNames[index - 1]
+        else:
+            serverName = "%s%d" % (serverPrefix, index)
+        if serverName not in existingMembers:
+            newMembers.append([nodes[(index - 1) % len(nodes)], serverName])
+        index = index + 1
+    return newMembers
+
+def applyMemberJvmSettings(nodeName, serverName):
+    """Apply the member JVM settings to a cluster member; only attributes that differ are modified"""
+    serverID = configCache.getServerID(cellName, nodeName, serverName)
+    jvmID = configCache.listFirst("JavaVirtualMachine", serverID)
+    desiredState.applyDesiredState(jvmID, memberJvmAttributes, "%s JavaVirtualMachine" % serverName)
+
+def createClusterMembers(clusterID, nodes, count):
+    """Create members until the cluster has count of them, applying the member template, and save once"""
+    existingMembers = [configCache.showAttribute(member, "memberName") for member in configCache.listObjects("ClusterMember", clusterID)]
+    newMembers = planNewMembers(existingMembers, nodes, count)
+    if not newMembers:
+        print "Cluster %s already has %d member(s)" % (clusterName, len(existingMembers))
+        return []
     
-    memberID = AdminConfig.create("ClusterMember", clusterID, memberAttrs)
-    AdminConfig.save()
-    print "Cluster member %s created successfully" % serverName
+    print "Creating %d cluster member(s) on node(s) %s" % (len(newMembers), ", ".join(nodes))
     
-    # Configure JVM parameters for the cluster member
-    serverID = AdminConfig.getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
-    jvmID = AdminConfig.list("JavaVirtualMachine", serverID)
+    # The first member of a cluster is created from the server template and
+    # becomes the template for every member added after it, so it gets the
+    # member JVM settings before the others are copied from it
+    tunedMembers = []
+    for nodeName, serverName in newMembers:
+        memberConfig = "[-memberNode %s -memberName %s -memberWeight %s -genUniquePorts true -replicatorEntry true]" % (nodeName, serverName, memberWeight)
+        args = ["-clusterName", clusterName, "-memberConfig", memberConfig]
+        firstMember = not existingMembers
+        if firstMember:
+            args = args + ["-firstMember", "[-templateName %s]" % memberTemplateName]
+            existingMembers.append(serverName)
+        AdminTask.createClusterMember(args)
+        print "  %s staged on %s" % (serverName, nodeName)
+        if firstMember:
+            configCache.clear()
+            applyMemberJvmSettings(nodeName, serverName)
+            tunedMembers.append(serverName)
+    configCache.clear()
     
-    jvmAttrs = [
-        ["initialHeapSize", 512],
-        ["maximumHeapSize", 1024],
-        ["genericJvmArguments", "-Xgcpolicy:gencon -Xmn256m -Dcom.ibm.websphere.pmirm.timeout=180"]
-    ]
+    # Members copied from a tuned member already match, so this only reads
+    # them; a member copied from an untuned existing member is modified
+    for nodeName, serverName in newMembers:
+        if serverName not in tunedMembers:
+            applyMemberJvmSettings(nodeName, serverName)
     
-    AdminConfig.modify(jvmID, jvmAttrs)
+    # One repository commit for the cluster and all of its new members
     AdminConfig.save()
-    print "JVM parameters configured for %s" % serverName
-    
-    return memberID
+    print "%d cluster member(s) created successfully" % len(newMembers)
+    return newMembers
 
 def configureWebServer():
     """Configure web server for the cluster"""
     print "Configuring web server for cluster: %s" % clusterName
     
     # Check if web server exists
-    webServers = AdminConfig.list("WebServer").splitlines()
-    webServerExists = False
-    
-    for server in webServers:
-        if webServerName == AdminConfig.showAttribute(server, "name"):
-            webServerExists = True
-            break
+    webServerExists = configCache.findByName("WebServer", None, webServerName)
     
     if not webServerExists:
         # Create web server definition
-        nodeID = AdminConfig.getid("/Cell:%s/Node:%s/" % (cellName, nodeName1))
+        nodeID = configCache.getid("/Cell:%s/Node:%s/" % (cellName, webServerNodeName))
         webServerAttrs = [
             ["name", webServerName],
             ["webserverHostname", webServerHostName],
@@ -100,7 +146,7 @@ def configureWebServer():
             ["serverIOTimeout", "60"]
         ]
         
-        webServerID = AdminConfig.create("WebServer", nodeID, webServerAttrs)
+        webServerID = configCache.create("WebServer", nodeID, webServerAttrs)
         AdminConfig.save()
         print "Web server %s created successfully" % webServerName
     
@@ -109,13 +155,81 @@ def configureWebServer():
     AdminTask.generatePluginCfg(["-clusterName", clusterName])
     
     print "Propagating plugin to web server"
-    AdminTask.propagatePluginCfg(["-webServerName", webServerName, "-nodeName", nodeName1])
+    AdminTask.propagatePluginCfg(["-webServerName", webServerName, "-nodeName", webServerNodeName])
     
     AdminConfig.save()
     print "Web server configuration completed"
 
-def startCluster():
-    """Start the cluster and all its members"""
+def getConfiguredMembers():
+    """Return the member names of the cluster from its configuration"""
+    clusterID = configCache.findByName("ServerCluster", None, clusterName)
+    if not clusterID:
+        return []
+    return [configCache.showAttribute(member, "memberName") for member in configCache.listObjects("ClusterMember", clusterID)]
+
+def getMemberNodes():
+    """Return the distinct nodes that host members of the cluster"""
+    clusterID = configCache.findByName("ServerCluster", None, clusterName)
+    if not clusterID:
+        return []
+    return nodeSync.getNodeNames([[configCache.showAttribute(member, "nodeName")] for member in configCache.listObjects("ClusterMember", clusterID)])
+
+def getMemberStates():
+    """Return {memberName: state} from the running ClusterMember MBeans"""
+    states = {}
+    for member in AdminControl.queryNames("type=ClusterMember,cluster=%s,*" % clusterName).splitlines():
+        states[AdminControl.getAttribute(member, "memberName")] = AdminControl.getAttribute(member, "state")
+    return states
+
+def waitForClusterState(targetState, timeout):
+    """Poll every member until it reaches targetState ("started" or "stopped") or the deadline passes"""
+    members = getConfiguredMembers()
+    if not members:
+        print "No members configured for cluster %s" % clusterName
+        return False
+    
+    started = time.time()
+    deadline = started + timeout
+    interval = pollMinInterval
+    timeline = {}
+    states = {}
+    lastStates = None
+    
+    while 1:
+        states = getMemberStates()
+        now = time.time()
+        for member in members:
+            # A stopped member may no longer have a running MBean
+            state = states.get(member, "websphere.cluster.member.stopped")
+            if member not in timeline and state.lower().find(targetState) >= 0:
+                timeline[member] = now - started
+                print "  %s reached %s after %.1f seconds" % (member, targetState.upper(), timeline[member])
+        
+        if len(timeline) == len(members) or now >= deadline:
+            break
+        
+        # Poll quickly while members are changing state and back off while nothing moves
+        if states == lastStates:
+            interval = min(interval * 2, pollMaxInterval)
+        else:
+            interval = pollMinInterval
+        lastStates = states
+        time.sleep(min(interval, max(deadline - now, 0)))
+    
+    print "Member timeline:"
+    for member in members:
+        if member in timeline:
+            print "  %-30s %-8s %7.1fs" % (member, targetState.upper(), timeline[member])
+        else:
+            print "  %-30s TIMEOUT  (last state: %s)" % (member, states.get(member, "unknown"))
+    
+    if len(timeline) < len(members):
+        print "ERROR: %d of %d member(s) did not reach %s within %d seconds" % (len(members) - len(timeline), len(members), targetState.upper(), timeout)
+        return False
+    return True
+
+def startCluster(timeout=clusterStartTimeout):
+    """Start the cluster and wait for all its members to report STARTED"""
     print "Starting cluster: %s" % clusterName
     
     try:
@@ -125,21 +239,15 @@ def startCluster():
         # Start the cluster
         AdminControl.invoke(clusterMgr, "startCluster", clusterName)
         
-        # Wait for cluster to start
-        print "Waiting for cluster to start..."
-        time.sleep(30)
-        
-        # Check status
-        state = AdminControl.getAttribute(clusterMgr, "state")
-        print "Cluster state: %s" % state
-        
-        return True
+        # Wait for every member to start
+        print "Waiting up to %d seconds for cluster members to start..." % timeout
+        return waitForClusterState("started", timeout)
     except:
         print "Error starting cluster: %s" % sys.exc_info()[0]
         return False
 
-def stopCluster():
-    """Stop the cluster and all its members"""
+def stopCluster(timeout=clusterStopTimeout):
+    """Stop the cluster and wait for all its members to report STOPPED"""
     print "Stopping cluster: %s" % clusterName
     
     try:
@@ -149,11 +257,9 @@ def stopCluster():
         # Stop the cluster
         AdminControl.invoke(clusterMgr, "stopCluster", clusterName)
         
-        # Wait for cluster to stop
-        print "Waiting for cluster to stop..."
-        time.sleep(30)
-        
-        return True
+        # Wait for every member to stop
+        print "Waiting up to %d seconds for cluster members to stop..." % timeout
+        return waitForClusterState("stopped", timeout)
     except:
         print "Error stopping cluster: %s" % sys.exc_info()[0]
         return False
@@ -191,20 +297,59 @@ def getClusterStatus():
 # Main execution
 if __name__ == "__main__":
     action = sys.argv[0] if len(sys.argv) > 0 else "status"
+    options = sys.argv[1:]
+    
+    if "-nodes" in options:
+        clusterNodes = [node.strip() for node in (envConfig.getOption(options, "-nodes") or "").split(",") if node.strip()]
+    if "-members" in options:
+        numServers = int(envConfig.getOption(options, "-members"))
+    
+    # Members only see saved configuration once their nodes have synchronized;
+    # with -sync, start synchronizes first and the other actions end with it
+    syncTimeout = int(envConfig.getOption(options, "-synctimeout", nodeSync.syncTimeout))
+    if "-sync" in options and action == "start":
+        if not nodeSync.syncNodes(getMemberNodes(), syncTimeout):
+            sys.exit(1)
+    
+    if action in ["create", "scale"] and not clusterNodes:
+        print "ERROR: No nodes to create cluster members on; name them with -nodes n1,n2,... or cluster.nodes"
+        sys.exit(1)
     
     if action == "create":
         createCluster()
         configureWebServer()
+    elif action == "scale":
+        clusterID = configCache.findByName("ServerCluster", None, clusterName)
+        if not clusterID:
+            print "ERROR: Cluster %s does not exist" % clusterName
+            sys.exit(1)
+        createClusterMembers(clusterID, clusterNodes, numServers)
     elif action == "start":
-        startCluster()
+        if not startCluster(int(envConfig.getOption(options, "-timeout", clusterStartTimeout))):
+            sys.exit(1)
     elif action == "stop":
-        stopCluster()
+        if not stopCluster(int(envConfig.getOption(options, "-timeout", clusterStopTimeout))):
+            sys.exit(1)
     elif action == "status":
         getClusterStatus()
     else:
-        print "Usage: wsadmin -f %s [create|start|stop|status]" % __file__
+        print "Usage: wsadmin -f %s [create|scale|start|stop|status] [-nodes n1,n2,...] [-members count] [-timeout seconds] [-sync [-synctimeout seconds]] [-trace]" % __file__
         print "  create - Create a new cluster and configure web server"
-        print "  start  - Start the cluster"
-        print "  stop   - Stop the cluster"
+        print "  scale  - Add members to an existing cluster until it has -members of them"
+        print "  start  - Start the cluster and wait for every member to start"
+        print "  stop   - Stop the cluster and wait for every member to stop"
         print "  status - Get cluster status"
+        print ""
+        print "  -timeout - Overall deadline for start/stop (default %d/%d seconds)." % (clusterStartTimeout, clusterStopTimeout)
+        print "             The script exits with status 1 if a member misses it."
+        print "  -nodes   - Nodes to spread new members over (default %s)" % ",".join(clusterNodes)
+        print "  -members - Total number of cluster members (default %d)" % numServers
+        print "  -sync    - Synchronize the member nodes in parallel (before start, after other actions)"
+        print "  -synctimeout - Deadline for every node to finish synchronizing (default %d seconds)" % nodeSync.syncTimeout
+        print "  -trace   - Record every wsadmin call and print a call profile at exit (websphere_call_trace.py)"
+        sys.exit(1)
+    
+    if "-sync" in options and action != "start":
+        if not nodeSync.syncNodes(getMemberNodes(), syncTimeout):
+            sys.exit(1)
 
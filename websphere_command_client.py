@@ -0,0 +1,101 @@
+"""
+WebSphere Command Client (Python)
+Submits jobs to a running websphere_command_server.py and prints their output.
+
+Runs under Python 2, Python 3 or Jython, so automation can reuse the open
+wsadmin session instead of starting wsadmin for every operation.
+
+Usage:
+    python websphere_command_client.py [-port n] <job> [arguments...]
+    python websphere_command_client.py tune all -transaction
+    python websphere_command_client.py deploy deploy -ear /path/app.ear -app MyApp
+
+From other Python code:
+    import websphere_command_client
+    status = websphere_command_client.submitJob(["cluster", "status"])
+"""
+
+# Import required modules
+import sys
+import os
+import socket
+
+# Configuration parameters
+serverHost = "127.0.0.1"
+serverPort = 9809
+tokenFile = os.path.join(os.path.expanduser("~"), ".websphere_command_server")
+
+def quoteArgument(argument):
+    """Quote an argument so the server's shlex.split returns it unchanged"""
+    if argument and not [c for c in argument if c in " \t\n'\"\\"]:
+        return argument
+    return "'" + argument.replace("'", "'\"'\"'") + "'"
+
+def submitJob(job, output=None, port=None):
+    """Send a job (list of words) to the command server, copy its output and return its exit status"""
+    if output is None:
+        output = sys.stdout
+    tokenIn = open(tokenFile)
+    token = tokenIn.read().strip()
+    tokenIn.close()
+
+    connection = socket.create_connection((serverHost, port or serverPort))
+    try:
+        request = "%s\n%s\n" % (token, " ".join([quoteArgument(word) for word in job]))
+        connection.sendall(request.encode("utf-8"))
+
+        # Output streams until the final EXIT line
+        pending = ""
+        while 1:
+            chunk = connection.recv(4096)
+            if not chunk:
+                break
+            pending = pending + chunk.decode("utf-8", "replace")
+            lines = pending.split("\n")
+            pending = lines.pop()
+            for line in lines:
+                if line.startswith("EXIT "):
+                    return int(line[5:])
+                output.write(line + "\n")
+        output.write(pending)
+        return 1
+    finally:
+        connection.close()
+
+def isServerRunning(port=None):
+    """Return true if a command server is answering on the port"""
+    try:
+        return submitJob(["ping"], open(os.devnull, "w"), port) == 0
+    except (IOError, OSError, socket.error):
+        return False
+
+# Main execution
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    port = None
+    if arguments[:1] == ["-port"] and len(arguments) > 1:
+        port = int(arguments[1])
+        arguments = arguments[2:]
+
+    if not arguments:
+        print("Usage: %s [-port n] <job> [arguments...]" % sys.argv[0])
+        print("  ping                  - Check that the command server is running")
+        print("  status                - Show the state of every running server")
+        print("  deploy <arguments>    - Run websphere_deploy_app.py")
+        print("  tune <arguments>      - Run websphere_performance_tuning.py")
+        print("  report                - Generate the performance report")
+        print("  cluster <arguments>   - Run websphere_cluster_management.py")
+        print("  security <arguments>  - Run websphere_security_config.py")
+        print("  shutdown              - Stop the command server")
+        sys.exit(2)
+
+    # The job is sent as one line
+    if [argument for argument in arguments if "\n" in argument or "\r" in argument]:
+        print("ERROR: Job arguments cannot contain line breaks")
+        sys.exit(2)
+
+    try:
+        sys.exit(submitJob(arguments, port=port))
+    except (IOError, OSError, socket.error):
+        print("ERROR: Command server is not running: %s" % sys.exc_info()[1])
+        sys.exit(3)
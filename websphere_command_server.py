@@ -0,0 +1,255 @@
+"""
+WebSphere Command Server (Jython)
+Long-lived wsadmin session that accepts admin jobs over a local socket.
+
+Starting wsadmin costs a JVM boot and a deployment manager connection for
+every invocation. This script is started once with wsadmin and keeps its
+session open; the shell script and websphere_command_client.py submit jobs
+to it and receive their output. Jobs are queued and run one at a time in
+the wsadmin session.
+
+Protocol (one connection per job, lines terminated by newline):
+    client -> server: <token>
+    client -> server: <job> [arguments...]
+    server -> client: job output...
+    server -> client: EXIT <status>
+"""
+
+# Import required modules
+import sys
+import os
+import time
+import shlex
+import socket
+import binascii
+import threading
+import Queue
+
+# Make the shared helper modules next to this script importable
+try:
+    scriptDir = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    scriptDir = os.getcwd()
+sys.path.append(scriptDir)
+
+import websphere_config_cache as configCache
+import websphere_desired_state as desiredState
+import websphere_call_trace as callTrace
+configCache.bindAdminObjects(globals())
+
+# Configuration parameters
+listenHost = "127.0.0.1"
+listenPort = 9809
+tokenFile = os.path.join(os.path.expanduser("~"), ".websphere_command_server")
+
+# Jobs that run one of the wsadmin scripts: job name -> [script, fixed leading arguments]
+jobScripts = {
+    "deploy": ["websphere_deploy_app.py", []],
+    "tune": ["websphere_performance_tuning.py", []],
+    "report": ["websphere_performance_tuning.py", ["report"]],
+    "cluster": ["websphere_cluster_management.py", []],
+    "security": ["websphere_security_config.py", []]
+}
+
+# Jobs waiting to run: [job arguments, connection]
+pendingJobs = Queue.Queue()
+running = 1
+
+class JobOutput:
+    """File-like object that sends job output to the client and copies it to the server log"""
+    def __init__(self, connection, log):
+        self.connection = connection
+        self.log = log
+
+    def write(self, text):
+        self.log.write(text)
+        try:
+            self.connection.sendall(text)
+        except:
+            # The client went away; keep running the job so the workspace stays consistent
+            pass
+
+    def flush(self):
+        self.log.flush()
+
+def getRandomBytes(count):
+    """Return count bytes from a cryptographically secure source"""
+    try:
+        return os.urandom(count)
+    except (AttributeError, NotImplementedError):
+        # Jython builds without os.urandom
+        from java.security import SecureRandom
+        import jarray
+        randomBytes = jarray.zeros(count, "b")
+        SecureRandom().nextBytes(randomBytes)
+        return "".join([chr(byte & 0xff) for byte in randomBytes])
+
+def createToken():
+    """Write a random access token readable only by the current user and return it"""
+    token = binascii.hexlify(getRandomBytes(16))
+    # Replace any earlier file, so the new one is created with owner-only access
+    if os.path.exists(tokenFile):
+        os.remove(tokenFile)
+    tokenOut = os.fdopen(os.open(tokenFile, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600), "w")
+    try:
+        tokenOut.write(token + "\n")
+    finally:
+        tokenOut.close()
+    return token
+
+def acceptJobs(serverSocket, token):
+    """Accept client connections and queue their jobs"""
+    while running:
+        try:
+            connection, address = serverSocket.accept()
+        except:
+            if running:
+                print "Error accepting connection: %s" % sys.exc_info()[1]
+            continue
+        try:
+            request = connection.makefile("r")
+            if request.readline().strip() != token:
+                connection.sendall("Invalid token\nEXIT 2\n")
+                connection.close()
+                continue
+            job = shlex.split(request.readline().strip())
+            if not job:
+                connection.sendall("Empty job\nEXIT 2\n")
+                connection.close()
+                continue
+            if pendingJobs.qsize() > 0:
+                connection.sendall("Queued behind %d job(s)\n" % pendingJobs.qsize())
+            pendingJobs.put([job, connection])
+        except:
+            print "Error reading job: %s" % sys.exc_info()[1]
+            connection.close()
+
+def runScript(script, arguments):
+    """Run a wsadmin script in this session as if it had been started with wsadmin -f"""
+    namespace = {
+        "__name__": "__main__",
+        "__file__": os.path.join(scriptDir, script),
+        "AdminConfig": AdminConfig,
+        "AdminControl": AdminControl,
+        "AdminTask": AdminTask,
+        "AdminApp": AdminApp,
+        "Help": Help
+    }
+    savedArgv = sys.argv
+    sys.argv = arguments
+    try:
+        try:
+            execfile(namespace["__file__"], namespace)
+        except SystemExit:
+            status = sys.exc_info()[1].code
+            if status:
+                return int(status)
+    finally:
+        sys.argv = savedArgv
+        # Write the job's trace now rather than when the server exits
+        callTrace.finishTracers()
+    return 0
+
+def showServerStatus():
+    """Print the state of every running server process in the cell"""
+    for server in AdminControl.queryNames("type=Server,*").splitlines():
+        print "%s/%s: %s" % (AdminControl.getAttribute(server, "nodeName"),
+                             AdminControl.getAttribute(server, "name"),
+                             AdminControl.getAttribute(server, "state"))
+    return 0
+
+def runJob(job):
+    """Run one job and return its exit status"""
+    global running
+    name = job[0]
+    if name == "ping":
+        print "pong"
+        return 0
+    if name == "status":
+        return showServerStatus()
+    if name == "shutdown":
+        running = 0
+        print "Command server shutting down"
+        return 0
+    if name in jobScripts.keys():
+        script, leadingArguments = jobScripts[name]
+        return runScript(script, leadingArguments + job[1:])
+    print "Unknown job: %s" % name
+    print "Jobs: ping, status, shutdown, %s" % ", ".join(jobScripts.keys())
+    return 2
+
+def processJobs():
+    """Run queued jobs one at a time until a shutdown job arrives"""
+    log = sys.stdout
+    while running:
+        try:
+            job, connection = pendingJobs.get(1, 1)
+        except Queue.Empty:
+            continue
+        
+        log.write("[%s] Running job: %s\n" % (time.strftime("%Y-%m-%d %H:%M:%S"), " ".join(job)))
+        started = time.time()
+        
+        # Each job starts from the repository as it is now
+        configCache.clear()
+        desiredState.clearResults()
+        
+        sys.stdout = JobOutput(connection, log)
+        try:
+            try:
+                status = runJob(job)
+            except:
+                print "Job failed: %s %s" % (sys.exc_info()[0], sys.exc_info()[1])
+                status = 1
+        finally:
+            sys.stdout = log
+        
+        # Never let a failed job's staged changes leak into the next one
+        if AdminConfig.hasChanges():
+            log.write("Discarding unsaved changes left by the job\n")
+            AdminConfig.reset()
+        
+        log.write("[%s] Job finished with status %d in %.1f seconds\n" % (time.strftime("%Y-%m-%d %H:%M:%S"), status, time.time() - started))
+        try:
+            connection.sendall("EXIT %d\n" % status)
+            connection.close()
+        except:
+            pass
+
+def rejectPendingJobs():
+    """Tell the clients of jobs still queued at shutdown that their job did not run"""
+    while 1:
+        try:
+            job, connection = pendingJobs.get_nowait()
+        except Queue.Empty:
+            return
+        sys.stdout.write("Not running queued job: %s\n" % " ".join(job))
+        try:
+            connection.sendall("Command server shut down before the job ran\nEXIT 1\n")
+            connection.close()
+        except:
+            pass
+
+def serve():
+    """Listen for jobs until shut down"""
+    token = createToken()
+    serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    serverSocket.bind((listenHost, listenPort))
+    serverSocket.listen(16)
+    print "Command server listening on %s:%d (token in %s)" % (listenHost, listenPort, tokenFile)
+    
+    listener = threading.Thread(target=acceptJobs, args=(serverSocket, token))
+    listener.setDaemon(1)
+    listener.start()
+    
+    processJobs()
+    serverSocket.close()
+    rejectPendingJobs()
+    os.remove(tokenFile)
+
+# Main execution
+if __name__ == "__main__":
+    if len(sys.argv) > 0:
+        listenPort = int(sys.argv[0])
+    serve()
@@ -0,0 +1,500 @@
+"""
+WebSphere Offline Configuration Analyzer (Jython/Python)
+Reads a cell's configuration repository directly from disk, without wsadmin
+or a running deployment manager, and produces the performance report of
+websphere_performance_tuning.py and a tuning audit.
+
+The repository is a profile's config directory (or a backup copy of it):
+    cells/<cell>/nodes/<node>/serverindex.xml        application servers per node
+    cells/<cell>/nodes/<node>/servers/<server>/server.xml
+    cells/<cell>/clusters/<cluster>/cluster.xml      cluster members
+    cells/<cell>/**/resources.xml                    datasources at every scope
+
+Each file is streamed through the expat parser, keeping only the elements of
+one file in memory. The elements read from each file are cached by
+modification time and size, so later runs parse only the files that
+changed. The report has the same settings as the live report, so either can
+serve as the baseline of the other; attributes missing from the XML are
+reported empty where wsadmin would show the schema default. The audit
+compares every server with the values the tuning steps apply
+(websphere_tuning_targets.py, with the tuning profile and overrides of the
+server and its cluster) and exits with status 1 on any deviation.
+
+Usage:
+    python websphere_config_analyzer.py [-repository dir] [-cell name] [-cluster name] report [-format text|json|csv] [-output file] [-baseline file] [-approve]
+    python websphere_config_analyzer.py [-repository dir] [-cell name] [-cluster name] audit [-format text|json|csv] [-output file] [-recommendations file]
+"""
+
+# Import required modules
+import sys
+import os
+import csv
+import time
+import marshal
+import hashlib
+from xml.parsers import expat
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+try:
+    intern
+except NameError:
+    intern = sys.intern
+
+import websphere_env_config as envConfig
+import websphere_tuning_targets as tuningTargets
+import websphere_tuning_report as tuningReport
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+cellName = env.get("was.cell")
+repositoryDir = env.get("analyzer.repository")  # Profile config directory
+reportBasePath = env.get("tuning.report.file")
+reportBaseline = os.path.expanduser(env.get("tuning.report.baseline"))
+
+# Config types of elements that carry no xmi:type, by element name
+elementTypes = {
+    "jvmEntries": "JavaVirtualMachine",
+    "threadPools": "ThreadPool",
+    "threadPool": "ThreadPool",
+    "tuningParams": "TuningParams",
+    "connectionPool": "ConnectionPool",
+    "members": "ClusterMember",
+    "serverEntries": "ServerEntry",
+    "fileSynchronizationService": "ConfigSynchronizationService"
+}
+
+# Config types kept from server.xml: those the report and the audit read
+serverTypes = tuningTargets.tunedTypes + ["TuningParams"]
+
+# Parsed elements are cached per file, keyed by modification time and size,
+# so repeated analyses of an unchanged repository skip the XML parsing
+cacheDir = os.path.join(os.path.expanduser("~"), ".websphere_config_analyzer")
+cacheFormat = 2  # Bump when the cached element records change
+
+# "path|types" -> [[mtime, size], element records], and whether it changed
+parseCache = {}
+parseCacheState = {"file": None, "changed": False}
+
+class ConfigObject:
+    """One element of a configuration document: its config type, attributes and child elements"""
+    def __init__(self, configType, tag, attributes, parent):
+        self.type = configType
+        self.tag = tag
+        self.attributes = attributes
+        self.parent = parent
+        self.children = []
+
+    def get(self, attribute, default=""):
+        return self.attributes.get(attribute, default)
+
+    def child(self, tag):
+        """Return the first child element with a tag such as tuningParams, or None"""
+        for child in self.children:
+            if child.tag == tag:
+                return child
+        return None
+
+    def describe(self):
+        """Return a label such as ThreadPool WebContainer, or ConnectionPool OracleDataSource for an unnamed child"""
+        if "name" in self.attributes:
+            return "%s %s" % (self.type, self.attributes["name"])
+        if "xmi:type" not in self.attributes and self.parent is not None and "name" in self.parent.attributes:
+            return "%s %s" % (self.type, self.parent.attributes["name"])
+        return self.type
+
+def getConfigType(tag, attributes):
+    """Return the config type of an element from its xmi:type, element name or root tag"""
+    xmiType = attributes.get("xmi:type")
+    if xmiType:
+        return xmiType.split(":")[-1]
+    if tag in elementTypes:
+        return elementTypes[tag]
+    return tag.split(":")[-1]
+
+def internString(value):
+    try:
+        return intern(value)
+    except TypeError:
+        # Unicode strings in Jython
+        return value
+
+def parseConfigFile(path, configTypes=None, attributeNames=None):
+    """Return [config type, tag, attributes, parent index] for the elements of a document, optionally only some config types and attributes"""
+    records = []
+    stack = [-1]
+
+    def startElement(tag, attributes):
+        configType = getConfigType(tag, attributes)
+        if configTypes is not None and configType not in configTypes:
+            # Skipped elements still take a stack slot so children find their parent
+            stack.append(-1)
+            return
+        # Interned strings are stored once in the cache however often they repeat
+        kept = {}
+        for name, value in attributes.items():
+            if attributeNames is None or name in attributeNames:
+                kept[internString(name)] = internString(value)
+        records.append([internString(configType), internString(tag), kept, stack[-1]])
+        stack.append(len(records) - 1)
+
+    def endElement(tag):
+        stack.pop()
+    
+    parser = expat.ParserCreate()
+    if hasattr(parser, "returns_unicode"):
+        # Python 2: plain strings for the csv module
+        parser.returns_unicode = 0
+    parser.StartElementHandler = startElement
+    parser.EndElementHandler = endElement
+    configFile = open(path, "rb")
+    try:
+        parser.ParseFile(configFile)
+    finally:
+        configFile.close()
+    return records
+
+def readConfigFile(path, configTypes=None, attributeNames=None):
+    """Return the elements of a configuration document in document order, parsing it only if it changed since it was cached"""
+    status = os.stat(path)
+    stamp = [status.st_mtime, status.st_size]
+    key = "%s|%s" % (path, ",".join(configTypes or ["*"]))
+    cached = parseCache.get(key)
+    if cached and cached[0] == stamp:
+        records = cached[1]
+    else:
+        records = parseConfigFile(path, configTypes, attributeNames)
+        parseCache[key] = [stamp, records]
+        parseCacheState["changed"] = True
+    
+    objects = []
+    for configType, tag, attributes, parentIndex in records:
+        parent = None
+        if parentIndex >= 0:
+            parent = objects[parentIndex]
+        configObject = ConfigObject(configType, tag, attributes, parent)
+        if parent is not None:
+            parent.children.append(configObject)
+        objects.append(configObject)
+    return objects
+
+def getServerAttributes():
+    """Return the names of the server.xml attributes the report and the audit read"""
+    names = {"name": 1}
+    desiredSets = [getTargets(env) for getTargets in tuningTargets.serverTargets.values()]
+    desiredSets.extend([desired for poolName, desired in tuningTargets.getThreadPoolTargets(env, "", "")])
+    while desiredSets:
+        for attribute, value in desiredSets.pop():
+            names[attribute] = 1
+            if type(value) == type([]):
+                desiredSets.append(value)
+    return names
+
+# Attributes kept from server.xml
+serverAttributes = getServerAttributes()
+
+def loadParseCache(cellDir):
+    """Load the parsed elements cached for a cell directory"""
+    # The marshal format differs between interpreters, so each keeps its own
+    # copy; the kept attributes change with the tuning targets
+    attributes = list(serverAttributes.keys())
+    attributes.sort()
+    digest = hashlib.md5(("%s|%s %s|%s" % (os.path.abspath(cellDir), sys.platform, sys.version.split()[0], ",".join(attributes))).encode("utf-8")).hexdigest()
+    parseCacheState["file"] = os.path.join(cacheDir, "%s-%s.cache" % (os.path.basename(cellDir), digest))
+    try:
+        cacheIn = open(parseCacheState["file"], "rb")
+        try:
+            entry = marshal.load(cacheIn)
+        finally:
+            cacheIn.close()
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return
+    if entry[0] == cacheFormat:
+        parseCache.update(entry[1])
+
+def saveParseCache():
+    """Store the parsed elements if any file was parsed; a cache that cannot be written is skipped"""
+    if not parseCacheState["changed"] or not parseCacheState["file"]:
+        return
+    cacheFile = parseCacheState["file"]
+    try:
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        cacheOut = open(cacheFile + ".tmp", "wb")
+        try:
+            marshal.dump([cacheFormat, parseCache], cacheOut)
+        finally:
+            cacheOut.close()
+        if os.path.exists(cacheFile):
+            os.remove(cacheFile)
+        os.rename(cacheFile + ".tmp", cacheFile)
+    except (IOError, OSError):
+        pass
+
+def ofType(objects, configType):
+    return [configObject for configObject in objects if configObject.type == configType]
+
+def firstOfType(objects, configType):
+    for configObject in objects:
+        if configObject.type == configType:
+            return configObject
+    return None
+
+def findCellDir(repository, cell=None):
+    """Return the directory of the named cell, or of the only cell in the repository"""
+    cellsDir = os.path.join(repository, "cells")
+    if not os.path.isdir(cellsDir):
+        raise IOError("%s is not a configuration repository (no cells directory)" % repository)
+    cells = [name for name in os.listdir(cellsDir) if os.path.isdir(os.path.join(cellsDir, name))]
+    if cell in cells:
+        return os.path.join(cellsDir, cell)
+    if len(cells) == 1:
+        return os.path.join(cellsDir, cells[0])
+    raise IOError("Cell %s not found in %s (cells: %s)" % (cell, cellsDir, ", ".join(cells)))
+
+def findApplicationServers(cellDir, clusterName=None):
+    """Return [node, server] pairs for every application server in the cell, or every member of a cluster"""
+    servers = []
+    if clusterName:
+        clusterFile = os.path.join(cellDir, "clusters", clusterName, "cluster.xml")
+        if not os.path.exists(clusterFile):
+            return servers
+        for member in ofType(readConfigFile(clusterFile), "ClusterMember"):
+            servers.append([member.get("nodeName"), member.get("memberName")])
+        return servers
+    
+    nodesDir = os.path.join(cellDir, "nodes")
+    nodes = os.listdir(nodesDir)
+    nodes.sort()
+    for node in nodes:
+        serverIndex = os.path.join(nodesDir, node, "serverindex.xml")
+        if not os.path.exists(serverIndex):
+            continue
+        for entry in ofType(readConfigFile(serverIndex), "ServerEntry"):
+            if entry.get("serverType") == "APPLICATION_SERVER":
+                servers.append([node, entry.get("serverName")])
+    return servers
+
+def findClusterMembers(cellDir):
+    """Return {(node, server): cluster name} for the members of every cluster"""
+    clustersDir = os.path.join(cellDir, "clusters")
+    clusterNames = os.path.isdir(clustersDir) and os.listdir(clustersDir) or []
+    members = {}
+    for name in clusterNames:
+        for node, server in findApplicationServers(cellDir, name):
+            members[(node, server)] = name
+    return members
+
+def getServerFile(cellDir, node, server):
+    return os.path.join(cellDir, "nodes", node, "servers", server, "server.xml")
+
+def findResourceFiles(cellDir):
+    """Return every resources.xml of the cell, at cell, cluster, node and server scope"""
+    resourceFiles = []
+    for directory, subdirectories, files in os.walk(cellDir):
+        # Installed applications hold no resources.xml but most of the files
+        if "applications" in subdirectories:
+            subdirectories.remove("applications")
+        subdirectories.sort()
+        if "resources.xml" in files:
+            resourceFiles.append(os.path.join(directory, "resources.xml"))
+    return resourceFiles
+
+def getDataSources(cellDir):
+    """Return [datasource, connection pool, resources.xml path] for the datasources of every scope"""
+    dataSources = []
+    for resourceFile in findResourceFiles(cellDir):
+        for dataSource in ofType(readConfigFile(resourceFile, ["DataSource", "ConnectionPool"]), "DataSource"):
+            dataSources.append([dataSource, dataSource.child("connectionPool"), resourceFile])
+    return dataSources
+
+def getServerSettings(objects):
+    """Return the [setting, value] pairs of the performance report for one server's elements"""
+    settings = []
+    jvm = firstOfType(objects, "JavaVirtualMachine")
+    if jvm is not None:
+        for attribute in ["initialHeapSize", "maximumHeapSize", "genericJvmArguments"]:
+            settings.append(["jvm.%s" % attribute, jvm.get(attribute)])
+    for pool in ofType(objects, "ThreadPool"):
+        for attribute in ["minimumSize", "maximumSize"]:
+            settings.append(["threadpool.%s.%s" % (pool.get("name"), attribute), pool.get(attribute)])
+    webContainer = firstOfType(objects, "WebContainer")
+    if webContainer is not None:
+        settings.append(["webcontainer.enableServletCaching", webContainer.get("enableServletCaching")])
+    sessionManager = firstOfType(objects, "SessionManager")
+    if sessionManager is not None and sessionManager.child("tuningParams") is not None:
+        settings.append(["session.invalidationTimeout", sessionManager.child("tuningParams").get("invalidationTimeout")])
+    cache = firstOfType(objects, "DynamicCache")
+    if cache is not None:
+        for attribute in ["cacheSize", "enableDiskOffload"]:
+            settings.append(["dynamiccache.%s" % attribute, cache.get(attribute)])
+    pmi = firstOfType(objects, "PMIService")
+    if pmi is not None:
+        for attribute in ["enable", "statisticSet"]:
+            settings.append(["pmi.%s" % attribute, pmi.get(attribute)])
+    return settings
+
+def getCellSettings(dataSources):
+    """Return the [setting, value] pairs of the performance report for the cell's datasources"""
+    settings = []
+    for dataSource, connPool, resourceFile in dataSources:
+        if connPool is not None:
+            for attribute in ["minConnections", "maxConnections", "connectionTimeout"]:
+                settings.append(["datasource.%s.%s" % (dataSource.get("name"), attribute), connPool.get(attribute)])
+    return settings
+
+def auditObject(configObject, desired, target, findings):
+    """Add [target, object, attribute, actual, expected] for each attribute that differs from desired"""
+    for attribute, value in desired:
+        if type(value) == type([]):
+            # Nested object such as tuningParams
+            nested = configObject.child(attribute)
+            if nested is None:
+                findings.append([target, configObject.describe(), attribute, "(missing)", "(present)"])
+            else:
+                auditObject(nested, value, target, findings)
+        elif configObject.get(attribute, None) != str(value):
+            findings.append([target, configObject.describe(), attribute, configObject.get(attribute, "(unset)"), str(value)])
+
+def getServerTargets(config, recommendations=None):
+    """Return [config type, attributes] for the server-scoped types with one attribute set per server"""
+    targets = []
+    for configType in tuningTargets.tunedTypes:
+        if configType in tuningTargets.serverTargets:
+            targets.append([configType, tuningTargets.getServerTypeTargets(config, configType, recommendations)])
+    return targets
+
+def auditServer(objects, node, server, clusterName, recommendations, findings):
+    """Add the findings for one server's elements, against its profile and overrides"""
+    target = "%s/%s" % (node, server)
+    config = tuningTargets.getTargetConfig(env, clusterName, node, server)
+    for configType, desired in getServerTargets(config, recommendations):
+        for configObject in ofType(objects, configType):
+            auditObject(configObject, desired, target, findings)
+    pools = ofType(objects, "ThreadPool")
+    for poolName, desired in tuningTargets.getThreadPoolTargets(config, node, server, recommendations):
+        for pool in pools:
+            if pool.get("name") == poolName:
+                auditObject(pool, desired, target, findings)
+
+def auditDataSources(dataSources, recommendations, findings):
+    """Add the findings for the cell's connection pools"""
+    for dataSource, connPool, resourceFile in dataSources:
+        if connPool is not None:
+            config = tuningTargets.getTargetConfig(env, tuningTargets.getScopeCluster(resourceFile))
+            desired = tuningTargets.getConnectionPoolTargets(config, dataSource.get("jndiName"), recommendations)
+            auditObject(connPool, desired, "cell", findings)
+
+def analyzeRepository(cellDir, servers, audit=False, recommendations=None):
+    """Return [report, audit findings] for the servers, reading each file once; findings are empty unless audit is true"""
+    dataSources = getDataSources(cellDir)
+    targets = {"cell": dict(getCellSettings(dataSources))}
+    findings = []
+    if audit:
+        auditDataSources(dataSources, recommendations, findings)
+        members = findClusterMembers(cellDir)
+    for node, server in servers:
+        serverFile = getServerFile(cellDir, node, server)
+        if not os.path.exists(serverFile):
+            print("WARNING: %s not found" % serverFile)
+            continue
+        objects = readConfigFile(serverFile, serverTypes, serverAttributes)
+        targets["%s/%s" % (node, server)] = dict(getServerSettings(objects))
+        if audit:
+            auditServer(objects, node, server, members.get((node, server)), recommendations, findings)
+    report = {"cell": os.path.basename(cellDir), "generated": time.strftime("%Y-%m-%d %H:%M:%S"), "targets": targets}
+    return [report, findings]
+
+def writeFindings(findings, reportFormat, output):
+    """Write the audit findings as text, JSON or CSV"""
+    columns = ["target", "object", "attribute", "actual", "expected"]
+    outputFile = open(output, "w")
+    try:
+        if reportFormat == "json":
+            envConfig.json.dump([dict(zip(columns, finding)) for finding in findings], outputFile, indent=2, sort_keys=True)
+            outputFile.write("\n")
+        elif reportFormat == "csv":
+            writer = csv.writer(outputFile)
+            writer.writerow(columns)
+            for finding in findings:
+                writer.writerow(finding)
+        else:
+            for target, configObject, attribute, actual, expected in findings:
+                outputFile.write("%s %s %s: %s (expected %s)\n" % (target, configObject, attribute, actual, expected))
+    finally:
+        outputFile.close()
+
+def printFindings(findings):
+    """Print the audit findings grouped by target"""
+    lastTarget = None
+    for target, configObject, attribute, actual, expected in findings:
+        if target != lastTarget:
+            print("%s:" % target)
+            lastTarget = target
+        print("  %-40s %-28s %-12s expected %s" % (configObject, attribute, actual, expected))
+
+# Main execution
+if __name__ == "__main__":
+    options = sys.argv[1:]
+    commands = [option for option in options if option in ["report", "audit"]]
+    if not commands or "-help" in options:
+        print("Usage: %s [-repository dir] [-cell name] [-cluster name] report|audit [options]" % sys.argv[0])
+        print("  report      - Performance report with the settings of the live report")
+        print("                [-format text|json|csv] [-output file] [-baseline file] [-approve]")
+        print("  audit       - Settings that differ from the tuning targets; exits with status 1 if any")
+        print("                [-format text|json|csv] [-output file] [-recommendations file]")
+        print("  -repository - Profile config directory (default %s)" % repositoryDir)
+        print("  -cell       - Cell to read (default %s, or the only cell)" % cellName)
+        print("  -cluster    - Only the members of the named cluster")
+        print("  -nocache    - Parse every file instead of reusing the elements cached from earlier runs")
+        sys.exit(2)
+    
+    command = commands[0]
+    reportFormat = envConfig.getOption(options, "-format", "text")
+    started = time.time()
+    try:
+        cellDir = findCellDir(envConfig.getOption(options, "-repository", repositoryDir), envConfig.getOption(options, "-cell", cellName))
+        if "-nocache" not in options:
+            loadParseCache(cellDir)
+        servers = findApplicationServers(cellDir, envConfig.getOption(options, "-cluster"))
+        recommendations = None
+        if "-recommendations" in options:
+            recommendations = envConfig.loadConfig(envConfig.getOption(options, "-recommendations"), "")
+        report, findings = analyzeRepository(cellDir, servers, command == "audit", recommendations)
+        if "-nocache" not in options:
+            saveParseCache()
+    except (IOError, OSError, expat.ExpatError):
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    print("Analyzed %d server(s) of %s in %.2fs" % (len(servers), cellDir, time.time() - started))
+    
+    if command == "report":
+        output = envConfig.getOption(options, "-output", tuningReport.getReportPath(reportBasePath, reportFormat))
+        tuningReport.writeReport(report, reportFormat, output)
+        print("Performance report generated at %s" % output)
+        baseline = envConfig.getOption(options, "-baseline", reportBaseline)
+        if "-approve" in options:
+            tuningReport.writeReport(report, "json", baseline)
+            print("Report approved as the baseline at %s" % baseline)
+        elif os.path.exists(baseline):
+            lines, regressions = tuningReport.compareReports(tuningReport.loadReport(baseline), report)
+            print("Baseline: %s" % baseline)
+            for line in lines:
+                print(line)
+            if regressions:
+                sys.exit(1)
+        else:
+            print("No baseline at %s; approve this report with -approve" % baseline)
+    else:
+        printFindings(findings)
+        output = envConfig.getOption(options, "-output")
+        if output:
+            writeFindings(findings, reportFormat, output)
+            print("Audit findings written to %s" % output)
+        print("%d setting(s) differ from the tuning targets" % len(findings))
+        if findings:
+            sys.exit(1)
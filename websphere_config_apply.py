@@ -0,0 +1,329 @@
+"""
+WebSphere Offline Tuning Engine (Jython/Python)
+Applies the tuning steps of websphere_performance_tuning.py directly to the
+server.xml and resources.xml files of a staged configuration repository,
+without wsadmin or a running deployment manager. It is meant for
+image builds, where the repository is a copy that is tuned before the image
+is sealed.
+
+Each file is parsed once with expat to find the elements to change; only the
+start tags of those elements are rewritten, attribute by attribute, and every
+other byte of the file is kept as it was. A file whose settings already match
+is not written, and a changed file is replaced through a temporary copy.
+Attributes absent from a tag are added to it; nested objects that do not
+exist yet, such as a SessionManager without tuningParams, are reported and
+left for the wsadmin tuning script to create.
+
+The values are those of websphere_tuning_targets.py, with the tuning profile
+and overrides of each server and its cluster, so a repository tuned here
+passes the websphere_config_analyzer.py audit. The members step applies
+the JVM settings websphere_cluster_management.py gives new cluster members,
+to members whose JVM has no heap sizes set yet; members already sized, and
+every member when the jvm step runs as well, keep the jvm step's values.
+The pmi step changes the configuration only; the runtime statistics levels
+the tuning script also sets take effect when the server starts.
+
+After tuning a deployment manager's repository, synchronize the nodes fully
+so the node repositories pick up the edited files.
+
+Usage:
+    python websphere_config_apply.py [-repository dir] [-cell name] [-cluster name] [steps|all] [-recommendations file] [-dryrun]
+"""
+
+# Import required modules
+import sys
+import os
+import re
+import time
+import shutil
+from xml.parsers import expat
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_env_config as envConfig
+import websphere_tuning_targets as tuningTargets
+import websphere_config_analyzer as configAnalyzer
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+cellName = env.get("was.cell")
+repositoryDir = env.get("analyzer.repository")  # Staged profile config directory
+
+# Tuning steps in the order websphere_performance_tuning.py runs them
+stepActions = [step for step, configTypes in tuningTargets.stepTypes]
+
+# A start tag: attribute values are quoted and may contain ">"
+startTagPattern = re.compile("<[^'\">]*(?:(?:\"[^\"]*\"|'[^']*')[^'\">]*)*>".encode("ascii"))
+
+def toBytes(value):
+    return str(value).encode("utf-8")
+
+def escapeValue(value, quote):
+    """Return an attribute value escaped for a tag quoted with quote"""
+    value = value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return value.replace(quote, {"\"": "&quot;", "'": "&apos;"}[quote])
+
+def locateElements(data, configTypes):
+    """Return the ConfigObjects of the given config types in a document, each with the byte offset of its start tag"""
+    objects = []
+    stack = [None]
+
+    def startElement(tag, attributes):
+        configType = configAnalyzer.getConfigType(tag, attributes)
+        if configType not in configTypes:
+            stack.append(None)
+            return
+        configObject = configAnalyzer.ConfigObject(configType, tag, attributes, stack[-1])
+        configObject.offset = parser.CurrentByteIndex
+        if stack[-1] is not None:
+            stack[-1].children.append(configObject)
+        objects.append(configObject)
+        stack.append(configObject)
+
+    def endElement(tag):
+        stack.pop()
+    
+    parser = expat.ParserCreate()
+    if hasattr(parser, "returns_unicode"):
+        # Python 2: plain strings, compared with the str() of the targets
+        parser.returns_unicode = 0
+    parser.StartElementHandler = startElement
+    parser.EndElementHandler = endElement
+    parser.Parse(data, 1)
+    return objects
+
+def planObject(configObject, desired, tagEdits, changes, skipped):
+    """Record the attributes of an element, and of its nested elements, that differ from desired"""
+    for attribute, value in desired:
+        if type(value) == type([]):
+            nested = configObject.child(attribute)
+            if nested is None:
+                skipped.append("%s has no %s" % (configObject.describe(), attribute))
+            else:
+                planObject(nested, value, tagEdits, changes, skipped)
+            continue
+        value = str(value)
+        current = configObject.get(attribute, None)
+        if current == value:
+            continue
+        changes.append([configObject.describe(), attribute, current is None and "(unset)" or current, value])
+        # A later step editing the same element sees this value
+        configObject.attributes[attribute] = value
+        if configObject.offset not in tagEdits:
+            tagEdits[configObject.offset] = []
+        tagEdits[configObject.offset].append([attribute, value])
+
+def rewriteTag(tag, attributes):
+    """Return a start tag with attributes set, changing only their values and appending the absent ones"""
+    for attribute, value in attributes:
+        pattern = re.compile(("(\\s%s\\s*=\\s*)(\"[^\"]*\"|'[^']*')" % re.escape(attribute)).encode("ascii"))
+        match = pattern.search(tag)
+        if match:
+            quote = match.group(2)[:1].decode("ascii")
+            replacement = toBytes(quote + escapeValue(value, quote) + quote)
+            tag = tag[:match.start(2)] + replacement + tag[match.end(2):]
+        else:
+            # After the last attribute, before any whitespace and the closing "/>" or ">"
+            end = len(tag) - 1
+            if tag[end - 1:end] == "/".encode("ascii"):
+                end = end - 1
+            while tag[end - 1:end].isspace():
+                end = end - 1
+            tag = tag[:end] + toBytes(" %s=\"%s\"" % (attribute, escapeValue(value, "\""))) + tag[end:]
+    return tag
+
+def spliceDocument(data, tagEdits):
+    """Return the document with the planned start tags rewritten and every other byte unchanged"""
+    pieces = []
+    position = 0
+    offsets = list(tagEdits.keys())
+    offsets.sort()
+    for offset in offsets:
+        match = startTagPattern.match(data, offset)
+        if not match:
+            raise Exception("No start tag at byte %d" % offset)
+        pieces.append(data[position:offset])
+        pieces.append(rewriteTag(match.group(0), tagEdits[offset]))
+        position = match.end()
+    pieces.append(data[position:])
+    return "".encode("ascii").join(pieces)
+
+def writeDocument(path, data):
+    """Replace a file through a temporary copy with the same permissions"""
+    temporaryPath = path + ".tmp"
+    outputFile = open(temporaryPath, "wb")
+    try:
+        outputFile.write(data)
+    finally:
+        outputFile.close()
+    shutil.copymode(path, temporaryPath)
+    try:
+        os.rename(temporaryPath, path)
+    except OSError:
+        # Windows does not rename over an existing file
+        os.remove(path)
+        os.rename(temporaryPath, path)
+
+def tuneDocument(path, configTypes, selectTargets, dryRun=False):
+    """Apply [element, desired attributes] pairs chosen by selectTargets(elements) to a file; return [changes, skipped]"""
+    inputFile = open(path, "rb")
+    try:
+        data = inputFile.read()
+    finally:
+        inputFile.close()
+    
+    tagEdits = {}
+    changes = []
+    skipped = []
+    for configObject, desired in selectTargets(locateElements(data, configTypes)):
+        planObject(configObject, desired, tagEdits, changes, skipped)
+    if tagEdits and not dryRun:
+        writeDocument(path, spliceDocument(data, tagEdits))
+    return [changes, skipped]
+
+def getStepTypes(steps):
+    """Return the config types, with their nested types, the steps modify in server.xml"""
+    configTypes = {}
+    for step, stepConfigTypes in tuningTargets.stepTypes:
+        if step in steps and step != "connections":
+            for configType in stepConfigTypes:
+                configTypes[configType] = 1
+    if "members" in steps:
+        configTypes["JavaVirtualMachine"] = 1
+    if "SessionManager" in configTypes:
+        configTypes["TuningParams"] = 1
+    return list(configTypes.keys())
+
+def hasHeapSizes(jvm):
+    """Return true if a JavaVirtualMachine element sets its initial or maximum heap size"""
+    return jvm.get("initialHeapSize") not in ["", "0"] or jvm.get("maximumHeapSize") not in ["", "0"]
+
+def getServerSelector(node, server, steps, clusterName, recommendations):
+    """Return the function choosing the elements of one server.xml and their desired attributes"""
+    config = tuningTargets.getTargetConfig(env, clusterName, node, server)
+    def selectTargets(objects):
+        targets = []
+        # The member defaults are for new members only: the jvm step, and
+        # any heap sizes already set, take precedence over them
+        if "members" in steps and "jvm" not in steps and clusterName:
+            for jvm in configAnalyzer.ofType(objects, "JavaVirtualMachine"):
+                if not hasHeapSizes(jvm):
+                    targets.append([jvm, tuningTargets.getMemberJvmTargets(env)])
+        for step, stepConfigTypes in tuningTargets.stepTypes:
+            if step not in steps or step == "connections":
+                continue
+            if step == "threads":
+                pools = configAnalyzer.ofType(objects, "ThreadPool")
+                for poolName, desired in tuningTargets.getThreadPoolTargets(config, node, server, recommendations):
+                    targets.extend([[pool, desired] for pool in pools if pool.get("name") == poolName])
+                continue
+            for configType in stepConfigTypes:
+                desired = tuningTargets.getServerTypeTargets(config, configType, recommendations)
+                targets.extend([[configObject, desired] for configObject in configAnalyzer.ofType(objects, configType)])
+        return targets
+    return selectTargets
+
+def getDataSourceSelector(resourceFile, recommendations):
+    """Return the function choosing the connection pools of one resources.xml and their desired attributes"""
+    # A cluster-scoped datasource takes its cluster's profile
+    config = tuningTargets.getTargetConfig(env, tuningTargets.getScopeCluster(resourceFile))
+    def selectTargets(objects):
+        targets = []
+        for dataSource in configAnalyzer.ofType(objects, "DataSource"):
+            connPool = dataSource.child("connectionPool")
+            if connPool is not None:
+                targets.append([connPool, tuningTargets.getConnectionPoolTargets(config, dataSource.get("jndiName"), recommendations)])
+        return targets
+    return selectTargets
+
+def printChanges(label, changes, skipped):
+    if changes:
+        print("%s: %d change(s)" % (label, len(changes)))
+    for configObject, attribute, current, value in changes:
+        print("  %-40s %-28s %s -> %s" % (configObject, attribute, current, value))
+    for message in skipped:
+        print("  WARNING: %s; not created offline" % message)
+
+def tuneRepository(cellDir, servers, steps, recommendations=None, dryRun=False):
+    """Apply the tuning steps to the servers' server.xml and the cell's resources.xml; return [files changed, files read, changes]"""
+    filesChanged = 0
+    filesRead = 0
+    totalChanges = 0
+    
+    # Cell-scoped step: the connection pools of every datasource, at every scope
+    if "connections" in steps:
+        for resourceFile in configAnalyzer.findResourceFiles(cellDir):
+            selectTargets = getDataSourceSelector(resourceFile, recommendations)
+            changes, skipped = tuneDocument(resourceFile, ["DataSource", "ConnectionPool"], selectTargets, dryRun)
+            printChanges(os.path.relpath(resourceFile, cellDir), changes, skipped)
+            filesRead = filesRead + 1
+            filesChanged = filesChanged + (changes and 1 or 0)
+            totalChanges = totalChanges + len(changes)
+    
+    configTypes = getStepTypes(steps)
+    if not configTypes:
+        return [filesChanged, filesRead, totalChanges]
+    members = configAnalyzer.findClusterMembers(cellDir)
+    for node, server in servers:
+        serverFile = configAnalyzer.getServerFile(cellDir, node, server)
+        if not os.path.exists(serverFile):
+            print("WARNING: %s not found" % serverFile)
+            continue
+        selectTargets = getServerSelector(node, server, steps, members.get((node, server)), recommendations)
+        changes, skipped = tuneDocument(serverFile, configTypes, selectTargets, dryRun)
+        printChanges("%s/%s" % (node, server), changes, skipped)
+        filesRead = filesRead + 1
+        filesChanged = filesChanged + (changes and 1 or 0)
+        totalChanges = totalChanges + len(changes)
+    return [filesChanged, filesRead, totalChanges]
+
+# Main execution
+if __name__ == "__main__":
+    options = sys.argv[1:]
+    valueOptions = ["-repository", "-cell", "-cluster", "-recommendations"]
+    arguments = [option for index, option in enumerate(options)
+                 if not option.startswith("-") and (index == 0 or options[index - 1] not in valueOptions)]
+    action = arguments and arguments[0] or "all"
+    if action == "all":
+        steps = stepActions
+    else:
+        steps = action.split(",")
+    invalidSteps = [step for step in steps if step not in stepActions + ["members"]]
+    
+    if invalidSteps or "-help" in options:
+        print("Usage: %s [-repository dir] [-cell name] [-cluster name] [jvm|threads|connections|web|cache|async|pmi|orb|transactions|members|all] [options]" % sys.argv[0])
+        print("  jvm, threads, connections, web, cache, async, pmi, orb, transactions")
+        print("                  - The steps of websphere_performance_tuning.py, combined with commas")
+        print("  members         - JVM settings of websphere_cluster_management.py, for cluster members without")
+        print("                    heap sizes; ignored when combined with jvm")
+        print("  all             - Every tuning step (default)")
+        print("  -repository     - Staged profile config directory (default %s)" % repositoryDir)
+        print("  -cell           - Cell to tune (default %s, or the only cell)" % cellName)
+        print("  -cluster        - Only the members of the named cluster; connection pools are tuned at every scope")
+        print("  -recommendations - Pool, heap and cache sizes from websphere_pool_recommender.py, websphere_gc_analyzer.py")
+        print("                     or websphere_cachespec_generator.py")
+        print("  -dryrun         - Print the changes without writing any file")
+        sys.exit(2)
+    
+    dryRun = "-dryrun" in options
+    started = time.time()
+    try:
+        cellDir = configAnalyzer.findCellDir(envConfig.getOption(options, "-repository", repositoryDir), envConfig.getOption(options, "-cell", cellName))
+        servers = configAnalyzer.findApplicationServers(cellDir, envConfig.getOption(options, "-cluster"))
+        recommendations = None
+        if "-recommendations" in options:
+            recommendations = envConfig.loadConfig(envConfig.getOption(options, "-recommendations"), "")
+        filesChanged, filesRead, totalChanges = tuneRepository(cellDir, servers, steps, recommendations, dryRun)
+    except (IOError, OSError, expat.ExpatError):
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    
+    if dryRun:
+        print("Dry run: %d change(s) in %d of %d file(s) not written (%.2fs)" % (totalChanges, filesChanged, filesRead, time.time() - started))
+    else:
+        print("Tuned %d server(s) of %s: %d change(s) in %d of %d file(s) in %.2fs" % (len(servers), cellDir, totalChanges,
+              filesChanged, filesRead, time.time() - started))
@@ -0,0 +1,310 @@
+"""
+WebSphere Configuration Lookup Cache (Jython)
+Shared helper module that memoizes AdminConfig lookups for the wsadmin scripts.
+
+Every AdminConfig call is a JMX round trip to the deployment manager, so the
+scripts resolve containment paths, child-type listings and attribute reads
+through this module instead. Attribute reads fetch the object's whole
+attribute set with one AdminConfig.show call, and showAll returns an object
+with its nested objects (such as tuningParams) expanded from one
+AdminConfig.showall call. Writes made through modify/create/remove
+invalidate the cached entries they can affect. Every lookup and write holds
+one module lock, so worker threads (such as the tuning fan-out) share the
+cache and the wsadmin session one AdminConfig call at a time.
+
+Usage from a wsadmin script:
+    import websphere_config_cache as configCache
+    configCache.bindAdminObjects(globals())
+"""
+
+import threading
+
+import websphere_env_config as envConfig
+
+# wsadmin scripting objects, bound by bindAdminObjects()
+AdminConfig = None
+
+# Held around every cache access and AdminConfig call; neither the cache
+# dictionaries nor the wsadmin session are documented as thread-safe
+lock = threading.RLock()
+
+# Cached lookups
+idCache = {}         # containment path -> config ID ("" when not found)
+listCache = {}       # (config type, scope) -> list of config IDs
+attributeCache = {}  # config ID -> {attribute name: value}
+shownObjects = {}    # config IDs whose full attribute set is in attributeCache
+objectCache = {}     # config ID -> parsed AdminConfig.showall output
+
+
+def bindAdminObjects(namespace):
+    """Bind the wsadmin scripting objects found in a script's global namespace"""
+    global AdminConfig
+    if "AdminConfig" in namespace.keys():
+        AdminConfig = namespace["AdminConfig"]
+
+def clear():
+    """Drop every cached entry, e.g. after AdminConfig.reset()"""
+    lock.acquire()
+    try:
+        idCache.clear()
+        listCache.clear()
+        attributeCache.clear()
+        shownObjects.clear()
+        objectCache.clear()
+    finally:
+        lock.release()
+
+def getid(containmentPath):
+    """Return the config ID for a containment path such as /Cell:c/Node:n/Server:s/"""
+    lock.acquire()
+    try:
+        if containmentPath not in idCache:
+            idCache[containmentPath] = AdminConfig.getid(containmentPath)
+        return idCache[containmentPath]
+    finally:
+        lock.release()
+
+def getServerID(cellName, nodeName, serverName):
+    """Return the config ID of a server"""
+    return getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
+
+def getNodeName(configID):
+    """Return the node name from a config ID such as server1(cells/c/nodes/n/servers/server1|server.xml#Server_1)"""
+    path = configID.split("|")[0]
+    if path.find("/nodes/") < 0:
+        return ""
+    return path.split("/nodes/")[1].split("/")[0]
+
+def listObjects(configType, scope=None):
+    """Return the config IDs of all objects of a type, optionally within a scope"""
+    lock.acquire()
+    try:
+        key = (configType, scope)
+        if key not in listCache:
+            if scope:
+                output = AdminConfig.list(configType, scope)
+            else:
+                output = AdminConfig.list(configType)
+            listCache[key] = [line for line in output.splitlines() if line.strip()]
+        return listCache[key]
+    finally:
+        lock.release()
+
+def listFirst(configType, scope=None):
+    """Return the first config ID of a type within a scope, or "" if there is none"""
+    objects = listObjects(configType, scope)
+    if objects:
+        return objects[0]
+    return ""
+
+def tokenize(text):
+    """Split AdminConfig.show output into "[", "]" and value tokens (quotes removed)"""
+    tokens = []
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char in " \t\r\n":
+            index = index + 1
+        elif char in "[]":
+            tokens.append(char)
+            index = index + 1
+        elif char == '"':
+            end = text.find('"', index + 1)
+            if end < 0:
+                end = len(text)
+            # Values are wrapped in a list so a quoted "[" is not taken for a bracket
+            tokens.append([text[index + 1:end]])
+            index = end + 1
+        else:
+            end = index
+            while end < len(text) and text[end] not in " \t\r\n]":
+                end = end + 1
+            tokens.append([text[index:end]])
+            index = end
+    return tokens
+
+def parseGroups(tokens):
+    """Return the bracketed groups of a token list as nested lists of strings"""
+    stack = [[]]
+    for token in tokens:
+        if token == "[":
+            stack.append([])
+        elif token == "]":
+            if len(stack) > 1:
+                group = stack.pop()
+                stack[-1].append(group)
+        else:
+            stack[-1].append(token[0])
+    return stack[0]
+
+def isAttributePair(item):
+    """Return true for a [name] or [name value] group"""
+    return type(item) == type([]) and 0 < len(item) <= 2 and envConfig.isString(item[0])
+
+def convertValue(value):
+    """Return a parsed value: a string, a list, or a dict for a nested object"""
+    if type(value) != type([]):
+        return value
+    if value and len([item for item in value if isAttributePair(item)]) == len(value):
+        # [[name value] [name value]]: a nested object expanded by showall
+        return convertAttributes(value)
+    return [convertValue(item) for item in value]
+
+def convertAttributes(groups):
+    """Return {attribute: value} for [name value] groups"""
+    attributes = {}
+    for group in groups:
+        if type(group) != type([]) or not group or not envConfig.isString(group[0]):
+            continue
+        if len(group) == 1:
+            attributes[group[0]] = ""
+        elif len(group) == 2:
+            attributes[group[0]] = convertValue(group[1])
+        else:
+            # An unquoted value containing spaces
+            attributes[group[0]] = " ".join([formatAttribute(item) for item in group[1:]])
+    return attributes
+
+def parseShowOutput(text):
+    """Parse AdminConfig.show or showall output into {attribute: value} with nested dicts and lists"""
+    if not text:
+        return {}
+    return convertAttributes(parseGroups(tokenize(text)))
+
+def formatAttribute(value):
+    """Return a parsed value in the string form AdminConfig.showAttribute reports it"""
+    if type(value) == type({}):
+        names = value.keys()
+        names.sort()
+        return formatAttribute([[name, value[name]] for name in names])
+    if type(value) == type([]):
+        items = []
+        for item in value:
+            formatted = formatAttribute(item)
+            if envConfig.isString(item) and formatted.find(" ") >= 0:
+                formatted = '"%s"' % formatted
+            items.append(formatted)
+        return "[%s]" % " ".join(items)
+    return value
+
+def loadAttributes(configID):
+    """Fetch every attribute of a config object with a single AdminConfig.show call"""
+    lock.acquire()
+    try:
+        attributes = attributeCache.setdefault(configID, {})
+        for attribute, value in parseShowOutput(AdminConfig.show(configID)).items():
+            if attribute not in attributes:
+                attributes[attribute] = formatAttribute(value)
+        shownObjects[configID] = 1
+        return attributes
+    finally:
+        lock.release()
+
+def showAttribute(configID, attribute):
+    """Return the value of a single attribute of a config object"""
+    lock.acquire()
+    try:
+        if configID not in shownObjects:
+            loadAttributes(configID)
+        attributes = attributeCache[configID]
+        if attribute not in attributes:
+            # show leaves out attributes that are not set
+            attributes[attribute] = AdminConfig.showAttribute(configID, attribute)
+        return attributes[attribute]
+    finally:
+        lock.release()
+
+def showAll(configID):
+    """Return {attribute: value} for a config object with its nested objects expanded, from one AdminConfig.showall call"""
+    lock.acquire()
+    try:
+        if configID not in objectCache:
+            objectCache[configID] = parseShowOutput(AdminConfig.showall(configID))
+        return objectCache[configID]
+    finally:
+        lock.release()
+
+def findByName(configType, scope, name):
+    """Return the config ID of the object of a type whose name attribute matches, or "" """
+    for configID in listObjects(configType, scope):
+        if showAttribute(configID, "name") == name:
+            return configID
+    return ""
+
+def findApplicationServers(clusterName=None):
+    """Return [node, server] pairs for every application server in the cell, or every member of a cluster"""
+    servers = []
+    if clusterName:
+        clusterID = findByName("ServerCluster", None, clusterName)
+        if not clusterID:
+            return servers
+        for member in listObjects("ClusterMember", clusterID):
+            servers.append([showAttribute(member, "nodeName"), showAttribute(member, "memberName")])
+    else:
+        for serverID in listObjects("Server"):
+            if showAttribute(serverID, "serverType") == "APPLICATION_SERVER":
+                servers.append([getNodeName(serverID), showAttribute(serverID, "name")])
+    return servers
+
+def invalidate(configID=None, configType=None):
+    """Drop cached attributes of an object and cached listings of a type"""
+    lock.acquire()
+    try:
+        if configID and configID in attributeCache:
+            del attributeCache[configID]
+        if configID and configID in shownObjects:
+            del shownObjects[configID]
+        if configID:
+            # The object may be nested in an expanded parent
+            objectCache.clear()
+        if configType:
+            for key in listCache.keys():
+                if key[0] == configType:
+                    del listCache[key]
+    finally:
+        lock.release()
+
+def modify(configID, attributes):
+    """Modify a config object and invalidate its cached attributes"""
+    lock.acquire()
+    try:
+        result = AdminConfig.modify(configID, attributes)
+        invalidate(configID)
+        
+        # Nested attribute lists (e.g. tuningParams) can create child objects,
+        # so any listing may now be out of date
+        for attribute in attributes:
+            if type(attribute[1]) == type([]):
+                listCache.clear()
+                break
+        return result
+    finally:
+        lock.release()
+
+def create(configType, parent, attributes, parentAttribute=None):
+    """Create a config object and invalidate the lookups it can affect"""
+    lock.acquire()
+    try:
+        if parentAttribute:
+            configID = AdminConfig.create(configType, parent, attributes, parentAttribute)
+        else:
+            configID = AdminConfig.create(configType, parent, attributes)
+        
+        # A new object can appear in any listing and make new containment paths
+        # resolvable, including objects WebSphere creates underneath it
+        listCache.clear()
+        idCache.clear()
+        invalidate(parent)
+        return configID
+    finally:
+        lock.release()
+
+def remove(configID):
+    """Remove a config object and invalidate the lookups it can affect"""
+    lock.acquire()
+    try:
+        result = AdminConfig.remove(configID)
+        clear()
+        return result
+    finally:
+        lock.release()
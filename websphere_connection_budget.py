@@ -0,0 +1,273 @@
+"""
+WebSphere Database Connection Budget (Jython)
+Plans the maxConnections of every datasource that connects to the database
+named by db.url so that, with every pool full in every server, the cell never
+opens more sessions than the database allows (db.session.budget).
+
+A datasource's pool exists in every application server of its scope, so its
+worst case is maxConnections x the servers in that scope; a datasource at
+cell scope on a 10-member cluster opens up to 10 x maxConnections sessions.
+The budget, less db.session.reserve sessions kept for administration and
+batch work, is shared out across the datasources in proportion to their
+servers, or to the cluster weights of those servers with -weighted. A
+datasource never gets more than the maximum the tuning steps would give it
+(tuning.connection.pool.max, from the cluster's profile for a datasource at
+cluster scope, or its recommendation); what it does not need
+goes to the others.
+
+The allocation can be written as a -recommendations file, so later runs of
+websphere_performance_tuning.py connections keep it.
+
+Usage:
+    wsadmin -lang jython -f websphere_connection_budget.py plan|apply [-budget sessions] [-weighted] [-recommendations file] [-output file] [-sync]
+"""
+
+# Import required modules
+import sys
+import os
+import time
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_config_cache as configCache
+import websphere_desired_state as desiredState
+import websphere_node_sync as nodeSync
+import websphere_env_config as envConfig
+import websphere_tuning_targets as tuningTargets
+import websphere_pool_recommender as poolRecommender
+configCache.bindAdminObjects(globals())
+nodeSync.bindAdminObjects(globals())
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+databaseUrl = env.get("db.url")
+sessionBudget = env.getInt("db.session.budget")       # Sessions the database accepts from the cell
+sessionReserve = env.getInt("db.session.reserve")     # Sessions kept out of the pools
+defaultWeight = env.getInt("db.session.default.weight")  # Weight of servers outside any cluster
+
+# Datasource properties that identify the database, in order of preference
+backendProperties = ["URL", "url", "serverName", "databaseName"]
+
+class PoolPlan:
+    """One datasource: the servers its pool runs in, its sizes now, and its allocation"""
+    def __init__(self, dataSource, connPool, name, jndiName, scope, servers, weight):
+        self.dataSource = dataSource
+        self.connPool = connPool
+        self.name = name
+        self.jndiName = jndiName
+        self.scope = scope
+        self.servers = servers
+        self.weight = weight
+        self.zeroWeightServers = []  # Servers in scope with cluster weight 0 (-weighted)
+        self.currentMax = 0
+        self.targetMin = 0
+        self.targetMax = 0
+        self.allocatedMax = 0
+
+def getScope(configID):
+    """Return [scope type, scope path] from a config ID such as ds(cells/c/clusters/x|resources.xml#DataSource_1)"""
+    path = configID.split("(")[-1].split("|")[0]
+    parts = path.split("/")
+    if len(parts) >= 6 and parts[2] == "nodes" and parts[4] == "servers":
+        return ["server", "%s/%s" % (parts[3], parts[5])]
+    if len(parts) >= 4 and parts[2] == "clusters":
+        return ["cluster", parts[3]]
+    if len(parts) >= 4 and parts[2] == "nodes":
+        return ["node", parts[3]]
+    if len(parts) >= 4 and parts[2] == "applications":
+        return ["application", parts[3]]
+    return ["cell", parts[1]]
+
+def getScopeServers(scopeType, scopeName, allServers):
+    """Return the [node, server] pairs that run the pools of a datasource in a scope"""
+    if scopeType == "server":
+        return [scopeName.split("/")]
+    if scopeType == "cluster":
+        return configCache.findApplicationServers(scopeName)
+    if scopeType == "node":
+        return [target for target in allServers if target[0] == scopeName]
+    # Cell scope, and application scope, whose servers are wherever the
+    # application is deployed: counted as every server for the worst case
+    return allServers
+
+def getServerWeights():
+    """Return {(node, server): cluster weight} for every cluster member"""
+    weights = {}
+    for member in configCache.listObjects("ClusterMember"):
+        key = (configCache.showAttribute(member, "nodeName"), configCache.showAttribute(member, "memberName"))
+        weights[key] = int(configCache.showAttribute(member, "weight") or defaultWeight)
+    return weights
+
+def getBackend(dataSource):
+    """Return the database a datasource connects to, from its URL or server and database names"""
+    properties = {}
+    for prop in configCache.listObjects("J2EEResourceProperty", dataSource):
+        properties[configCache.showAttribute(prop, "name")] = configCache.showAttribute(prop, "value")
+    for name in backendProperties:
+        if properties.get(name):
+            return properties[name]
+    return ""
+
+def collectPlans(recommendations=None, weighted=False):
+    """Return [plans for the budgeted database, {other backend: worst-case sessions}]"""
+    allServers = configCache.findApplicationServers()
+    weights = {}
+    if weighted:
+        weights = getServerWeights()
+    
+    plans = []
+    otherBackends = {}
+    for dataSource in configCache.listObjects("DataSource"):
+        connPool = configCache.listFirst("ConnectionPool", dataSource)
+        if not connPool:
+            continue
+        scopeType, scopeName = getScope(dataSource)
+        servers = getScopeServers(scopeType, scopeName, allServers)
+        currentMax = int(configCache.showAttribute(connPool, "maxConnections") or 0)
+        backend = getBackend(dataSource)
+        if backend != databaseUrl:
+            otherBackends[backend or "(unknown)"] = otherBackends.get(backend or "(unknown)", 0) + currentMax * len(servers)
+            continue
+        
+        weight = len(servers)
+        zeroWeightServers = []
+        if weighted:
+            weight = 0
+            for node, server in servers:
+                weight = weight + weights.get((node, server), defaultWeight)
+                if weights.get((node, server), defaultWeight) == 0:
+                    zeroWeightServers.append("%s/%s" % (node, server))
+        jndiName = configCache.showAttribute(dataSource, "jndiName")
+        plan = PoolPlan(dataSource, connPool, configCache.showAttribute(dataSource, "name"), jndiName,
+                        "%s %s" % (scopeType, scopeName), servers, weight)
+        plan.zeroWeightServers = zeroWeightServers
+        plan.currentMax = currentMax
+        config = tuningTargets.getTargetConfig(env, tuningTargets.getScopeCluster(dataSource))
+        targets = dict([[attribute, value] for attribute, value in tuningTargets.getConnectionPoolTargets(config, jndiName, recommendations)])
+        plan.targetMin = int(targets["minConnections"])
+        plan.targetMax = int(targets["maxConnections"])
+        plans.append(plan)
+    return [plans, otherBackends]
+
+def getPlannedPools(plans):
+    """Return the plans whose pool runs in at least one server with a weight; the others get no allocation"""
+    return [plan for plan in plans if plan.servers and plan.weight > 0]
+
+def allocateBudget(plans, budget):
+    """Set allocatedMax on every planned pool so the worst case of all pools stays within budget"""
+    # A pool that gets no allocation keeps its size and still opens up to
+    # currentMax sessions per server, so that comes off the budget first
+    remaining = float(budget)
+    pending = getPlannedPools(plans)
+    for plan in plans:
+        if plan not in pending:
+            plan.allocatedMax = plan.currentMax
+            remaining = remaining - plan.currentMax * len(plan.servers)
+    
+    # Water-filling: each unit of weight is offered the same share; a pool that
+    # needs less than its share takes only its target and frees the rest
+    while pending:
+        share = remaining / max(sum([plan.weight for plan in pending]), 1)
+        satisfied = [plan for plan in pending if plan.targetMax * len(plan.servers) <= share * plan.weight]
+        if not satisfied:
+            break
+        for plan in satisfied:
+            plan.allocatedMax = plan.targetMax
+            remaining = remaining - plan.targetMax * len(plan.servers)
+            pending.remove(plan)
+    for plan in pending:
+        plan.allocatedMax = max(int(share * plan.weight / len(plan.servers)), 1)
+
+def worstCase(plans, attribute):
+    total = 0
+    for plan in plans:
+        total = total + getattr(plan, attribute) * len(plan.servers)
+    return total
+
+def printPlan(plans, otherBackends, budget):
+    """Print the allocation per datasource and the worst case before and after"""
+    print "Database %s: budget %d sessions (%d reserved)" % (databaseUrl, budget + sessionReserve, sessionReserve)
+    print "  %-28s %-30s %7s %6s %8s %8s %10s" % ("Datasource", "Scope", "Servers", "Weight", "Max now", "Max new", "Worst new")
+    for plan in getPlannedPools(plans):
+        print "  %-28s %-30s %7d %6d %8d %8d %10d" % (plan.name, plan.scope, len(plan.servers), plan.weight,
+                                                     plan.currentMax, plan.allocatedMax, plan.allocatedMax * len(plan.servers))
+    print "Worst case now: %d sessions; planned: %d of %d" % (worstCase(plans, "currentMax"), worstCase(plans, "allocatedMax"), budget)
+    if worstCase(plans, "allocatedMax") > budget:
+        if len(getPlannedPools(plans)) < len(plans):
+            print "WARNING: The budget is too small to give every pool one connection next to the pools left unchanged"
+        else:
+            print "WARNING: The budget is too small to give every pool one connection"
+    for backend in otherBackends.keys():
+        print "Not budgeted: %s, worst case %d sessions" % (backend, otherBackends[backend])
+    for plan in plans:
+        if not plan.servers:
+            print "Not planned: %s (%s) has no application servers in its scope; its pool is left unchanged" % (plan.name, plan.scope)
+        elif plan.weight == 0:
+            print "Not planned: %s (%s) runs only in servers with cluster weight 0; its pool is left unchanged, worst case %d sessions" % (
+                plan.name, plan.scope, plan.currentMax * len(plan.servers))
+        elif plan.zeroWeightServers:
+            print "Weight 0: %s also runs in %s, which add no weight but share its allocation" % (plan.name, ", ".join(plan.zeroWeightServers))
+
+def applyPlan(plans):
+    """Set maxConnections, and minConnections where it would exceed it, on every planned pool"""
+    for plan in getPlannedPools(plans):
+        desired = [["maxConnections", plan.allocatedMax], ["minConnections", min(plan.targetMin, plan.allocatedMax)]]
+        desiredState.applyDesiredState(plan.connPool, desired, "%s ConnectionPool" % plan.name)
+    desiredState.printSummary()
+    if not AdminConfig.hasChanges():
+        print "Connection pools already match the plan; nothing to save"
+        return False
+    AdminConfig.save()
+    print "Connection pool plan saved"
+    return True
+
+def writePlan(plans, output, budget):
+    """Write the allocation as tuning.datasource.* recommendations"""
+    rows = []
+    for plan in getPlannedPools(plans):
+        note = "%s (%s): %d server(s), weight %d, worst case %d sessions" % (plan.name, plan.scope, len(plan.servers),
+                                                                          plan.weight, plan.allocatedMax * len(plan.servers))
+        rows.append(["tuning.datasource.%s" % plan.jndiName, min(plan.targetMin, plan.allocatedMax), plan.allocatedMax, note])
+    description = "Connection budget for %s: %d sessions, generated %s" % (databaseUrl, budget, time.strftime("%Y-%m-%d %H:%M:%S"))
+    poolRecommender.writeRecommendations(rows, output, description, "websphere_connection_budget.py")
+    print "Plan written to %s; pass it to websphere_performance_tuning.py with -recommendations" % output
+
+# Main execution
+if __name__ == "__main__":
+    action = sys.argv[0] if len(sys.argv) > 0 else "plan"
+    options = sys.argv[1:]
+    
+    if action not in ["plan", "apply"]:
+        print "Usage: wsadmin -f %s plan|apply [-budget sessions] [-weighted] [-recommendations file] [-output file] [-sync]" % __file__
+        print "  plan             - Print the maxConnections each datasource gets within the budget"
+        print "  apply            - Set the planned maxConnections on every datasource and save"
+        print "  -budget          - Sessions the database accepts from the cell (default %d)" % sessionBudget
+        print "  -weighted        - Share the budget by cluster member weight instead of by server count"
+        print "  -recommendations - Pool sizes from websphere_pool_recommender.py, used as each pool's target"
+        print "  -output          - Write the plan as a -recommendations file for websphere_performance_tuning.py"
+        print "  -sync            - Synchronize every node once the plan is saved"
+        sys.exit(1)
+    
+    recommendations = None
+    if "-recommendations" in options:
+        recommendations = envConfig.loadConfig(envConfig.getOption(options, "-recommendations"), "")
+    budget = int(envConfig.getOption(options, "-budget", sessionBudget)) - sessionReserve
+    
+    plans, otherBackends = collectPlans(recommendations, "-weighted" in options)
+    if not plans:
+        print "ERROR: No datasource connects to %s" % databaseUrl
+        sys.exit(1)
+    allocateBudget(plans, budget)
+    printPlan(plans, otherBackends, budget)
+    
+    output = envConfig.getOption(options, "-output")
+    if output:
+        writePlan(plans, output, budget)
+    if action == "apply":
+        if applyPlan(plans) and "-sync" in options:
+            if not nodeSync.syncNodes(nodeSync.getManagedNodes()):
+                sys.exit(1)
@@ -6,19 +6,66 @@ This script demonstrates how to deploy an application to WebSphere using wsadmin
 # Import required modules
 import sys
 import os
+import time
+import zipfile
+import hashlib
+import tempfile
 import java.lang.System
 
-# Configuration parameters
-nodeName = "YourNodeName"
-serverName = "YourServerName"
-cellName = "YourCellName"
-clusterName = "YourClusterName"  # If deploying to a cluster
-earFile = "/path/to/your/application.ear"
-appName = "YourApplicationName"
-contextRoot = "/yourContextRoot"  # For web modules
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_config_cache as configCache
+import websphere_node_sync as nodeSync
+import websphere_env_config as envConfig
+import websphere_call_trace as callTrace
+callTrace.install(globals())
+configCache.bindAdminObjects(globals())
+nodeSync.bindAdminObjects(globals())
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+nodeName = env.get("was.node")
+serverName = env.get("server.name")
+cellName = env.get("was.cell")
+clusterName = env.get("cluster.name")  # If deploying to a cluster
+earFile = env.get("app.ear.path")
+appName = env.get("app.name")
+contextRoot = env.get("app.context.root")  # For web modules
+virtualHost = env.get("app.virtual.host")
+
+# Rolling cluster deployment
+webServerName = env.get("webserver.name")  # Plugin regenerated when member weights change ("" to skip)
+webServerNodeName = env.get("webserver.node")
+rollingBatchSize = 1             # Members updated at once
+drainMinimum = 60                # Seconds to wait after weight 0 (covers the plugin RefreshInterval)
+drainTimeout = 300               # Maximum seconds to wait for in-flight requests to finish
+memberStartTimeout = 600         # Maximum seconds to wait for a restarted member to run the application
+
+# Incremental update
+moduleHashDir = os.path.join(os.path.expanduser("~"), ".websphere_deploy")  # Module hashes recorded per application
+moduleExtensions = [".war", ".jar", ".rar"]
+
+def getInstallOptions(toCluster=False):
+    """Return the AdminApp.install options for a single server or the cluster"""
+    if toCluster:
+        target = ['-cluster', clusterName]
+    else:
+        target = ['-node', nodeName, '-server', serverName]
+    if contextRoot:
+        target = target + ['-contextroot', contextRoot]
+    return ['-appname', appName] + target + [
+        '-MapWebModToVH', [['.*', '.*', virtualHost]],
+        '-usedefaultbindings',
+        '-defaultbinding.virtual.host', virtualHost,
+        '-nouseMetaDataFromBinary'
+    ]
 
 # Get AdminApp and AdminConfig objects
-def deployApplication():
+def deployApplication(toCluster=False):
     print "Starting application deployment..."
     
     # Check if application already exists and remove if it does
@@ -29,27 +76,7 @@ def deployApplication():
         AdminConfig.save()
     
     # Set deployment options
-    options = [
-        '-appname', appName,
-        '-node', nodeName,
-        '-server', serverName,
-        '-contextroot', contextRoot,
-        '-MapWebModToVH', [['.*', '.*', 'default_host']],
-        '-usedefaultbindings',
-        '-defaultbinding.virtual.host', 'default_host',
-        '-nouseMetaDataFromBinary'
-    ]
-    
-    # For cluster deployment, use these options instead:
-    # options = [
-    #     '-appname', appName,
-    #     '-cluster', clusterName,
-    #     '-contextroot', contextRoot,
-    #     '-MapWebModToVH', [['.*', '.*', 'default_host']],
-    #     '-usedefaultbindings',
-    #     '-defaultbinding.virtual.host', 'default_host',
-    #     '-nouseMetaDataFromBinary'
-    # ]
+    options = getInstallOptions(toCluster)
     
     # Install the application
     print "Installing application %s from %s" % (appName, earFile)
@@ -61,13 +88,386 @@ def deployApplication():
     
     # Start the application
     print "Starting application..."
-    appManager = AdminControl.queryNames('type=ApplicationManager,node=%s,process=%s,*' % (nodeName, serverName))
-    AdminControl.invoke(appManager, 'startApplication', appName)
+    if toCluster:
+        for node, server in getClusterMembers():
+            appManager = AdminControl.queryNames('type=ApplicationManager,node=%s,process=%s,*' % (node, server))
+            if appManager:
+                AdminControl.invoke(appManager, 'startApplication', appName)
+    else:
+        appManager = AdminControl.queryNames('type=ApplicationManager,node=%s,process=%s,*' % (nodeName, serverName))
+        AdminControl.invoke(appManager, 'startApplication', appName)
     
+    recordModuleHashes(computeModuleHashes(earFile))
     print "Application %s deployed successfully" % appName
 
+def isModuleEntry(name):
+    """Return true for a top-level module of the EAR (lib/ jars are application content)"""
+    if name.find("/") >= 0:
+        return False
+    return os.path.splitext(name)[1].lower() in moduleExtensions
+
+def computeModuleHashes(path):
+    """Return {module uri: sha1} for each top-level module of an EAR, plus one hash for everything else"""
+    hashes = {}
+    applicationHash = hashlib.sha1()
+    ear = zipfile.ZipFile(path)
+    try:
+        names = ear.namelist()
+        names.sort()
+        for name in names:
+            if name.endswith("/"):
+                continue
+            if isModuleEntry(name):
+                digest = hashlib.sha1()
+            else:
+                # Deployment descriptors and shared libraries affect every module
+                digest = applicationHash
+                digest.update(name)
+            entry = ear.open(name)
+            chunk = entry.read(1048576)
+            while chunk:
+                digest.update(chunk)
+                chunk = entry.read(1048576)
+            entry.close()
+            if isModuleEntry(name):
+                hashes[name] = digest.hexdigest()
+    finally:
+        ear.close()
+    hashes["*application*"] = applicationHash.hexdigest()
+    return hashes
+
+def getModuleHashFile():
+    """Return the file the module hashes of the application are recorded in"""
+    return os.path.join(moduleHashDir, "%s.modules" % appName)
+
+def loadModuleHashes():
+    """Return the module hashes recorded at the last deploy, or None if there are none"""
+    if not os.path.exists(getModuleHashFile()):
+        return None
+    hashes = {}
+    hashFile = open(getModuleHashFile())
+    for line in hashFile.readlines():
+        fields = line.strip().split(" ", 1)
+        if len(fields) == 2:
+            hashes[fields[1]] = fields[0]
+    hashFile.close()
+    return hashes
+
+def recordModuleHashes(hashes):
+    """Record the module hashes of the deployed EAR"""
+    if not os.path.isdir(moduleHashDir):
+        os.makedirs(moduleHashDir)
+    hashFile = open(getModuleHashFile(), "w")
+    names = hashes.keys()
+    names.sort()
+    for name in names:
+        hashFile.write("%s %s\n" % (hashes[name], name))
+    hashFile.close()
+
+def extractModule(name):
+    """Copy a module out of the EAR into a temporary file and return its path"""
+    ear = zipfile.ZipFile(earFile)
+    try:
+        handle, path = tempfile.mkstemp(suffix=os.path.splitext(name)[1])
+        output = os.fdopen(handle, "wb")
+        entry = ear.open(name)
+        chunk = entry.read(1048576)
+        while chunk:
+            output.write(chunk)
+            chunk = entry.read(1048576)
+        entry.close()
+        output.close()
+    finally:
+        ear.close()
+    return path
+
+def incrementalDeploy(toCluster=False):
+    """Update only the modules of the EAR whose content changed since the last deploy"""
+    print "Starting incremental deployment of %s from %s" % (appName, earFile)
+    
+    newHashes = computeModuleHashes(earFile)
+    oldHashes = loadModuleHashes()
+    
+    if appName not in AdminApp.list().splitlines() or oldHashes is None:
+        print "No deployed version with recorded module hashes; performing a full deployment"
+        deployApplication(toCluster)
+        return True
+    
+    changed = [name for name in newHashes.keys() if name in oldHashes and oldHashes[name] != newHashes[name]]
+    added = [name for name in newHashes.keys() if name not in oldHashes]
+    removed = [name for name in oldHashes.keys() if name not in newHashes]
+    
+    if not changed and not added and not removed:
+        print "No module of %s has changed; nothing to deploy" % appName
+        return True
+    
+    if "*application*" in changed or added or removed:
+        # Descriptor, shared library or module list changes need the whole EAR,
+        # but an update still keeps the existing bindings
+        print "Application-level content changed; updating the whole application"
+        AdminApp.update(appName, 'app', ['-operation', 'update', '-contents', earFile, '-nouseMetaDataFromBinary'])
+    else:
+        for name in changed:
+            print "Updating module %s" % name
+            modulePath = extractModule(name)
+            try:
+                AdminApp.update(appName, 'modulefile', ['-operation', 'update', '-contents', modulePath, '-contenturi', name])
+            finally:
+                os.remove(modulePath)
+    
+    print "Saving configuration..."
+    AdminConfig.save()
+    recordModuleHashes(newHashes)
+    
+    modules = [name for name in newHashes.keys() if name != "*application*"]
+    unchanged = [name for name in modules if name not in changed and name not in added]
+    print "Application %s updated: %d module(s) unchanged" % (appName, len(unchanged))
+    return True
+
+def getClusterMembers():
+    """Return [node, server] pairs for the members of the cluster"""
+    clusterID = configCache.findByName("ServerCluster", None, clusterName)
+    if not clusterID:
+        return []
+    members = []
+    for member in configCache.listObjects("ClusterMember", clusterID):
+        members.append([configCache.showAttribute(member, "nodeName"), configCache.showAttribute(member, "memberName")])
+    return members
+
+def planRollingBatches(members, batchSize):
+    """Split members into batches of at most batchSize, keeping the members of a node in consecutive batches"""
+    nodes = []
+    membersByNode = {}
+    for node, server in members:
+        if node not in membersByNode:
+            nodes.append(node)
+            membersByNode[node] = []
+        membersByNode[node].append([node, server])
+    
+    ordered = []
+    for node in nodes:
+        ordered = ordered + membersByNode[node]
+    batchSize = max(batchSize, 1)
+    batches = [ordered[index:index + batchSize] for index in range(0, len(ordered), batchSize)]
+    
+    # A node sync updates the application files of every member on that node
+    for node in nodes:
+        if len(membersByNode[node]) > batchSize:
+            print "WARNING: Node %s hosts %d members, more than the batch size; those in later batches receive the new version files with the first" % (
+                node, len(membersByNode[node]))
+    return batches
+
+def getSyncServices(nodes):
+    """Return {node: config ID} for the synchronization service of each node's node agent"""
+    services = {}
+    for node in nodes:
+        service = configCache.listFirst("ConfigSynchronizationService", configCache.getid("/Node:%s/" % node))
+        if service:
+            services[node] = service
+        else:
+            print "WARNING: No node agent synchronization service found for node %s" % node
+    return services
+
+def setAutoSync(services, values):
+    """Set autoSynchEnabled on the node agents to {node: "true"|"false"} and push it to them; return true if they synchronized"""
+    nodes = list(services.keys())
+    nodes.sort()
+    changed = []
+    for node in nodes:
+        if configCache.showAttribute(services[node], "autoSynchEnabled") != values[node]:
+            configCache.modify(services[node], [["autoSynchEnabled", values[node]]])
+            changed.append(node)
+    if not changed:
+        return True
+    print "Setting automatic synchronization: %s" % ", ".join(["%s=%s" % (node, values[node]) for node in changed])
+    AdminConfig.save()
+    return nodeSync.syncNodes(changed)
+
+def setMemberWeight(node, server, weight):
+    """Set the cluster weight of a member in the configuration and at runtime; return the old weight"""
+    clusterID = configCache.findByName("ServerCluster", None, clusterName)
+    oldWeight = None
+    for member in configCache.listObjects("ClusterMember", clusterID):
+        if configCache.showAttribute(member, "memberName") == server and configCache.showAttribute(member, "nodeName") == node:
+            oldWeight = configCache.showAttribute(member, "weight")
+            configCache.modify(member, [["weight", str(weight)]])
+    
+    # Runtime weight used by workload management inside the cell
+    memberMBean = AdminControl.queryNames("type=ClusterMember,cluster=%s,memberName=%s,*" % (clusterName, server))
+    if memberMBean:
+        try:
+            AdminControl.setAttribute(memberMBean.splitlines()[0], "weight", str(weight))
+        except:
+            print "WARNING: Could not set the runtime weight of %s: %s" % (server, sys.exc_info()[1])
+    return oldWeight
+
+def propagateWeights():
+    """Save member weight changes and regenerate the web server plugin"""
+    AdminConfig.save()
+    if webServerName:
+        AdminTask.generatePluginCfg(["-clusterName", clusterName])
+        AdminTask.propagatePluginCfg(["-webServerName", webServerName, "-nodeName", webServerNodeName])
+
+def getActiveRequests(node, server):
+    """Return the active WebContainer thread count of a member, or -1 if PMI does not report it"""
+    pool = AdminControl.queryNames("type=ThreadPool,name=WebContainer,node=%s,process=%s,*" % (node, server))
+    if not pool:
+        return 0
+    try:
+        stats = AdminControl.getAttribute(pool.splitlines()[0], "stats")
+    except:
+        return -1
+    index = stats.find("name=ActiveCount")
+    if index < 0:
+        return -1
+    current = stats.find("current=", index)
+    if current < 0:
+        return -1
+    return int(stats[current + len("current="):].split(",")[0].split("}")[0].strip())
+
+def drainMembers(batch):
+    """Wait for in-flight requests on a batch of members to finish"""
+    print "Draining %s..." % ", ".join([server for node, server in batch])
+    time.sleep(drainMinimum)
+    deadline = time.time() + drainTimeout - drainMinimum
+    while time.time() < deadline:
+        active = [getActiveRequests(node, server) for node, server in batch]
+        if -1 in active:
+            # No PMI data: the minimum drain period is all we can rely on
+            return
+        if max(active) <= 0:
+            return
+        print "  %d request(s) still active" % sum(active)
+        time.sleep(5)
+    print "WARNING: Drain timeout reached with requests still active"
+
+def restartMember(node, server):
+    """Stop and start a cluster member"""
+    print "Restarting %s on %s..." % (server, node)
+    if AdminControl.completeObjectName("type=Server,node=%s,process=%s,*" % (node, server)):
+        AdminControl.stopServer(server, node)
+    AdminControl.startServer(server, node)
+
+def verifyMember(node, server):
+    """Wait until the application is running on a member"""
+    deadline = time.time() + memberStartTimeout
+    while time.time() < deadline:
+        if AdminControl.completeObjectName("type=Application,name=%s,node=%s,process=%s,*" % (appName, node, server)):
+            print "  %s is running %s" % (server, appName)
+            return True
+        time.sleep(5)
+    print "ERROR: %s did not start %s within %d seconds" % (server, appName, memberStartTimeout)
+    return False
+
+def rollBatches(members, batchSize):
+    """Drain, update, restart and verify the members a batch at a time; return true if every batch completed"""
+    batches = planRollingBatches(members, batchSize)
+    syncedNodes = []
+    for batchNumber in range(len(batches)):
+        batch = batches[batchNumber]
+        print "Batch %d of %d: %s (%d of %d members serving)" % (batchNumber + 1, len(batches),
+            ", ".join([server for node, server in batch]), len(members) - len(batch), len(members))
+        
+        # Take the batch out of rotation
+        weights = {}
+        for node, server in batch:
+            weights[(node, server)] = setMemberWeight(node, server, 0)
+        propagateWeights()
+        drainMembers(batch)
+        
+        # Deliver the new version and restart the batch
+        nodes = [node for node in nodeSync.getNodeNames(batch) if node not in syncedNodes]
+        if not nodeSync.syncNodes(nodes):
+            print "ERROR: Rolling deployment stopped; batch %d is left out of rotation" % (batchNumber + 1)
+            return False
+        syncedNodes.extend(nodes)
+        for node, server in batch:
+            restartMember(node, server)
+        for node, server in batch:
+            if not verifyMember(node, server):
+                print "ERROR: Rolling deployment stopped; %s is left out of rotation" % server
+                return False
+        
+        # Put the batch back into rotation
+        for node, server in batch:
+            setMemberWeight(node, server, weights[(node, server)] or 2)
+        propagateWeights()
+    return True
+
+def rollingDeploy(batchSize=rollingBatchSize):
+    """Update the application on the cluster a batch of members at a time"""
+    print "Starting rolling deployment of %s to cluster %s" % (appName, clusterName)
+    
+    members = getClusterMembers()
+    if not members:
+        print "ERROR: Cluster %s has no members" % clusterName
+        return False
+    
+    # A first install has nothing serving traffic to protect
+    if appName not in AdminApp.list().splitlines():
+        deployApplication(True)
+        return True
+    
+    # Node agents with automatic synchronization would pull the updated EAR
+    # on their next interval, all at once; turn it off so each node receives
+    # the new version only when its batch is synchronized
+    services = getSyncServices(nodeSync.getNodeNames(members))
+    autoSync = {}
+    for node in services.keys():
+        autoSync[node] = configCache.showAttribute(services[node], "autoSynchEnabled") or "true"
+    if not setAutoSync(services, dict([[node, "false"] for node in services.keys()])):
+        print "ERROR: Automatic synchronization could not be turned off on every node; the application is not updated"
+        setAutoSync(services, autoSync)
+        return False
+    
+    completed = False
+    try:
+        print "Updating application %s from %s" % (appName, earFile)
+        AdminApp.update(appName, 'app', ['-operation', 'update', '-contents', earFile, '-nouseMetaDataFromBinary'])
+        AdminConfig.save()
+        recordModuleHashes(computeModuleHashes(earFile))
+        completed = rollBatches(members, batchSize)
+    finally:
+        if completed:
+            setAutoSync(services, autoSync)
+        else:
+            # Turning it back on would push the new version to the nodes still serving the old one
+            nodes = list(services.keys())
+            nodes.sort()
+            print "WARNING: Automatic synchronization is left off on %s; turn it back on once the rollout is finished" % ", ".join(nodes)
+    
+    if completed:
+        print "Rolling deployment of %s completed" % appName
+    return completed
+
 # Main execution
 if __name__ == "__main__":
-    deployApplication()
+    action = sys.argv[0] if len(sys.argv) > 0 else "deploy"
+    options = sys.argv[1:]
+    
+    # Command-line overrides for the configuration parameters above
+    earFile = envConfig.getOption(options, "-ear", earFile)
+    appName = envConfig.getOption(options, "-app", appName)
+    nodeName = envConfig.getOption(options, "-node", nodeName)
+    serverName = envConfig.getOption(options, "-server", serverName)
+    clusterName = envConfig.getOption(options, "-clusterName", clusterName)
+    contextRoot = envConfig.getOption(options, "-contextroot", contextRoot)
+    if "-usedefaultcontextroot" in options:
+        contextRoot = ""
+    
+    if action == "deploy":
+        deployApplication("-cluster" in options)
+    elif action == "incremental":
+        if not incrementalDeploy("-cluster" in options):
+            sys.exit(1)
+    elif action == "rolling":
+        if not rollingDeploy(int(envConfig.getOption(options, "-batch", rollingBatchSize))):
+            sys.exit(1)
+    else:
+        print "Usage: wsadmin -f %s [deploy [-cluster]|incremental [-cluster]|rolling [-batch n]] [-ear file] [-app name] [-node name] [-server name] [-clusterName name] [-contextroot path|-usedefaultcontextroot]" % __file__
+        print "  deploy      - Uninstall and install the application on the server (or the cluster with -cluster)"
+        print "  incremental - Update only the modules whose content changed since the last deploy"
+        print "  rolling     - Update the application on the cluster n members at a time, draining each"
+        print "                batch by setting its weight to 0 and restoring it once the batch is verified"
+        sys.exit(1)
     print "Deployment script completed"
-
@@ -0,0 +1,88 @@
+"""
+WebSphere Desired-State Apply (Jython)
+Shared helper module that compares desired attribute values with the current
+configuration and modifies only the attributes that differ.
+
+An object whose attributes already match is left untouched, so a run that
+changes nothing leaves the workspace clean and needs no save or node sync.
+
+Usage from a wsadmin script:
+    import websphere_desired_state as desiredState
+    desiredState.applyDesiredState(poolID, [["minimumSize", 10], ["maximumSize", 100]])
+    desiredState.printSummary()
+"""
+
+import websphere_config_cache as configCache
+
+# Outcome per object for the current run: [label, "changed" or "unchanged", [attribute names]]
+results = []
+
+def normalize(value):
+    """Return a value in the string form AdminConfig.showAttribute reports it"""
+    if value is None:
+        return ""
+    return str(value)
+
+def describeObject(configID):
+    """Return a short label such as Node01/server1 ThreadPool_2 for a config ID"""
+    if configID.find("(") < 0:
+        return configID
+    name = configID.split("(")[0]
+    path = configID.split("(")[1].split("|")[0]
+    objectType = configID.split("#")[-1].rstrip(")")
+    location = ""
+    if path.find("/servers/") >= 0:
+        location = "%s/%s " % (configCache.getNodeName(configID), path.split("/servers/")[1].split("/")[0])
+    if name:
+        return "%s%s %s" % (location, objectType, name)
+    return "%s%s" % (location, objectType)
+
+def computeDiff(configID, desired):
+    """Return the [attribute, value] pairs of desired that differ from the current configuration"""
+    diff = []
+    for attribute, value in desired:
+        if type(value) == type([]):
+            # Nested object such as tuningParams: compare its own attributes
+            nestedID = configCache.showAttribute(configID, attribute)
+            if not nestedID:
+                diff.append([attribute, value])
+                continue
+            nestedDiff = computeDiff(nestedID, value)
+            if nestedDiff:
+                diff.append([attribute, nestedDiff])
+        elif normalize(configCache.showAttribute(configID, attribute)) != normalize(value):
+            diff.append([attribute, value])
+    return diff
+
+def applyDesiredState(configID, desired, label=None):
+    """Modify only the attributes that differ from the desired values; return true if anything changed"""
+    if not label:
+        label = describeObject(configID)
+    
+    diff = computeDiff(configID, desired)
+    if diff:
+        configCache.modify(configID, diff)
+        results.append([label, "changed", [attribute[0] for attribute in diff]])
+        print "  %s: changed %s" % (label, ", ".join([attribute[0] for attribute in diff]))
+        return True
+    
+    results.append([label, "unchanged", []])
+    print "  %s: unchanged" % label
+    return False
+
+def changedCount():
+    """Return the number of objects modified in the current run"""
+    return len([result for result in results if result[1] == "changed"])
+
+def clearResults():
+    """Forget the outcomes recorded so far"""
+    del results[:]
+
+def printSummary():
+    """Print the changed/unchanged outcome of every object"""
+    print "Desired-state summary: %d changed, %d unchanged" % (changedCount(), len(results) - changedCount())
+    for label, outcome, attributes in results:
+        if attributes:
+            print "  %-9s %s (%s)" % (outcome, label, ", ".join(attributes))
+        else:
+            print "  %-9s %s" % (outcome, label)
@@ -0,0 +1,353 @@
+"""
+WebSphere Environment Configuration Loader (Jython/Python)
+Loads websphere_environment.properties into one typed configuration object
+shared by every automation script.
+
+The file is parsed with Java properties syntax, env.<name>.* overrides for
+the selected environment replace the base keys, and ${key} references are
+resolved. The resolved values are cached in marshal form keyed by the file's
+modification time and size, so later invocations skip the parsing. The cache
+holds passwords, so it is readable only by its owner.
+
+The environment is taken from the -env argument, or else the WAS_ENV
+environment variable. The file is websphere_environment.properties next to
+this module unless WAS_ENV_PROPERTIES names another one.
+
+Usage from a wsadmin script:
+    import websphere_env_config as envConfig
+    env = envConfig.loadConfig()
+    cellName = env.get("was.cell")
+    maxHeap = env.getInt("jvm.max.heap")
+    clusterName = envConfig.getOption(sys.argv, "-clusterName", env.get("cluster.name"))
+
+Standalone (Python or Jython):
+    python websphere_env_config.py [-file path] [-env name] show
+    python websphere_env_config.py [-file path] [-env name] get key
+    python websphere_env_config.py [-file path] [-env name] shell VARIABLE=key ...
+"""
+
+# Import required modules
+import sys
+import os
+import re
+import marshal
+import hashlib
+
+try:
+    from shlex import quote as shellQuote
+except ImportError:
+    from pipes import quote as shellQuote
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+try:
+    import json
+except ImportError:
+    # Jython 2.5 (WebSphere 7 and 8.0) has no json module; the scripts that
+    # read or write JSON check envConfig.json for None
+    json = None
+
+# Jython 2.7 returns Java strings as unicode, so string checks accept both
+stringTypes = [type(""), type(u"")]
+
+# Configuration parameters
+try:
+    moduleDir = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    moduleDir = os.getcwd()
+defaultPropertiesFile = os.path.join(moduleDir, "websphere_environment.properties")
+cacheDir = os.path.join(os.path.expanduser("~"), ".websphere_env_config")  # Compiled configurations
+cacheFormat = 2  # Bump when the resolved form changes
+
+# The cache holds every resolved value, passwords included, so only the
+# owner may read it (octal literals differ between Jython 2.5 and Python 3)
+cacheDirMode = int("700", 8)
+cacheFileMode = int("600", 8)
+
+# Loaded configurations by [path, environment]: [mtime, size, config]
+loadedConfigs = {}
+
+referencePattern = re.compile(r"\$\{([^}]+)\}")
+escapeCharacters = {"t": "\t", "n": "\n", "r": "\r", "f": "\f"}
+noDefault = object()
+
+class EnvironmentConfig:
+    """Resolved configuration values with typed accessors"""
+    def __init__(self, values, path, environment):
+        self.values = values
+        self.path = path
+        self.environment = environment
+
+    def has(self, key):
+        return key in self.values
+
+    def keys(self):
+        keys = list(self.values.keys())
+        keys.sort()
+        return keys
+
+    def get(self, key, default=noDefault):
+        """Return the value of key as a string; a key without a default must be defined"""
+        if key in self.values:
+            return self.values[key]
+        if default is noDefault:
+            raise Exception("Property %s is not defined in %s" % (key, self.path))
+        return default
+
+    def getInt(self, key, default=noDefault):
+        """Return the value of key as an integer"""
+        value = self.get(key, default)
+        try:
+            return int(value)
+        except ValueError:
+            raise Exception("Property %s must be an integer, not %s" % (key, value))
+
+    def getBool(self, key, default=noDefault):
+        """Return true if the value of key is true, yes, on or 1"""
+        value = self.get(key, default)
+        if value in [True, False]:
+            return value
+        return str(value).lower() in ["true", "yes", "on", "1"]
+
+    def getList(self, key, default=noDefault, separator=","):
+        """Return the value of key split on separator, without empty items"""
+        value = self.get(key, default)
+        if isinstance(value, list):
+            return value
+        return [item.strip() for item in value.split(separator) if item.strip()]
+
+    def getChildren(self, prefix):
+        """Return the distinct names that follow prefix, e.g. the server names under "servers." """
+        children = []
+        for key in self.keys():
+            if key.startswith(prefix):
+                name = key[len(prefix):].split(".")[0]
+                if name not in children:
+                    children.append(name)
+        return children
+
+    def getSubset(self, prefix):
+        """Return the keys under prefix, with the prefix removed, as a configuration of their own"""
+        values = {}
+        for key in self.values.keys():
+            if key.startswith(prefix):
+                values[key[len(prefix):]] = self.values[key]
+        return EnvironmentConfig(values, self.path, self.environment)
+
+    def withValues(self, overrides):
+        """Return a copy of this configuration with the keys in overrides replaced"""
+        values = self.values.copy()
+        values.update(overrides)
+        return EnvironmentConfig(values, self.path, self.environment)
+
+def unescape(text):
+    """Replace properties-file escape sequences in a key or value"""
+    if "\\" not in text:
+        return text
+    result = []
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char == "\\" and index + 1 < len(text):
+            index = index + 1
+            char = text[index]
+            if char == "u" and index + 4 < len(text):
+                result.append(unichr(int(text[index + 1:index + 5], 16)))
+                index = index + 4
+            else:
+                result.append(escapeCharacters.get(char, char))
+        else:
+            result.append(char)
+        index = index + 1
+    return "".join(result)
+
+def parseProperties(lines):
+    """Parse Java properties lines into a dictionary"""
+    properties = {}
+    logical = ""
+    for line in lines:
+        line = line.lstrip().rstrip("\r\n")
+        if not logical and (not line or line[0] in "#!"):
+            continue
+        
+        # A line ending in an odd number of backslashes continues on the next line
+        trailing = len(line) - len(line.rstrip("\\"))
+        if trailing % 2 == 1:
+            logical = logical + line[:-1]
+            continue
+        logical = logical + line
+        
+        # The key ends at the first unescaped separator or whitespace
+        index = 0
+        while index < len(logical) and logical[index] not in "=: \t\f":
+            if logical[index] == "\\":
+                index = index + 1
+            index = index + 1
+        key = logical[:index]
+        rest = logical[index:].lstrip(" \t\f")
+        if rest[:1] in ["=", ":"]:
+            rest = rest[1:].lstrip(" \t\f")
+        properties[unescape(key)] = unescape(rest)
+        logical = ""
+    return properties
+
+def applyOverlay(properties, environment):
+    """Return the base keys with the env.<environment>.* overrides applied"""
+    values = {}
+    overlayPrefix = "env.%s." % environment
+    for key in properties.keys():
+        if not key.startswith("env."):
+            values[key] = properties[key]
+    if environment:
+        for key in properties.keys():
+            if key.startswith(overlayPrefix):
+                values[key[len(overlayPrefix):]] = properties[key]
+    return values
+
+def resolveReferences(values):
+    """Replace ${key} references with the resolved value of key"""
+    resolved = {}
+
+    def resolve(key, resolving):
+        if key in resolved:
+            return resolved[key]
+        if key in resolving:
+            raise Exception("Circular property reference: %s" % " -> ".join(resolving + [key]))
+
+        def substitute(match):
+            name = match.group(1)
+            if name not in values:
+                raise Exception("Property %s references undefined property ${%s}" % (key, name))
+            return resolve(name, resolving + [key])
+        resolved[key] = referencePattern.sub(substitute, values[key])
+        return resolved[key]
+    
+    for key in values.keys():
+        resolve(key, [])
+    return resolved
+
+def getCacheFile(path, environment):
+    """Return the compiled cache file for a properties file and environment"""
+    # The marshal format differs between interpreters, so each keeps its own copy
+    digest = hashlib.md5(("%s|%s|%s %s" % (path, environment, sys.platform, sys.version.split()[0])).encode("utf-8")).hexdigest()
+    return os.path.join(cacheDir, "%s-%s.cache" % (os.path.basename(path), digest))
+
+def readCache(path, environment, stamp):
+    """Return the cached resolved values if they were compiled from this version of the file"""
+    try:
+        cacheIn = open(getCacheFile(path, environment), "rb")
+        try:
+            entry = marshal.load(cacheIn)
+        finally:
+            cacheIn.close()
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if entry[:4] != [cacheFormat, path, environment, stamp]:
+        return None
+    return entry[4]
+
+def writeCache(path, environment, stamp, values):
+    """Store the resolved values; a cache that cannot be written is skipped"""
+    cacheFile = getCacheFile(path, environment)
+    try:
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir, cacheDirMode)
+        os.chmod(cacheDir, cacheDirMode)
+        if os.path.exists(cacheFile + ".tmp"):
+            os.remove(cacheFile + ".tmp")
+        cacheOut = os.fdopen(os.open(cacheFile + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_EXCL, cacheFileMode), "wb")
+        try:
+            marshal.dump([cacheFormat, path, environment, stamp, values], cacheOut)
+        finally:
+            cacheOut.close()
+        if os.path.exists(cacheFile):
+            os.remove(cacheFile)
+        os.rename(cacheFile + ".tmp", cacheFile)
+    except (IOError, OSError, AttributeError):
+        # AttributeError: an interpreter without os.open or os.fdopen
+        pass
+
+def isString(value):
+    """Return true for a str or unicode value"""
+    return type(value) in stringTypes
+
+def getOption(options, name, default=None):
+    """Return the value following a command-line flag, or default if the flag is absent"""
+    if name in options:
+        index = options.index(name)
+        if index + 1 < len(options):
+            return options[index + 1]
+    return default
+
+def getEnvironmentName(arguments=None):
+    """Return the environment named by a -env argument or the WAS_ENV variable ("" for none)"""
+    if arguments is None:
+        arguments = sys.argv
+    return getOption(arguments, "-env", os.environ.get("WAS_ENV", ""))
+
+def loadConfig(path=None, environment=None):
+    """Return the resolved configuration, reusing the compiled form while the file is unchanged"""
+    if path is None:
+        path = os.environ.get("WAS_ENV_PROPERTIES", defaultPropertiesFile)
+    path = os.path.abspath(path)
+    if environment is None:
+        environment = getEnvironmentName()
+    
+    status = os.stat(path)
+    stamp = [int(status.st_mtime), int(status.st_size)]
+    
+    # Already loaded in this process (command server jobs, imported modules)
+    loaded = loadedConfigs.get((path, environment))
+    if loaded and loaded[0] == stamp:
+        return loaded[1]
+    
+    values = readCache(path, environment, stamp)
+    if values is None:
+        propertiesIn = open(path)
+        try:
+            properties = parseProperties(propertiesIn.readlines())
+        finally:
+            propertiesIn.close()
+        values = resolveReferences(applyOverlay(properties, environment))
+        writeCache(path, environment, stamp, values)
+    
+    config = EnvironmentConfig(values, path, environment)
+    loadedConfigs[(path, environment)] = [stamp, config]
+    return config
+
+# Main execution
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    path = None
+    if arguments[:1] == ["-file"] and len(arguments) > 1:
+        path = arguments[1]
+        arguments = arguments[2:]
+    environment = None
+    if arguments[:1] == ["-env"] and len(arguments) > 1:
+        environment = arguments[1]
+        arguments = arguments[2:]
+    
+    if not arguments or arguments[0] not in ["show", "get", "shell"]:
+        print("Usage: %s [-file path] [-env name] show|get key|shell VARIABLE=key ..." % sys.argv[0])
+        print("  show  - Print every resolved property")
+        print("  get   - Print the value of one property")
+        print("  shell - Print VARIABLE='value' assignments for a shell script to eval")
+        sys.exit(2)
+    
+    try:
+        config = loadConfig(path, environment or getEnvironmentName([]))
+        if arguments[0] == "show":
+            for key in config.keys():
+                print("%s=%s" % (key, config.get(key)))
+        elif arguments[0] == "get":
+            print(config.get(arguments[1]))
+        else:
+            for assignment in arguments[1:]:
+                variable, key = assignment.split("=", 1)
+                print("%s=%s" % (variable, shellQuote(config.get(key))))
+    except Exception:
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
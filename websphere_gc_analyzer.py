@@ -0,0 +1,395 @@
+"""
+WebSphere Verbose GC Analyzer (Jython/Python)
+Reads the verbose garbage collection log of an IBM J9 JVM (the XML that
+-verbose:gc writes to native_stderr.log, or -Xverbosegclog files) and checks
+the gencon nursery and heap sizes that websphere_performance_tuning.py and
+websphere_cluster_management.py apply.
+
+Computed over the log:
+    pause times        stop-the-world pauses, overall, scavenge and global
+    GC overhead        share of elapsed time spent in pauses
+    allocation rate    nursery bytes allocated per second
+    survival rate      share of the nursery that survives a scavenge
+    tenure rate        bytes promoted to the tenure area per second
+    live set           tenure occupancy after global collections
+
+The recommended nursery (-Xmn) holds gc.analyzer.scavenge.interval seconds
+of allocation; the recommended maximum heap adds a tenure area that the live
+set fills to gc.analyzer.tenure.occupancy percent. They are written as a
+properties file that websphere_performance_tuning.py and
+websphere_config_apply.py read with -recommendations:
+    tuning.jvm.initial.heap, tuning.jvm.max.heap (MB), tuning.jvm.nursery
+
+The files are streamed through the expat parser and pause times are kept in
+a fixed set of histogram buckets, so logs of any size are analyzed in
+bounded memory. Rotated logs are given in order and their elapsed times are
+added together.
+
+Usage:
+    python websphere_gc_analyzer.py [file ...] [-interval seconds] [-occupancy percent] [-output file]
+"""
+
+# Import required modules
+import sys
+import os
+import math
+import time
+from xml.parsers import expat
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_env_config as envConfig
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+gcLogFile = env.get("gc.analyzer.file")
+scavengeInterval = float(env.get("gc.analyzer.scavenge.interval"))  # Seconds of allocation the nursery should hold
+tenureOccupancy = env.getInt("gc.analyzer.tenure.occupancy")       # Tenure percent the live set should fill
+nurseryShare = env.getInt("gc.analyzer.nursery.share")             # Largest nursery, in percent of the heap
+pauseTarget = float(env.get("gc.analyzer.pause.target"))           # p99 pause in milliseconds
+
+megabyte = 1024 * 1024
+minimumNursery = 64 * megabyte
+nurseryStep = 32 * megabyte    # Nursery sizes are rounded to this
+heapStep = 256 * megabyte      # Heap sizes are rounded to this
+readSize = 1024 * 1024         # Bytes handed to the parser at a time
+
+# Histogram buckets grow by 2%, so a percentile is within 2% of the exact value
+bucketGrowth = math.log(1.02)
+smallestValue = 0.001
+
+class Histogram:
+    """Distribution of positive values in logarithmic buckets: constant memory, percentiles within 2%"""
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, value):
+        bucket = 0
+        if value > smallestValue:
+            bucket = int(math.log(value / smallestValue) / bucketGrowth) + 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count = self.count + 1
+        self.total = self.total + value
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket holding the nearest-rank percentile, or 0 if empty"""
+        if not self.count:
+            return 0.0
+        rank = max(int(math.ceil(percent / 100.0 * self.count)), 1)
+        seen = 0
+        buckets = list(self.buckets.keys())
+        buckets.sort()
+        for bucket in buckets:
+            seen = seen + self.buckets[bucket]
+            if seen >= rank:
+                return min(smallestValue * math.exp(bucket * bucketGrowth), self.maximum)
+        return self.maximum
+
+    def mean(self):
+        return self.count and self.total / self.count or 0.0
+
+    def merge(self, other):
+        """Add the values counted by another histogram"""
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count = self.count + other.count
+        self.total = self.total + other.total
+        self.maximum = max(self.maximum, other.maximum)
+
+    def toDict(self):
+        """Return the histogram as plain data for a JSON file"""
+        buckets = {}
+        for bucket, count in self.buckets.items():
+            buckets[str(bucket)] = count
+        return {"buckets": buckets, "count": self.count, "total": self.total, "maximum": self.maximum}
+
+def histogramFromDict(data):
+    """Return the Histogram written by Histogram.toDict"""
+    histogram = Histogram()
+    for bucket, count in data["buckets"].items():
+        histogram.buckets[int(bucket)] = count
+    histogram.count = data["count"]
+    histogram.total = data["total"]
+    histogram.maximum = data["maximum"]
+    return histogram
+
+class GcStatistics:
+    """Totals and distributions gathered from verbose GC events"""
+    def __init__(self):
+        self.settings = {}
+        self.pauses = Histogram()
+        self.scavengePauses = Histogram()
+        self.globalPauses = Histogram()
+        self.scavengeIntervals = Histogram()
+        self.liveSet = Histogram()
+        self.scavenges = 0
+        self.globals = 0
+        self.percolates = 0
+        self.compactions = 0
+        self.allocatedBytes = 0.0
+        self.scavengedBytes = 0.0
+        self.survivedBytes = 0.0
+        self.tenuredBytes = 0.0
+        self.nurserySize = 0.0
+        self.tenureAfterGc = 0.0
+        self.elapsed = 0.0
+        self.files = 0
+
+def parseTimestamp(text):
+    """Return epoch seconds for a verbose GC timestamp such as 2024-05-01T10:00:00.123"""
+    try:
+        seconds = time.mktime(time.strptime(text[:19], "%Y-%m-%dT%H:%M:%S"))
+    except ValueError:
+        return None
+    if text[19:20] == ".":
+        digits = ""
+        for char in text[20:]:
+            if not char.isdigit():
+                break
+            digits = digits + char
+        if digits:
+            seconds = seconds + float("0." + digits)
+    return seconds
+
+def parseSize(value):
+    """Return a byte count written in decimal or as 0x hexadecimal"""
+    if value.lower().startswith("0x"):
+        return float(int(value, 16))
+    return float(value)
+
+def analyzeFile(path, stats):
+    """Add the events of one verbose GC log to stats"""
+    state = {"section": None, "gcType": None, "cycleType": None, "initialized": False, "first": None, "last": None}
+
+    def startElement(tag, attributes):
+        if "timestamp" in attributes:
+            if state["first"] is None:
+                state["first"] = attributes["timestamp"]
+            state["last"] = attributes["timestamp"]
+        
+        if tag == "initialized":
+            state["initialized"] = True
+        elif tag == "attribute" and state["initialized"]:
+            stats.settings[attributes.get("name")] = attributes.get("value")
+        elif tag == "vmarg" and attributes.get("name", "")[:4] in ["-Xmn", "-Xms", "-Xmx"]:
+            stats.settings[attributes["name"][:4]] = attributes["name"][4:]
+        elif tag == "exclusive-start":
+            state["cycleType"] = None
+        elif tag == "cycle-start":
+            state["cycleType"] = attributes.get("type")
+            if state["cycleType"] == "scavenge":
+                stats.scavenges = stats.scavenges + 1
+                interval = float(attributes.get("intervalms", 0))
+                if interval > 0:
+                    stats.scavengeIntervals.add(interval)
+            elif state["cycleType"] == "global":
+                stats.globals = stats.globals + 1
+        elif tag in ["gc-start", "gc-end"]:
+            state["section"] = tag
+            state["gcType"] = attributes.get("type")
+        elif tag == "mem" and state["section"] is not None:
+            memoryStarted(attributes)
+        elif tag == "memory-copied":
+            copied = float(attributes.get("bytes", 0))
+            if attributes.get("type") == "nursery":
+                stats.survivedBytes = stats.survivedBytes + copied
+            elif attributes.get("type") == "tenure":
+                stats.survivedBytes = stats.survivedBytes + copied
+                stats.tenuredBytes = stats.tenuredBytes + copied
+        elif tag == "gc-op" and attributes.get("type") == "compact":
+            stats.compactions = stats.compactions + 1
+        elif tag == "percolate-collect":
+            stats.percolates = stats.percolates + 1
+        elif tag == "exclusive-end":
+            pause = float(attributes.get("durationms", 0))
+            stats.pauses.add(pause)
+            if state["cycleType"] == "scavenge":
+                stats.scavengePauses.add(pause)
+            elif state["cycleType"] == "global":
+                stats.globalPauses.add(pause)
+
+    def memoryStarted(attributes):
+        memoryType = attributes.get("type")
+        used = float(attributes.get("total", 0)) - float(attributes.get("free", 0))
+        if state["section"] == "gc-start":
+            if memoryType == "nursery":
+                stats.nurserySize = max(stats.nurserySize, float(attributes.get("total", 0)))
+            elif memoryType == "allocate":
+                # Allocated since the previous collection, which emptied the allocate space
+                stats.allocatedBytes = stats.allocatedBytes + used
+                if state["gcType"] == "scavenge":
+                    stats.scavengedBytes = stats.scavengedBytes + used
+        elif memoryType == "tenure":
+            stats.tenureAfterGc = max(stats.tenureAfterGc, used)
+            if state["gcType"] == "global":
+                stats.liveSet.add(used)
+
+    def endElement(tag):
+        if tag == "initialized":
+            state["initialized"] = False
+        elif tag in ["gc-start", "gc-end"]:
+            state["section"] = None
+    
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = startElement
+    parser.EndElementHandler = endElement
+    logFile = open(path, "rb")
+    try:
+        try:
+            while 1:
+                data = logFile.read(readSize)
+                if not data:
+                    break
+                parser.Parse(data, 0)
+            parser.Parse("".encode("ascii"), 1)
+        except expat.ExpatError:
+            # The log of a running JVM has no closing </verbosegc>
+            if state["last"] is None:
+                raise
+            print("WARNING: %s ends early (%s); analyzed the events before it" % (path, sys.exc_info()[1]))
+    finally:
+        logFile.close()
+    
+    if state["first"] is not None:
+        first, last = parseTimestamp(state["first"]), parseTimestamp(state["last"])
+        if first is not None and last is not None:
+            stats.elapsed = stats.elapsed + max(last - first, 0)
+    stats.files = stats.files + 1
+
+def roundUp(value, step):
+    return int(math.ceil(value / float(step))) * step
+
+def getRates(stats):
+    """Return [allocation rate, survival rate, tenure rate, GC overhead]: bytes/s, fraction, bytes/s, percent"""
+    elapsed = stats.elapsed or 1.0
+    survival = 0.0
+    if stats.scavengedBytes:
+        survival = stats.survivedBytes / stats.scavengedBytes
+    overhead = stats.pauses.total / 1000.0 / elapsed * 100
+    return [stats.allocatedBytes / elapsed, survival, stats.tenuredBytes / elapsed, overhead]
+
+def recommend(stats, interval=scavengeInterval, occupancy=tenureOccupancy):
+    """Return [initial heap MB, maximum heap MB, nursery MB, notes]"""
+    allocationRate, survival, tenureRate, overhead = getRates(stats)
+    notes = []
+    
+    # Live set: tenure occupancy after global collections, or after any
+    # collection (an upper bound) when the log has no global collection
+    if stats.liveSet.count:
+        liveSet = stats.liveSet.percentile(95)
+    else:
+        liveSet = stats.tenureAfterGc
+        notes.append("No global collections in the log; the live set is the highest tenure occupancy after a scavenge")
+    
+    nursery = roundUp(max(allocationRate * interval, minimumNursery), nurseryStep)
+    maximumHeap = roundUp(nursery + liveSet * 100.0 / occupancy, heapStep)
+    largestNursery = int(maximumHeap * nurseryShare / 100.0) // nurseryStep * nurseryStep
+    if nursery > largestNursery:
+        notes.append("Nursery for %ss of allocation capped at %d%% of the heap" % (interval, nurseryShare))
+        nursery = largestNursery
+    initialHeap = min(roundUp(nursery + liveSet, heapStep), maximumHeap)
+    
+    if overhead > 5:
+        notes.append("GC overhead %.1f%% is above 5%%" % overhead)
+    if stats.scavengePauses.percentile(99) > pauseTarget:
+        notes.append("p99 scavenge pause %.1f ms exceeds the %.0f ms target; pauses grow with the bytes surviving, so check the survival rate" % (stats.scavengePauses.percentile(99), pauseTarget))
+    if survival > 0.2:
+        notes.append("%.0f%% of the nursery survives each scavenge; a larger nursery gives short-lived objects longer to die" % (survival * 100))
+    if stats.percolates:
+        notes.append("%d scavenge(s) percolated to global collections: the tenure area ran short" % stats.percolates)
+    return [initialHeap // megabyte, maximumHeap // megabyte, nursery // megabyte, notes]
+
+def formatBytes(value):
+    return "%.1f MB" % (value / megabyte)
+
+def printStatistics(stats):
+    """Print the pause, rate and occupancy statistics"""
+    allocationRate, survival, tenureRate, overhead = getRates(stats)
+    print("Analyzed %d file(s) covering %.1f minutes" % (stats.files, stats.elapsed / 60.0))
+    for name in ["gcPolicy", "maxHeapSize", "initialHeapSize", "-Xmn"]:
+        if name in stats.settings:
+            value = stats.settings[name]
+            if name.endswith("HeapSize"):
+                value = formatBytes(parseSize(value))
+            print("  %-28s %s" % (name, value))
+    print("  %-28s %s" % ("Largest nursery", formatBytes(stats.nurserySize)))
+    print("")
+    print("  %-12s %8s %10s %10s %10s %10s %10s" % ("Pauses (ms)", "Count", "Mean", "p50", "p95", "p99", "Max"))
+    for name, histogram in [["all", stats.pauses], ["scavenge", stats.scavengePauses], ["global", stats.globalPauses]]:
+        print("  %-12s %8d %10.2f %10.2f %10.2f %10.2f %10.2f" % (name, histogram.count, histogram.mean(), histogram.percentile(50),
+              histogram.percentile(95), histogram.percentile(99), histogram.maximum))
+    print("")
+    print("  %-28s %.2f%%" % ("GC overhead", overhead))
+    print("  %-28s %s/s" % ("Allocation rate", formatBytes(allocationRate)))
+    print("  %-28s %.1f s" % ("Mean scavenge interval", stats.scavengeIntervals.mean() / 1000.0))
+    print("  %-28s %.1f%%" % ("Nursery survival rate", survival * 100))
+    print("  %-28s %s/s" % ("Tenure rate", formatBytes(tenureRate)))
+    print("  %-28s %s" % ("Live set (p95 after global)", stats.liveSet.count and formatBytes(stats.liveSet.percentile(95)) or "-"))
+    print("  %-28s %d global, %d percolated, %d compaction(s)" % ("Global collections", stats.globals, stats.percolates, stats.compactions))
+
+def writeRecommendations(path, initialHeap, maximumHeap, nursery, notes, description):
+    """Write the heap and nursery sizes as a properties file for -recommendations"""
+    out = open(path, "w")
+    try:
+        out.write("# JVM heap recommendations from websphere_gc_analyzer.py\n")
+        out.write("# %s\n" % description)
+        for note in notes:
+            out.write("# %s\n" % note)
+        out.write("tuning.jvm.initial.heap=%d\n" % initialHeap)
+        out.write("tuning.jvm.max.heap=%d\n" % maximumHeap)
+        out.write("tuning.jvm.nursery=%dm\n" % nursery)
+    finally:
+        out.close()
+
+# Main execution
+if __name__ == "__main__":
+    options = sys.argv[1:]
+    if "-help" in options:
+        print("Usage: %s [file ...] [-interval seconds] [-occupancy percent] [-output file]" % sys.argv[0])
+        print("  file       - Verbose GC logs, oldest first (default %s)" % gcLogFile)
+        print("  -interval  - Seconds of allocation the nursery should hold (default %s)" % scavengeInterval)
+        print("  -occupancy - Tenure percent the live set should fill (default %d)" % tenureOccupancy)
+        print("  -output    - Properties file for websphere_performance_tuning.py -recommendations")
+        sys.exit(2)
+    
+    valueOptions = ["-interval", "-occupancy", "-output"]
+    files = [option for index, option in enumerate(options)
+             if not option.startswith("-") and (index == 0 or options[index - 1] not in valueOptions)]
+    if not files:
+        files = [gcLogFile]
+    interval = float(envConfig.getOption(options, "-interval", scavengeInterval))
+    occupancy = int(envConfig.getOption(options, "-occupancy", tenureOccupancy))
+    
+    stats = GcStatistics()
+    started = time.time()
+    try:
+        for path in files:
+            analyzeFile(path, stats)
+    except (IOError, OSError, expat.ExpatError):
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    if not stats.pauses.count:
+        print("ERROR: No garbage collections found in %s" % ", ".join(files))
+        sys.exit(1)
+    
+    printStatistics(stats)
+    initialHeap, maximumHeap, nursery, notes = recommend(stats, interval, occupancy)
+    print("")
+    print("Recommended: -Xms%dm -Xmx%dm -Xmn%dm" % (initialHeap, maximumHeap, nursery))
+    for note in notes:
+        print("  %s" % note)
+    print("Analyzed in %.2fs" % (time.time() - started))
+    output = envConfig.getOption(options, "-output")
+    if output:
+        description = "Source: %s, nursery for %ss of allocation, live set at %d%% of tenure, generated %s" % (
+            ", ".join(files), interval, occupancy, time.strftime("%Y-%m-%d %H:%M:%S"))
+        writeRecommendations(output, initialHeap, maximumHeap, nursery, notes, description)
+        print("Recommendations written to %s" % output)
@@ -0,0 +1,485 @@
+"""
+WebSphere Access Log Replay (Python/Jython)
+Replays the GET requests of a recorded web server access log against a
+target URL to measure what a tuning change does to latency and throughput:
+record a run before the change, apply it with websphere_performance_tuning.py,
+record a run after it and compare the two.
+
+Requests are sent at their logged times, scaled by -speed (2 replays twice
+as fast; 0 sends them as fast as the workers allow). Requests logged within
+the same second are spread evenly across it. A pool of worker threads sends
+them over persistent connections, so keepAlive and maximumPersistentRequests
+take effect as they do for the web server plugin. Latency is measured from
+the time a request was due, not from when a worker became free to send it,
+so a server that falls behind shows its queueing delay instead of hiding it
+by slowing the replay down; the time from sending to the last byte of the
+response is kept separately as service time.
+
+Latencies are kept in logarithmic histograms (websphere_gc_analyzer.py), so
+a run of any length uses the same memory. Each run is written as JSON; the
+compare command prints the change in throughput, latency percentiles and
+errors and exits with status 1 when the later run is worse by more than
+replay.tolerance percent.
+
+The serve command starts a local stand-in HTTP server for trying the harness
+without an application server: each response takes -delay milliseconds plus
+up to -jitter more, at most -threads requests are processed at once (the
+WebContainer pool), a connection is closed after -keepalive requests
+(maximumPersistentRequests), and the response is as large as the logged one.
+
+Usage:
+    python websphere_load_replay.py run [access_log ...] [-target url] [-speed factor] [-workers n] [-duration seconds] [-limit requests] [-label text] [-output file]
+    python websphere_load_replay.py compare before.json after.json [-tolerance percent]
+    python websphere_load_replay.py serve [-port n] [-delay ms] [-jitter ms] [-threads n] [-keepalive requests]
+"""
+
+# Import required modules
+import sys
+import os
+import time
+import errno
+import random
+import socket
+import threading
+
+try:
+    import http.client as httplib
+    from urllib.parse import urlparse
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    import queue as Queue
+except ImportError:
+    import httplib
+    from urlparse import urlparse
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    import Queue
+
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_env_config as envConfig
+import websphere_cachespec_generator as cacheSpec
+import websphere_gc_analyzer as gcAnalyzer
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+accessLogFile = env.get("replay.access.log")
+targetUrl = env.get("replay.target")
+replayWorkers = env.getInt("replay.workers")
+replaySpeed = float(env.get("replay.speed"))
+requestTimeout = env.getInt("replay.timeout")          # Seconds
+tolerance = float(env.get("replay.tolerance"))         # Percent a metric may worsen before compare fails
+resultsBasePath = env.get("replay.results.file")       # Timestamp and extension added per run
+serverPort = env.getInt("replay.server.port")
+
+# Methods replayed; the access log does not record request bodies
+replayMethods = ["GET", "HEAD"]
+
+# Header carrying the logged response size, which the stand-in server returns
+sizeHeader = "X-Replay-Size"
+
+class RunStatistics:
+    """Results of the requests sent by one worker, or by all of them once merged"""
+    def __init__(self):
+        self.latency = gcAnalyzer.Histogram()   # ms from the time a request was due to its last byte
+        self.service = gcAnalyzer.Histogram()   # ms from sending a request to its last byte
+        self.statuses = {}
+        self.errors = {}
+        self.bytes = 0
+        self.connections = 0
+        self.perSecond = {}                     # Seconds into the run: requests completed
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.service.merge(other.service)
+        for name in ["statuses", "errors", "perSecond"]:
+            counts = getattr(self, name)
+            for key, count in getattr(other, name).items():
+                counts[key] = counts.get(key, 0) + count
+        self.bytes = self.bytes + other.bytes
+        self.connections = self.connections + other.connections
+
+def readRequests(paths, skipped):
+    """Yield [logged seconds, method, path, logged size] for each replayed request, oldest first"""
+    dayCache = {}
+    for path in paths:
+        group = []
+        groupTime = None
+        logIn = cacheSpec.openLog(path)
+        try:
+            for line in logIn:
+                match = cacheSpec.logPattern.match(line)
+                if match is None:
+                    skipped["unparsed"] = skipped.get("unparsed", 0) + 1
+                    continue
+                user, timestamp, method, target, status, size = match.groups()
+                if method not in replayMethods:
+                    skipped[method] = skipped.get(method, 0) + 1
+                    continue
+                seconds = cacheSpec.parseTime(timestamp, dayCache)
+                if seconds is None:
+                    skipped["unparsed"] = skipped.get("unparsed", 0) + 1
+                    continue
+                
+                # The log has whole seconds: spread each second's requests across it
+                if seconds != groupTime:
+                    for index in range(len(group)):
+                        yield [groupTime + index / float(len(group))] + group[index]
+                    group = []
+                    groupTime = seconds
+                group.append([method, target, size != "-" and size or "0"])
+        finally:
+            logIn.close()
+        for index in range(len(group)):
+            yield [groupTime + index / float(len(group))] + group[index]
+
+def openConnection(target):
+    """Return a new connection to the target URL's host"""
+    if target.scheme == "https":
+        return httplib.HTTPSConnection(target.hostname, target.port or 443, timeout=requestTimeout)
+    return httplib.HTTPConnection(target.hostname, target.port or 80, timeout=requestTimeout)
+
+def replayWorker(pending, target, stats, runStarted):
+    """Send the queued requests over a persistent connection until the queue ends"""
+    connection = None
+    prefix = target.path.rstrip("/")
+    while 1:
+        item = pending.get()
+        if item is None:
+            break
+        due, method, path, size = item
+        sent = time.time()
+        
+        # A reused connection may have been closed by the server while idle,
+        # so a request that fails on one is retried once on a new connection
+        for attempt in [1, 2]:
+            reused = connection is not None
+            try:
+                if connection is None:
+                    connection = openConnection(target)
+                    stats.connections = stats.connections + 1
+                connection.request(method, prefix + path, headers={sizeHeader: size})
+                response = connection.getresponse()
+                body = response.read()
+                stats.statuses[str(response.status)] = stats.statuses.get(str(response.status), 0) + 1
+                stats.bytes = stats.bytes + len(body)
+                if response.will_close:
+                    connection.close()
+                    connection = None
+                break
+            except (socket.error, httplib.HTTPException):
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                if reused and attempt == 1:
+                    continue
+                # Socket errors are named by errno, the same in every interpreter
+                error = sys.exc_info()[0].__name__
+                if getattr(sys.exc_info()[1], "errno", None) in errno.errorcode:
+                    error = errno.errorcode[sys.exc_info()[1].errno]
+                stats.errors[error] = stats.errors.get(error, 0) + 1
+                break
+        
+        finished = time.time()
+        stats.service.add((finished - sent) * 1000)
+        stats.latency.add((finished - (due or sent)) * 1000)
+        second = int(finished - runStarted)
+        stats.perSecond[second] = stats.perSecond.get(second, 0) + 1
+    if connection is not None:
+        connection.close()
+
+def replay(paths, target, speed=replaySpeed, workers=replayWorkers, duration=0, limit=0):
+    """Replay the access logs against the target URL; return [RunStatistics, requests sent, skipped, elapsed seconds]"""
+    target = urlparse(target)
+    pending = Queue.Queue(workers * 4)   # Bounded, so the log is read as fast as it is replayed
+    skipped = {}
+    workerStats = []
+    threads = []
+    started = time.time()
+    for i in range(workers):
+        stats = RunStatistics()
+        workerStats.append(stats)
+        thread = threading.Thread(target=replayWorker, args=(pending, target, stats, started))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    
+    sent = 0
+    logStarted = None
+    try:
+        for logged, method, path, size in readRequests(paths, skipped):
+            if logStarted is None:
+                logStarted = logged
+            if limit and sent >= limit:
+                break
+            due = None
+            if speed:
+                offset = (logged - logStarted) / speed
+                if duration and offset > duration:
+                    break
+                due = started + offset
+                delay = due - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            elif duration and time.time() - started > duration:
+                break
+            pending.put([due, method, path, size])
+            sent = sent + 1
+    except KeyboardInterrupt:
+        print("Interrupted; waiting for the requests already sent")
+    
+    for thread in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    
+    stats = RunStatistics()
+    for workerStat in workerStats:
+        stats.merge(workerStat)
+    return [stats, sent, skipped, elapsed]
+
+def getSummary(stats, elapsed):
+    """Return the metrics compare reads: throughput, latency and service percentiles, error rate"""
+    failed = 0
+    for count in stats.errors.values():
+        failed = failed + count
+    for status, count in stats.statuses.items():
+        if int(status) >= 500:
+            failed = failed + count
+    completed = stats.latency.count
+    peak = 0
+    if stats.perSecond:
+        peak = max(stats.perSecond.values())
+    return {
+        "throughput": completed / max(elapsed, 0.001),
+        "peakThroughput": peak,
+        "errorRate": completed and failed * 100.0 / completed or 0.0,
+        "latencyMean": stats.latency.mean(),
+        "latencyP50": stats.latency.percentile(50),
+        "latencyP95": stats.latency.percentile(95),
+        "latencyP99": stats.latency.percentile(99),
+        "latencyMax": stats.latency.maximum,
+        "serviceP50": stats.service.percentile(50),
+        "serviceP99": stats.service.percentile(99)
+    }
+
+def printRun(results):
+    """Print the totals and latency of a run"""
+    summary = results["summary"]
+    print("Replayed %d request(s) to %s in %.1fs (%s, speed %s, %d workers)" % (results["sent"], results["target"],
+          results["elapsed"], results["label"] or "unlabeled", results["speed"] or "unpaced", results["workers"]))
+    skipped = ", ".join(["%d %s" % (count, name) for name, count in results["skipped"].items()])
+    if skipped:
+        print("  Not replayed: %s" % skipped)
+    statuses = list(results["statuses"].keys())
+    statuses.sort()
+    print("  Responses: %s" % (", ".join(["%s x%d" % (status, results["statuses"][status]) for status in statuses]) or "none"))
+    if results["errors"]:
+        print("  Errors: %s" % ", ".join(["%s x%d" % (name, count) for name, count in results["errors"].items()]))
+    print("  Connections opened: %d, %.1f MB received" % (results["connections"], results["bytes"] / 1048576.0))
+    print("  Throughput: %.1f/s (peak %d/s), error rate %.2f%%" % (summary["throughput"], summary["peakThroughput"], summary["errorRate"]))
+    print("  %-12s %10s %10s %10s %10s %10s" % ("(ms)", "Mean", "p50", "p95", "p99", "Max"))
+    for name, histogram in [["latency", results["latency"]], ["service", results["service"]]]:
+        print("  %-12s %10.1f %10.1f %10.1f %10.1f %10.1f" % (name, histogram.mean(), histogram.percentile(50),
+              histogram.percentile(95), histogram.percentile(99), histogram.maximum))
+
+def writeResults(results, path):
+    """Write a run as JSON, with its histograms as plain data"""
+    data = results.copy()
+    data["latency"] = results["latency"].toDict()
+    data["service"] = results["service"].toDict()
+    resultsOut = open(path, "w")
+    try:
+        envConfig.json.dump(data, resultsOut, indent=2, sort_keys=True)
+    finally:
+        resultsOut.close()
+
+def loadResults(path):
+    """Read a run written by writeResults"""
+    resultsIn = open(path)
+    try:
+        results = envConfig.json.load(resultsIn)
+    finally:
+        resultsIn.close()
+    results["latency"] = gcAnalyzer.histogramFromDict(results["latency"])
+    results["service"] = gcAnalyzer.histogramFromDict(results["service"])
+    return results
+
+# Metrics compared: [summary key, label, true if higher is better]
+comparedMetrics = [
+    ["throughput", "Throughput (/s)", True],
+    ["latencyMean", "Latency mean (ms)", False],
+    ["latencyP50", "Latency p50 (ms)", False],
+    ["latencyP95", "Latency p95 (ms)", False],
+    ["latencyP99", "Latency p99 (ms)", False],
+    ["serviceP99", "Service p99 (ms)", False]
+]
+
+def compareRuns(before, after, allowed=tolerance):
+    """Print the change of every metric between two runs and return the number that worsened beyond allowed percent"""
+    if before["logs"] != after["logs"] or before["speed"] != after["speed"] or before["sent"] != after["sent"]:
+        print("WARNING: The runs replayed different requests or speeds; the comparison may not be meaningful")
+    print("Before: %s (%s)" % (before["label"] or "unlabeled", before["started"]))
+    print("After:  %s (%s)" % (after["label"] or "unlabeled", after["started"]))
+    print("  %-20s %12s %12s %9s" % ("Metric", "Before", "After", "Change"))
+    worse = 0
+    for key, label, higherIsBetter in comparedMetrics:
+        old = before["summary"][key]
+        new = after["summary"][key]
+        change = 0.0
+        if old:
+            change = (new - old) * 100.0 / old
+        verdict = ""
+        if (higherIsBetter and change < -allowed) or (not higherIsBetter and change > allowed):
+            verdict = "WORSE"
+            worse = worse + 1
+        elif (higherIsBetter and change > allowed) or (not higherIsBetter and change < -allowed):
+            verdict = "better"
+        print("  %-20s %12.1f %12.1f %+8.1f%% %s" % (label, old, new, change, verdict))
+    
+    # Error rates are compared in percentage points: a change from 0 has no ratio
+    old = before["summary"]["errorRate"]
+    new = after["summary"]["errorRate"]
+    verdict = ""
+    if new - old > allowed / 10.0:
+        verdict = "WORSE"
+        worse = worse + 1
+    print("  %-20s %11.2f%% %11.2f%% %+8.2fpp %s" % ("Error rate", old, new, new - old, verdict))
+    return worse
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers every request after a delay, with as many bytes as the replay asks for"""
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    jitter = 0.0
+    keepAlive = 0
+    processing = None
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # Headers and body are written separately; without this, Nagle's
+        # algorithm holds the body back for the client's delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        self.served = getattr(self, "served", 0) + 1
+        self.processing.acquire()
+        try:
+            time.sleep((self.delay + random.random() * self.jitter) / 1000.0)
+        finally:
+            self.processing.release()
+        size = self.headers.get(sizeHeader, "0")
+        size = size.isdigit() and int(size) or 0
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(size))
+        if self.keepAlive and self.served >= self.keepAlive:
+            self.send_header("Connection", "close")
+            self.close_connection = 1
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(("x" * size).encode("ascii"))
+    
+    do_HEAD = do_GET
+
+    def log_message(self, format, *arguments):
+        pass
+
+def serve(port, delay, jitter, threads, keepAlive):
+    """Run the stand-in server until interrupted"""
+    StandInHandler.delay = delay
+    StandInHandler.jitter = jitter
+    StandInHandler.keepAlive = keepAlive
+    StandInHandler.processing = threading.Semaphore(threads)
+    server = StandInServer(("", port), StandInHandler)
+    print("Stand-in server on http://localhost:%d/: %.0f ms (+%.0f ms jitter), %d thread(s), %s request(s) per connection" % (
+          port, delay, jitter, threads, keepAlive or "unlimited"))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+# Main execution
+if __name__ == "__main__":
+    options = sys.argv[1:]
+    valueOptions = ["-target", "-speed", "-workers", "-duration", "-limit", "-label", "-output", "-tolerance",
+                    "-port", "-delay", "-jitter", "-threads", "-keepalive"]
+    arguments = [option for index, option in enumerate(options)
+                 if not option.startswith("-") and (index == 0 or options[index - 1] not in valueOptions)]
+    command = arguments and arguments[0] or ""
+    
+    if command not in ["run", "compare", "serve"] or (command == "compare" and len(arguments) != 3):
+        print("Usage: %s run [access_log ...] [-target url] [-speed factor] [-workers n] [-duration seconds] [-limit requests] [-label text] [-output file]" % sys.argv[0])
+        print("       %s compare before.json after.json [-tolerance percent]" % sys.argv[0])
+        print("       %s serve [-port n] [-delay ms] [-jitter ms] [-threads n] [-keepalive requests]" % sys.argv[0])
+        print("  run        - Replay the GET requests of access logs, oldest first (default %s)" % accessLogFile)
+        print("  compare    - Compare two runs; exits with status 1 if the second is worse")
+        print("  serve      - Start a local stand-in server to replay against")
+        print("  -target    - Base URL the logged paths are sent to (default %s)" % targetUrl)
+        print("  -speed     - Replay speed relative to the log; 0 sends as fast as possible (default %s)" % replaySpeed)
+        print("  -workers   - Concurrent connections (default %d)" % replayWorkers)
+        print("  -duration  - Stop after this many seconds of replay")
+        print("  -limit     - Stop after this many requests")
+        print("  -label     - Name of the run, such as the tuning profile under test")
+        print("  -output    - Results file (default %s_<time>.json)" % resultsBasePath)
+        print("  -tolerance - Percent a metric may worsen before compare fails (default %s)" % tolerance)
+        print("  -port, -delay, -jitter, -threads, -keepalive - Stand-in server port (default %d), response time," % serverPort)
+        print("               added random time, concurrent requests and requests per connection")
+        sys.exit(2)
+    
+    if command == "serve":
+        serve(int(envConfig.getOption(options, "-port", serverPort)), float(envConfig.getOption(options, "-delay", 20)),
+              float(envConfig.getOption(options, "-jitter", 0)), int(envConfig.getOption(options, "-threads", 50)), int(envConfig.getOption(options, "-keepalive", 0)))
+        sys.exit(0)
+    
+    if envConfig.json is None:
+        print("ERROR: No json module in this interpreter; run results cannot be written or compared")
+        sys.exit(1)
+    
+    if command == "compare":
+        try:
+            before = loadResults(arguments[1])
+            after = loadResults(arguments[2])
+        except (IOError, OSError, ValueError, KeyError):
+            print("ERROR: %s" % sys.exc_info()[1])
+            sys.exit(1)
+        if compareRuns(before, after, float(envConfig.getOption(options, "-tolerance", tolerance))):
+            sys.exit(1)
+        sys.exit(0)
+    
+    files = arguments[1:] or [accessLogFile]
+    target = envConfig.getOption(options, "-target", targetUrl)
+    speed = float(envConfig.getOption(options, "-speed", replaySpeed))
+    workers = int(envConfig.getOption(options, "-workers", replayWorkers))
+    started = time.strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        stats, sent, skipped, elapsed = replay(files, target, speed, workers,
+                                               float(envConfig.getOption(options, "-duration", 0)), int(envConfig.getOption(options, "-limit", 0)))
+    except (IOError, OSError):
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    if not sent:
+        print("ERROR: No GET requests to replay in %s" % ", ".join(files))
+        sys.exit(1)
+    
+    results = {
+        "label": envConfig.getOption(options, "-label", ""), "target": target, "logs": files, "speed": speed, "workers": workers,
+        "started": started, "elapsed": elapsed, "sent": sent, "skipped": skipped, "statuses": stats.statuses,
+        "errors": stats.errors, "bytes": stats.bytes, "connections": stats.connections,
+        "latency": stats.latency, "service": stats.service, "summary": getSummary(stats, elapsed)
+    }
+    printRun(results)
+    output = envConfig.getOption(options, "-output", "%s_%s.json" % (resultsBasePath, time.strftime("%Y%m%d_%H%M%S")))
+    writeResults(results, output)
+    print("Results written to %s; compare them with another run: compare %s <other run>" % (output, output))
@@ -0,0 +1,378 @@
+"""
+WebSphere Log Analyzer (Jython/Python)
+Extracts performance events from a server's SystemOut.log and its rotated
+copies (SystemOut_<yy.MM.dd_HH.mm.ss>.log), and prints the log entries of a
+time range, without reading the logs from the start on every run.
+
+Events reported:
+    hung-thread          WSVR0605W  thread active longer than the hung thread threshold
+    thread-recovered     WSVR0606W  a thread reported hung has completed
+    pool-exhausted       J2CA0045E  no connection available within the connection timeout
+    transaction-timeout  WTRN0006W  transaction rolled back after its timeout
+    cpu-starvation       HMGR0152W  threads scheduled late; the host is short of CPU
+    out-of-memory        java.lang.OutOfMemoryError
+
+Each file is memory-mapped and only the bytes appended since the last run are
+scanned. A checkpoint per log directory keeps, for every file, the offset
+reached, an index of entry timestamps every indexInterval bytes and the events
+found so far; files are tracked by inode, so a rotated file keeps its
+checkpoint under its new name. The index lets the lines command seek straight
+to the start of a time range.
+
+Timestamps are read in the server's local time, with the day, month and year
+order of log.analyzer.date.order (mdy for the en_US locale).
+
+Usage:
+    python websphere_log_analyzer.py [-logs dir] [-server name,...|-all] events [-from time] [-to time] [-type name,...] [-new]
+    python websphere_log_analyzer.py [-logs dir] [-server name,...|-all] summary [-from time] [-to time]
+    python websphere_log_analyzer.py [-logs dir] [-server name] lines -from time [-to time]
+
+Times are epoch seconds, "YYYY-MM-DD HH:MM[:SS]" or relative to now ("-15m", "-2h", "-1d").
+"""
+
+# Import required modules
+import sys
+import os
+import re
+import glob
+import time
+import bisect
+import marshal
+import hashlib
+
+try:
+    import mmap
+except ImportError:
+    # Jython reads the files instead
+    mmap = None
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_env_config as envConfig
+import websphere_pmi_store as pmiStore
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+serverName = env.get("server.name")
+logsDir = env.get("log.analyzer.dir")                              # Profile logs directory, one subdirectory per server
+stateDir = os.path.expanduser(env.get("log.analyzer.state"))       # Checkpoints per log directory
+dateOrder = env.get("log.analyzer.date.order")                     # Order of day, month and year in the timestamps
+maxEvents = env.getInt("log.analyzer.max.events")                  # Events kept per log directory
+
+indexInterval = 1024 * 1024  # Bytes between timestamp index entries
+stateFormat = 1              # Bump when the checkpoint layout changes
+maxMessageLength = 400       # Characters kept of an event's log line
+
+# Event types and the message that identifies each
+logEvents = [
+    ["hung-thread", "WSVR0605W"],
+    ["thread-recovered", "WSVR0606W"],
+    ["pool-exhausted", "J2CA0045E"],
+    ["transaction-timeout", "WTRN0006W"],
+    ["cpu-starvation", "HMGR0152W"],
+    ["out-of-memory", "java.lang.OutOfMemoryError"]
+]
+
+eventTypes = dict([[message, eventType] for eventType, message in logEvents])
+eventPattern = re.compile("|".join([re.escape(message) for eventType, message in logEvents]).encode("ascii"))
+
+# [10/17/26 14:23:45:123 EDT]
+timestampPattern = re.compile("\\[(\\d{1,2})/(\\d{1,2})/(\\d{2,4}) (\\d{1,2}):(\\d{2}):(\\d{2}):(\\d{1,3})".encode("ascii"))
+newline = "\n".encode("ascii")
+entryStart = "\n[".encode("ascii")
+
+def parseTimestamp(data, offset):
+    """Return the epoch time of the log entry starting at offset, or None if no timestamp starts there"""
+    match = timestampPattern.match(data, offset)
+    if not match:
+        return None
+    fields = dict(zip(dateOrder, [int(value) for value in match.groups()[:3]]))
+    year = fields["y"]
+    if year < 100:
+        year = year + 2000
+    hour, minute, second, millis = [int(value) for value in match.groups()[3:]]
+    try:
+        return time.mktime((year, fields["m"], fields["d"], hour, minute, second, 0, 0, -1)) + millis / 1000.0
+    except (ValueError, OverflowError):
+        return None
+
+def findEntry(data, offset, end):
+    """Return the offset of the first log entry starting at or after offset, or -1"""
+    if offset == 0 and data[:1] == "[".encode("ascii"):
+        return 0
+    position = data.find(entryStart, max(offset - 1, 0), end)
+    if position < 0:
+        return -1
+    return position + 1
+
+def getEntryStart(data, offset):
+    """Return the start of the log entry containing offset; stack trace lines belong to the entry above"""
+    lineStart = data.rfind(newline, 0, offset) + 1
+    if data[lineStart:lineStart + 1] == "[".encode("ascii"):
+        return lineStart
+    return data.rfind(entryStart, 0, lineStart) + 1
+
+def decodeLine(data):
+    return data.decode("utf-8", "replace").rstrip()
+
+class LogFile:
+    """Read access to a log file: memory-mapped where mmap is available"""
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.data = "".encode("ascii")
+        if self.size and mmap is not None:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        elif self.size:
+            self.data = self.file.read()
+
+    def close(self):
+        if mmap is not None and isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+def getFileKey(path):
+    """Return the identity of a log file that survives its rotation to a new name"""
+    status = os.stat(path)
+    if status.st_ino:
+        return "%d:%d" % (status.st_dev, status.st_ino)
+    # No inode numbers (Windows): the name, so a rotated file is read again
+    return path
+
+def getStateFile(logDir):
+    digest = hashlib.md5(("%s|%s" % (os.path.abspath(logDir), sys.version.split()[0])).encode("utf-8")).hexdigest()
+    return os.path.join(stateDir, "%s-%s.state" % (os.path.basename(logDir), digest))
+
+def loadState(logDir):
+    """Return the checkpoint of a log directory: {"files": {key: file state}, "events": [...]}"""
+    try:
+        stateIn = open(getStateFile(logDir), "rb")
+        try:
+            entry = marshal.load(stateIn)
+        finally:
+            stateIn.close()
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        entry = None
+    if not entry or entry[0] != stateFormat:
+        return {"files": {}, "events": []}
+    return entry[1]
+
+def saveState(logDir, state):
+    """Store the checkpoint; one that cannot be written means the next run scans again"""
+    stateFile = getStateFile(logDir)
+    try:
+        if not os.path.isdir(stateDir):
+            os.makedirs(stateDir)
+        stateOut = open(stateFile + ".tmp", "wb")
+        try:
+            marshal.dump([stateFormat, state], stateOut)
+        finally:
+            stateOut.close()
+        if os.path.exists(stateFile):
+            os.remove(stateFile)
+        os.rename(stateFile + ".tmp", stateFile)
+    except (IOError, OSError):
+        pass
+
+def scanLog(logFile, fileState, name):
+    """Index and scan the complete lines appended since the checkpoint; return the new events"""
+    data = logFile.data
+    offset = fileState["offset"]
+    end = data.rfind(newline, offset, logFile.size) + 1
+    if end <= offset:
+        return []
+    
+    # Timestamp index: the first entry at or after every indexInterval bytes
+    position = max(offset, fileState["nextIndex"])
+    while position < end:
+        entry = findEntry(data, position, end)
+        if entry < 0:
+            position = end
+            break
+        timestamp = parseTimestamp(data, entry)
+        if timestamp is not None:
+            fileState["index"].append([timestamp, entry])
+        position = entry + indexInterval
+    fileState["nextIndex"] = position
+    
+    events = []
+    seen = {}
+    for match in eventPattern.finditer(data, offset, end):
+        entry = getEntryStart(data, match.start())
+        eventType = eventTypes[match.group(0).decode("ascii")]
+        # A stack trace may name the same error on many lines
+        if (entry, eventType) in seen:
+            continue
+        seen[(entry, eventType)] = 1
+        lineStart = data.rfind(newline, 0, match.start()) + 1
+        lineEnd = data.find(newline, match.start(), end)
+        message = decodeLine(data[lineStart:lineEnd])
+        if message.startswith("["):
+            message = message[message.find("]") + 1:].strip()
+        events.append([parseTimestamp(data, entry) or 0, eventType, name, message[:maxMessageLength]])
+    fileState["offset"] = end
+    return events
+
+def findLogFiles(logDir):
+    """Return SystemOut.log and its rotated copies"""
+    return glob.glob(os.path.join(logDir, "SystemOut*.log"))
+
+def updateLogDir(logDir):
+    """Bring the checkpoint of a log directory up to date; return [state, new events, bytes scanned]"""
+    state = loadState(logDir)
+    files = {}
+    newEvents = []
+    scanned = 0
+    for path in findLogFiles(logDir):
+        key = getFileKey(path)
+        fileState = state["files"].get(key)
+        logFile = LogFile(path)
+        try:
+            if fileState is None or logFile.size < fileState["offset"]:
+                # New, or truncated and rewritten
+                fileState = {"offset": 0, "nextIndex": 0, "index": []}
+            fileState["path"] = path
+            fileState["mtime"] = os.path.getmtime(path)
+            scanned = scanned + logFile.size - fileState["offset"]
+            newEvents.extend(scanLog(logFile, fileState, os.path.basename(path)))
+        finally:
+            logFile.close()
+        files[key] = fileState
+    
+    # Files deleted by rotation drop out; their events stay until maxEvents is reached
+    state["files"] = files
+    newEvents.sort()
+    state["events"] = (state["events"] + newEvents)[-maxEvents:]
+    saveState(logDir, state)
+    return [state, newEvents, scanned]
+
+def getLogDirs(root, servers, allServers=False):
+    """Return [server, log directory] for the named servers, or for every server with a SystemOut.log"""
+    if allServers:
+        servers = [name for name in os.listdir(root) if os.path.exists(os.path.join(root, name, "SystemOut.log"))]
+        servers.sort()
+    return [[server, os.path.join(root, server)] for server in servers]
+
+def inRange(timestamp, start, end):
+    return (start is None or timestamp >= start) and (end is None or timestamp <= end)
+
+def printEvents(server, events, start, end, types):
+    """Print the events of a server within [start, end]; return how many were printed"""
+    printed = 0
+    for timestamp, eventType, name, message in events:
+        if inRange(timestamp, start, end) and (not types or eventType in types):
+            print("%s %-10s %-19s %s" % (pmiStore.formatTime(timestamp), server, eventType, message))
+            printed = printed + 1
+    return printed
+
+def summarizeEvents(events, start, end):
+    """Return {event type: [count, first, last]} for the events within [start, end]"""
+    summary = {}
+    for timestamp, eventType, name, message in events:
+        if not inRange(timestamp, start, end):
+            continue
+        if eventType not in summary:
+            summary[eventType] = [0, timestamp, timestamp]
+        entry = summary[eventType]
+        entry[0] = entry[0] + 1
+        entry[1] = min(entry[1], timestamp)
+        entry[2] = max(entry[2], timestamp)
+    return summary
+
+def printSummary(server, events, start, end):
+    summary = summarizeEvents(events, start, end)
+    print("%s:" % server)
+    if not summary:
+        print("  No performance events")
+    for eventType, message in logEvents:
+        if eventType in summary:
+            count, first, last = summary[eventType]
+            print("  %-19s %-27s %6d  first %s  last %s" % (eventType, message, count, pmiStore.formatTime(first), pmiStore.formatTime(last)))
+
+def getChronologicalFiles(state):
+    """Return the checkpointed file states from the oldest log to SystemOut.log"""
+    files = list(state["files"].values())
+    files.sort(key=lambda fileState: (fileState["index"] and fileState["index"][0][0] or fileState["mtime"]))
+    return files
+
+def printLines(state, start, end):
+    """Print the log entries within [start, end], seeking to the start through the timestamp index"""
+    for fileState in getChronologicalFiles(state):
+        index = fileState["index"]
+        if not index or (end is not None and index[0][0] > end):
+            continue
+        # The index entry before start; the entries after it may already be in range
+        position = bisect.bisect_left([timestamp for timestamp, offset in index], start) - 1
+        offset = index[max(position, 0)][1]
+        logFile = LogFile(fileState["path"])
+        try:
+            data = logFile.data
+            printing = False
+            while offset < logFile.size:
+                lineEnd = data.find(newline, offset)
+                if lineEnd < 0:
+                    lineEnd = logFile.size
+                timestamp = parseTimestamp(data, offset)
+                if timestamp is not None:
+                    if end is not None and timestamp > end:
+                        break
+                    printing = timestamp >= start
+                if printing:
+                    print(decodeLine(data[offset:lineEnd]))
+                offset = lineEnd + 1
+        finally:
+            logFile.close()
+
+# Main execution
+if __name__ == "__main__":
+    options = sys.argv[1:]
+    commands = [option for option in options if option in ["events", "summary", "lines"]]
+    if not commands or "-help" in options or (commands[0] == "lines" and "-from" not in options):
+        print("Usage: %s [-logs dir] [-server name,...|-all] events|summary|lines [options]" % sys.argv[0])
+        print("  events  - Performance events [-from time] [-to time] [-type name,...] [-new]")
+        print("            -new prints only the events found since the last run")
+        print("  summary - Events per type with the first and last occurrence [-from time] [-to time]")
+        print("  lines   - Log entries of a time range -from time [-to time]")
+        print("  -logs   - Logs directory with one subdirectory per server (default %s)" % logsDir)
+        print("  -server - Servers to analyze, comma-separated (default %s)" % serverName)
+        print("  -all    - Every server in the logs directory")
+        print("  Event types: %s" % ", ".join([eventType for eventType, message in logEvents]))
+        sys.exit(2)
+    
+    command = commands[0]
+    servers = envConfig.getOption(options, "-server", serverName).split(",")
+    types = envConfig.getOption(options, "-type") and envConfig.getOption(options, "-type").split(",") or []
+    started = time.time()
+    try:
+        start = envConfig.getOption(options, "-from") and pmiStore.parseTime(envConfig.getOption(options, "-from"))
+        end = envConfig.getOption(options, "-to") and pmiStore.parseTime(envConfig.getOption(options, "-to"))
+    except Exception:
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    try:
+        logDirs = getLogDirs(envConfig.getOption(options, "-logs", logsDir), servers, "-all" in options)
+        totalScanned = 0
+        for server, logDir in logDirs:
+            if not findLogFiles(logDir):
+                print("WARNING: No SystemOut logs in %s" % logDir)
+                continue
+            state, newEvents, scanned = updateLogDir(logDir)
+            totalScanned = totalScanned + scanned
+            if command == "events":
+                events = state["events"]
+                if "-new" in options:
+                    events = newEvents
+                printEvents(server, events, start, end, types)
+            elif command == "summary":
+                printSummary(server, state["events"], start, end)
+            else:
+                printLines(state, start, end)
+    except (IOError, OSError):
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    if command != "lines":
+        print("Analyzed %d server(s), %.1f MB of new log data in %.2fs" % (len(logDirs), totalScanned / 1048576.0, time.time() - started))
@@ -0,0 +1,141 @@
+"""
+WebSphere Node Synchronization (Jython)
+Shared helper module that synchronizes only the nodes affected by a change,
+in parallel, and waits for each to finish within a deadline.
+
+Saved configuration otherwise reaches nodes whenever their automatic sync
+interval fires, so a following start or deploy may run against old
+configuration.
+
+Usage from a wsadmin script:
+    import websphere_node_sync as nodeSync
+    nodeSync.bindAdminObjects(globals())
+    if not nodeSync.syncNodes(["Node01", "Node02"]):
+        sys.exit(1)
+
+Standalone:
+    wsadmin -lang jython -f websphere_node_sync.py [node1,node2,...|all] [-timeout seconds] [-workers n]
+"""
+
+# Import required modules
+import sys
+import os
+import time
+import threading
+import Queue
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_env_config as envConfig
+
+# wsadmin scripting objects, bound by bindAdminObjects()
+AdminControl = None
+
+# Synchronization defaults
+syncTimeout = 300  # Seconds allowed for every node to finish
+syncWorkers = 8    # Nodes synchronized at the same time
+
+def bindAdminObjects(namespace):
+    """Bind the wsadmin scripting objects found in a script's global namespace"""
+    global AdminControl
+    if "AdminControl" in namespace.keys():
+        AdminControl = namespace["AdminControl"]
+
+def getNodeNames(serverTargets):
+    """Return the distinct node names of a list of [node, server] pairs"""
+    nodes = []
+    for target in serverTargets:
+        if target[0] not in nodes:
+            nodes.append(target[0])
+    return nodes
+
+def getManagedNodes():
+    """Return the names of every node with a running node agent"""
+    nodes = []
+    for nodeSyncMBean in AdminControl.queryNames("type=NodeSync,*").splitlines():
+        node = AdminControl.getAttribute(nodeSyncMBean, "nodeName")
+        if node not in nodes:
+            nodes.append(node)
+    return nodes
+
+def syncNode(node, deadline):
+    """Synchronize one node and wait until it reports being in sync; return the outcome"""
+    nodeSyncMBean = AdminControl.completeObjectName("type=NodeSync,node=%s,*" % node)
+    if not nodeSyncMBean:
+        return "NO AGENT"
+    
+    # sync returns once the node agent has pulled the changes; confirm the
+    # repository epochs match before reporting the node as done
+    if AdminControl.invoke(nodeSyncMBean, "sync") != "true":
+        return "FAILED"
+    while time.time() < deadline:
+        if AdminControl.invoke(nodeSyncMBean, "isNodeSynchronized") == "true":
+            return "OK"
+        time.sleep(2)
+    return "TIMEOUT"
+
+def syncWorker(pending, deadline, results):
+    """Take nodes off the queue and synchronize each"""
+    while 1:
+        try:
+            node = pending.get_nowait()
+        except Queue.Empty:
+            return
+        started = time.time()
+        try:
+            outcome = syncNode(node, deadline)
+        except:
+            outcome = "FAILED: %s" % sys.exc_info()[1]
+        results[node] = [outcome, time.time() - started]
+
+def syncNodes(nodes, timeout=syncTimeout, workers=syncWorkers):
+    """Synchronize the nodes in parallel, print the duration per node and return true if all succeeded"""
+    if not nodes:
+        return True
+    print "Synchronizing %d node(s): %s" % (len(nodes), ", ".join(nodes))
+    deadline = time.time() + timeout
+    
+    pending = Queue.Queue()
+    for node in nodes:
+        pending.put(node)
+    
+    results = {}
+    threads = []
+    for i in range(min(workers, len(nodes))):
+        thread = threading.Thread(target=syncWorker, args=(pending, deadline, results))
+        thread.setDaemon(1)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join(max(deadline - time.time(), 0) + 5)
+    
+    print "Node synchronization results:"
+    failures = 0
+    for node in nodes:
+        outcome, elapsed = results.get(node, ["TIMEOUT", timeout])
+        print "  %-30s %-10s %7.1fs" % (node, outcome, elapsed)
+        if outcome != "OK":
+            failures = failures + 1
+    
+    if failures:
+        print "ERROR: %d of %d node(s) did not synchronize within %d seconds" % (failures, len(nodes), timeout)
+        return False
+    return True
+
+# Main execution
+if __name__ == "__main__":
+    bindAdminObjects(globals())
+    target = sys.argv[0] if len(sys.argv) > 0 else "all"
+    options = sys.argv[1:]
+    
+    if target == "all":
+        nodes = getManagedNodes()
+    else:
+        nodes = target.split(",")
+    
+    if not syncNodes(nodes, int(envConfig.getOption(options, "-timeout", syncTimeout)), int(envConfig.getOption(options, "-workers", syncWorkers))):
+        sys.exit(1)
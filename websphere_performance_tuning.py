@@ -6,97 +6,117 @@ This script demonstrates how to configure performance-related settings in WebSph
 # Import required modules
 import sys
 import os
+import time
+import threading
+import Queue
 
-# Configuration parameters
-cellName = "YourCellName"
-nodeName = "YourNodeName"
-serverName = "YourServerName"
-
-# Performance tuning parameters
-jvmHeapMin = 1024
-jvmHeapMax = 4096
-threadPoolMin = 10
-threadPoolMax = 100
-connectionPoolMin = 10
-connectionPoolMax = 100
-connectionTimeout = 180
-httpSessionTimeout = 30
-httpKeepAlive = "true"
-httpMaxKeepAliveConnections = 100
-cacheDiskOffload = "true"
-dynamicCacheSize = 2000
-webContainerThreads = 50
-asyncWorkManagerThreads = 30
-pmiEnabled = "true"
-pmiStatLevel = "high"
-
-def configureJVMSettings():
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_config_cache as configCache
+import websphere_desired_state as desiredState
+import websphere_node_sync as nodeSync
+import websphere_env_config as envConfig
+import websphere_call_trace as callTrace
+import websphere_tuning_targets as tuningTargets
+import websphere_tuning_report as tuningReport
+callTrace.install(globals())
+configCache.bindAdminObjects(globals())
+nodeSync.bindAdminObjects(globals())
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+cellName = env.get("was.cell")
+nodeName = env.get("was.node")
+serverName = env.get("server.name")
+
+# Performance tuning parameters: the tuning.* properties, applied as the
+# attribute values defined in websphere_tuning_targets.py, with the profile and
+# overrides of each server's cluster and of the server itself on top
+targetConfigs = {}
+
+# Cell-wide fan-out
+maxWorkers = 8
+
+# Performance report
+reportBasePath = env.get("tuning.report.file")  # Extension added per format
+reportBaseline = os.path.expanduser(env.get("tuning.report.baseline"))  # Last approved JSON report
+
+# Per-server and per-datasource pool sizes written by websphere_pool_recommender.py,
+# heap and nursery sizes written by websphere_gc_analyzer.py and cache entries
+# written by websphere_cachespec_generator.py, loaded with -recommendations; the
+# same keys may also be set in the properties file
+poolRecommendations = None
+
+# When true, configure functions stage their changes in the workspace and
+# leave the single save to applyTuningTransaction
+singleTransaction = False
+
+def saveConfig():
+    """Save the configuration unless changes are being staged or nothing has changed"""
+    if singleTransaction:
+        return
+    if not AdminConfig.hasChanges():
+        print "No configuration changes to save"
+        return
+    AdminConfig.save()
+
+def resolveTarget(node, server):
+    """Return the [node, server] to tune, defaulting to nodeName and serverName"""
+    return [node or nodeName, server or serverName]
+
+def getTargetServerID(node, server):
+    """Return the config ID of the server to tune"""
+    node, server = resolveTarget(node, server)
+    return configCache.getServerID(cellName, node, server)
+
+def getTargetConfig(node, server):
+    """Return the tuning values of a server: its tuning profile and cluster and server overrides applied"""
+    node, server = resolveTarget(node, server)
+    if (node, server) not in targetConfigs:
+        clusterName = configCache.showAttribute(getTargetServerID(node, server), "clusterName")
+        targetConfigs[(node, server)] = tuningTargets.getTargetConfig(env, clusterName, node, server)
+    return targetConfigs[(node, server)]
+
+def configureJVMSettings(node=None, server=None):
     """Configure JVM settings for optimal performance"""
     print "Configuring JVM settings..."
     
     # Get server configuration
-    serverID = AdminConfig.getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
+    serverID = getTargetServerID(node, server)
+    config = getTargetConfig(node, server)
     
     # Get JVM configuration
-    jvmID = AdminConfig.list("JavaVirtualMachine", serverID)
+    jvmID = configCache.listFirst("JavaVirtualMachine", serverID)
     
     # Configure JVM settings
-    AdminConfig.modify(jvmID, [
-        ["initialHeapSize", jvmHeapMin],
-        ["maximumHeapSize", jvmHeapMax],
-        ["genericJvmArguments", "-Xgcpolicy:gencon -Xmn512m -Xcompressedrefs -Xgc:preferredHeapBase=0x100000000 -Xdisableexplicitgc -XX:+UseParallelGC -XX:ParallelGCThreads=8 -Dcom.ibm.websphere.pmirm.timeout=180"]
-    ])
+    desiredState.applyDesiredState(jvmID, tuningTargets.getJvmTargets(config, poolRecommendations))
     
     # Save configuration
-    AdminConfig.save()
+    saveConfig()
     print "JVM settings configured successfully"
 
-def configureThreadPools():
+def configureThreadPools(node=None, server=None):
     """Configure thread pools for optimal performance"""
     print "Configuring thread pools..."
     
     # Get server configuration
-    serverID = AdminConfig.getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
-    
-    # Configure WebContainer thread pool
-    threadPoolID = AdminConfig.list("ThreadPool", serverID)
-    for pool in threadPoolID.splitlines():
-        name = AdminConfig.showAttribute(pool, "name")
-        if name == "WebContainer":
-            AdminConfig.modify(pool, [
-                ["minimumSize", threadPoolMin],
-                ["maximumSize", threadPoolMax],
-                ["inactivityTimeout", "3500"],
-                ["isGrowable", "true"]
-            ])
-            print "WebContainer thread pool configured"
-    
-    # Configure Default thread pool
-    for pool in threadPoolID.splitlines():
-        name = AdminConfig.showAttribute(pool, "name")
-        if name == "Default":
-            AdminConfig.modify(pool, [
-                ["minimumSize", "5"],
-                ["maximumSize", "20"],
-                ["inactivityTimeout", "3500"],
-                ["isGrowable", "true"]
-            ])
-            print "Default thread pool configured"
-    
-    # Configure ORB thread pool
-    for pool in threadPoolID.splitlines():
-        name = AdminConfig.showAttribute(pool, "name")
-        if name == "ORB.thread.pool":
-            AdminConfig.modify(pool, [
-                ["minimumSize", "10"],
-                ["maximumSize", "50"],
-                ["inactivityTimeout", "3500"],
-                ["isGrowable", "true"]
-            ])
-            print "ORB thread pool configured"
+    node, server = resolveTarget(node, server)
+    serverID = getTargetServerID(node, server)
+    config = getTargetConfig(node, server)
+    
+    # Pool names are read once and cached, so each pool is a single lookup
+    for poolName, desired in tuningTargets.getThreadPoolTargets(config, node, server, poolRecommendations):
+        pool = configCache.findByName("ThreadPool", serverID, poolName)
+        if pool:
+            desiredState.applyDesiredState(pool, desired)
+            print "%s thread pool configured" % poolName
     
     # Save configuration
-    AdminConfig.save()
+    saveConfig()
     print "Thread pools configured successfully"
 
 def configureConnectionPools():
@@ -104,340 +124,423 @@ def configureConnectionPools():
     print "Configuring connection pools..."
     
     # Get all data sources
-    dataSources = AdminConfig.list("DataSource").splitlines()
+    dataSources = configCache.listObjects("DataSource")
     
     for ds in dataSources:
-        dsName = AdminConfig.showAttribute(ds, "name")
+        dsName = configCache.showAttribute(ds, "name")
         print "Configuring connection pool for data source: %s" % dsName
         
         # Get connection pool
-        connPool = AdminConfig.list("ConnectionPool", ds)
+        connPool = configCache.listFirst("ConnectionPool", ds)
         
         if connPool:
-            # Configure connection pool
-            AdminConfig.modify(connPool, [
-                ["minConnections", connectionPoolMin],
-                ["maxConnections", connectionPoolMax],
-                ["connectionTimeout", connectionTimeout],
-                ["agedTimeout", "1800"],
-                ["purgePolicy", "EntirePool"],
-                ["reapTime", "180"],
-                ["unusedTimeout", "1800"],
-                ["stuckTime", "0"],
-                ["stuckThreshold", "0"]
-            ])
+            # Configure connection pool; a cluster-scoped datasource takes its cluster's profile
+            jndiName = configCache.showAttribute(ds, "jndiName")
+            config = tuningTargets.getTargetConfig(env, tuningTargets.getScopeCluster(ds))
+            desiredState.applyDesiredState(connPool, tuningTargets.getConnectionPoolTargets(config, jndiName, poolRecommendations))
             print "Connection pool for %s configured" % dsName
     
     # Save configuration
-    AdminConfig.save()
+    saveConfig()
     print "Connection pools configured successfully"
 
-def configureWebContainer():
+def configureWebContainer(node=None, server=None):
     """Configure web container for optimal performance"""
     print "Configuring web container..."
     
     # Get server configuration
-    serverID = AdminConfig.getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
+    serverID = getTargetServerID(node, server)
+    config = getTargetConfig(node, server)
     
     # Get web container
-    webContainerID = AdminConfig.list("WebContainer", serverID)
+    webContainerID = configCache.listFirst("WebContainer", serverID)
     
     # Configure web container
     if webContainerID:
-        AdminConfig.modify(webContainerID, [
-            ["enableServletCaching", "true"],
-            ["disablePooling", "false"]
-        ])
+        desiredState.applyDesiredState(webContainerID, tuningTargets.getWebContainerTargets(config))
         
         # Configure session management
-        sessionManagerID = AdminConfig.list("SessionManager", serverID)
+        sessionManagerID = configCache.listFirst("SessionManager", serverID)
         if sessionManagerID:
-            AdminConfig.modify(sessionManagerID, [
-                ["enableUrlRewriting", "false"],
-                ["enableCookies", "true"],
-                ["enableSSLTracking", "false"],
-                ["enableProtocolSwitchRewriting", "false"],
-                ["sessionPersistenceMode", "NONE"],
-                ["tuningParams", [["allowOverflow", "false"], ["invalidationTimeout", str(httpSessionTimeout * 60)], ["maxInMemorySessionCount", "1000"]]]
-            ])
+            desiredState.applyDesiredState(sessionManagerID, tuningTargets.getSessionManagerTargets(config))
             print "Session management configured"
     
     # Configure HTTP transport channel
-    transports = AdminConfig.list("HTTPInboundChannel", serverID).splitlines()
+    transports = configCache.listObjects("HTTPInboundChannel", serverID)
     for transport in transports:
-        AdminConfig.modify(transport, [
-            ["keepAlive", httpKeepAlive],
-            ["maximumPersistentRequests", httpMaxKeepAliveConnections],
-            ["readTimeout", "60"],
-            ["writeTimeout", "60"],
-            ["persistentTimeout", "30"]
-        ])
+        desiredState.applyDesiredState(transport, tuningTargets.getHttpChannelTargets(config))
         print "HTTP transport channel configured"
     
     # Save configuration
-    AdminConfig.save()
+    saveConfig()
     print "Web container configured successfully"
 
-def configureDynamicCache():
+def configureDynamicCache(node=None, server=None):
     """Configure dynamic cache for optimal performance"""
     print "Configuring dynamic cache..."
     
     # Get server configuration
-    serverID = AdminConfig.getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
+    serverID = getTargetServerID(node, server)
+    config = getTargetConfig(node, server)
     
     # Get dynamic cache service
-    cacheID = AdminConfig.list("DynamicCache", serverID)
+    cacheID = configCache.listFirst("DynamicCache", serverID)
     
     # Configure dynamic cache
     if cacheID:
-        AdminConfig.modify(cacheID, [
-            ["enableCacheReplication", "false"],
-            ["enableDiskOffload", cacheDiskOffload],
-            ["flushToDisk", "false"],
-            ["memoryCacheSizeInMB", dynamicCacheSize],
-            ["diskCacheSizeInMB", str(dynamicCacheSize * 2)],
-            ["diskCacheSizeInEntries", "10000"],
-            ["memoryCacheSizeInEntries", "10000"],
-            ["cacheSize", dynamicCacheSize]
-        ])
+        desiredState.applyDesiredState(cacheID, tuningTargets.getDynamicCacheTargets(config, poolRecommendations))
         print "Dynamic cache configured"
     
     # Save configuration
-    AdminConfig.save()
+    saveConfig()
     print "Dynamic cache configured successfully"
 
-def configureAsyncWorkManager():
+def configureAsyncWorkManager(node=None, server=None):
     """Configure async work manager for optimal performance"""
     print "Configuring async work manager..."
     
     # Get server configuration
-    serverID = AdminConfig.getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
+    serverID = getTargetServerID(node, server)
+    config = getTargetConfig(node, server)
     
     # Get async work managers
-    asyncMgrs = AdminConfig.list("AsyncWorkManager", serverID).splitlines()
+    asyncMgrs = configCache.listObjects("AsyncWorkManager", serverID)
     
     for mgr in asyncMgrs:
-        name = AdminConfig.showAttribute(mgr, "name")
+        name = configCache.showAttribute(mgr, "name")
         print "Configuring async work manager: %s" % name
         
         # Configure work manager
-        AdminConfig.modify(mgr, [
-            ["minThreads", "5"],
-            ["maxThreads", asyncWorkManagerThreads],
-            ["threadPriority", "5"],
-            ["isGrowable", "true"]
-        ])
+        desiredState.applyDesiredState(mgr, tuningTargets.getAsyncWorkManagerTargets(config))
     
     # Save configuration
-    AdminConfig.save()
+    saveConfig()
     print "Async work manager configured successfully"
 
-def configurePMI():
+def configurePMI(node=None, server=None):
     """Configure Performance Monitoring Infrastructure (PMI)"""
     print "Configuring PMI..."
     
+    # Get server configuration
+    node, server = resolveTarget(node, server)
+    serverID = getTargetServerID(node, server)
+    config = getTargetConfig(node, server)
+    
     # Enable PMI
-    AdminConfig.modify("PMIService", [["enable", pmiEnabled], ["statisticSet", pmiStatLevel]])
+    pmiID = configCache.listFirst("PMIService", serverID)
+    desiredState.applyDesiredState(pmiID, tuningTargets.getPmiTargets(config))
     
     # Configure specific PMI modules
-    if pmiEnabled == "true":
-        # Get server configuration
-        serverID = AdminConfig.getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
-        
+    if config.get("tuning.pmi.enable") == "true":
         # Enable specific PMI modules
-        AdminControl.invoke("WebSphere:type=PMIService,process=%s,node=%s,*" % (serverName, nodeName), 
+        AdminControl.invoke("WebSphere:type=PMIService,process=%s,node=%s,*" % (server, node), 
                            "enableStatsModule", 
                            "[threadPoolModule true]")
         
-        AdminControl.invoke("WebSphere:type=PMIService,process=%s,node=%s,*" % (serverName, nodeName), 
+        AdminControl.invoke("WebSphere:type=PMIService,process=%s,node=%s,*" % (server, node), 
                            "enableStatsModule", 
                            "[connectionPoolModule true]")
         
-        AdminControl.invoke("WebSphere:type=PMIService,process=%s,node=%s,*" % (serverName, nodeName), 
+        AdminControl.invoke("WebSphere:type=PMIService,process=%s,node=%s,*" % (server, node), 
                            "enableStatsModule", 
                            "[webAppModule true]")
         
-        AdminControl.invoke("WebSphere:type=PMIService,process=%s,node=%s,*" % (serverName, nodeName), 
+        AdminControl.invoke("WebSphere:type=PMIService,process=%s,node=%s,*" % (server, node), 
                            "enableStatsModule", 
                            "[systemModule true]")
         
         print "PMI modules enabled"
     
     # Save configuration
-    AdminConfig.save()
+    saveConfig()
     print "PMI configured successfully"
 
-def configureORB():
+def configureORB(node=None, server=None):
     """Configure ORB (Object Request Broker) settings"""
     print "Configuring ORB settings..."
     
     # Get server configuration
-    serverID = AdminConfig.getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
+    serverID = getTargetServerID(node, server)
+    config = getTargetConfig(node, server)
     
     # Get ORB
-    orbID = AdminConfig.list("ObjectRequestBroker", serverID)
+    orbID = configCache.listFirst("ObjectRequestBroker", serverID)
     
     # Configure ORB
     if orbID:
-        AdminConfig.modify(orbID, [
-            ["requestTimeout", "180"],
-            ["connectionCacheMinimum", "10"],
-            ["connectionCacheMaximum", "50"],
-            ["noLocalCopies", "false"],
-            ["cacheTimeout", "180"]
-        ])
+        desiredState.applyDesiredState(orbID, tuningTargets.getOrbTargets(config))
         print "ORB configured"
     
     # Save configuration
-    AdminConfig.save()
+    saveConfig()
     print "ORB settings configured successfully"
 
-def configureTransactionService():
+def configureTransactionService(node=None, server=None):
     """Configure transaction service for optimal performance"""
     print "Configuring transaction service..."
     
     # Get server configuration
-    serverID = AdminConfig.getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
+    serverID = getTargetServerID(node, server)
+    config = getTargetConfig(node, server)
     
     # Get transaction service
-    tsID = AdminConfig.list("TransactionService", serverID)
+    tsID = configCache.listFirst("TransactionService", serverID)
     
     # Configure transaction service
     if tsID:
-        AdminConfig.modify(tsID, [
-            ["totalTranLifetimeTimeout", "300"],
-            ["clientInactivityTimeout", "60"],
-            ["transactionLogDirectory", "${USER_INSTALL_ROOT}/tranlog"],
-            ["heuristicRetryLimit", "0"],
-            ["heuristicRetryWait", "0"]
-        ])
+        desiredState.applyDesiredState(tsID, tuningTargets.getTransactionServiceTargets(config))
         print "Transaction service configured"
     
     # Save configuration
-    AdminConfig.save()
+    saveConfig()
     print "Transaction service configured successfully"
 
-def generatePerformanceReport():
-    """Generate a performance report"""
-    print "Generating performance report..."
-    
-    # Create a report of current settings
-    report = []
-    report.append("WebSphere Performance Configuration Report")
-    report.append("=========================================")
-    report.append("")
+def getServerSettings(node, server):
+    """Return the [setting, value] pairs of a server that the performance report covers"""
+    settings = []
+    serverID = configCache.getServerID(cellName, node, server)
     
     # JVM settings
-    serverID = AdminConfig.getid("/Cell:%s/Node:%s/Server:%s/" % (cellName, nodeName, serverName))
-    jvmID = AdminConfig.list("JavaVirtualMachine", serverID)
-    initialHeap = AdminConfig.showAttribute(jvmID, "initialHeapSize")
-    maxHeap = AdminConfig.showAttribute(jvmID, "maximumHeapSize")
-    jvmArgs = AdminConfig.showAttribute(jvmID, "genericJvmArguments")
-    
-    report.append("JVM Settings:")
-    report.append("  Initial Heap: %s MB" % initialHeap)
-    report.append("  Maximum Heap: %s MB" % maxHeap)
-    report.append("  JVM Arguments: %s" % jvmArgs)
-    report.append("")
+    jvmID = configCache.listFirst("JavaVirtualMachine", serverID)
+    for attribute in ["initialHeapSize", "maximumHeapSize", "genericJvmArguments"]:
+        settings.append(["jvm.%s" % attribute, configCache.showAttribute(jvmID, attribute)])
     
     # Thread pools
-    report.append("Thread Pool Settings:")
-    threadPoolID = AdminConfig.list("ThreadPool", serverID)
-    for pool in threadPoolID.splitlines():
-        name = AdminConfig.showAttribute(pool, "name")
-        minSize = AdminConfig.showAttribute(pool, "minimumSize")
-        maxSize = AdminConfig.showAttribute(pool, "maximumSize")
-        report.append("  %s: Min=%s, Max=%s" % (name, minSize, maxSize))
-    report.append("")
-    
-    # Connection pools
-    report.append("Connection Pool Settings:")
-    dataSources = AdminConfig.list("DataSource").splitlines()
-    for ds in dataSources:
-        dsName = AdminConfig.showAttribute(ds, "name")
-        connPool = AdminConfig.list("ConnectionPool", ds)
-        if connPool:
-            minConn = AdminConfig.showAttribute(connPool, "minConnections")
-            maxConn = AdminConfig.showAttribute(connPool, "maxConnections")
-            timeout = AdminConfig.showAttribute(connPool, "connectionTimeout")
-            report.append("  %s: Min=%s, Max=%s, Timeout=%s" % (dsName, minConn, maxConn, timeout))
-    report.append("")
-    
-    # Web container
-    report.append("Web Container Settings:")
-    webContainerID = AdminConfig.list("WebContainer", serverID)
-    if webContainerID:
-        servletCaching = AdminConfig.showAttribute(webContainerID, "enableServletCaching")
-        report.append("  Servlet Caching: %s" % servletCaching)
+    for pool in configCache.listObjects("ThreadPool", serverID):
+        name = configCache.showAttribute(pool, "name")
+        for attribute in ["minimumSize", "maximumSize"]:
+            settings.append(["threadpool.%s.%s" % (name, attribute), configCache.showAttribute(pool, attribute)])
     
-    sessionManagerID = AdminConfig.list("SessionManager", serverID)
+    # Web container and sessions; the session timeout lives in tuningParams
+    webContainerID = configCache.listFirst("WebContainer", serverID)
+    if webContainerID:
+        settings.append(["webcontainer.enableServletCaching", configCache.showAttribute(webContainerID, "enableServletCaching")])
+    sessionManagerID = configCache.listFirst("SessionManager", serverID)
     if sessionManagerID:
-        timeout = AdminConfig.showAttribute(sessionManagerID, "invalidationTimeout")
-        report.append("  Session Timeout: %s minutes" % timeout)
-    report.append("")
+        tuningParams = configCache.showAll(sessionManagerID).get("tuningParams")
+        if type(tuningParams) == type({}):
+            settings.append(["session.invalidationTimeout", tuningParams.get("invalidationTimeout", "")])
     
     # Dynamic cache
-    report.append("Dynamic Cache Settings:")
-    cacheID = AdminConfig.list("DynamicCache", serverID)
+    cacheID = configCache.listFirst("DynamicCache", serverID)
     if cacheID:
-        cacheSize = AdminConfig.showAttribute(cacheID, "cacheSize")
-        diskOffload = AdminConfig.showAttribute(cacheID, "enableDiskOffload")
-        report.append("  Cache Size: %s MB" % cacheSize)
-        report.append("  Disk Offload: %s" % diskOffload)
-    report.append("")
+        for attribute in ["cacheSize", "enableDiskOffload"]:
+            settings.append(["dynamiccache.%s" % attribute, configCache.showAttribute(cacheID, attribute)])
     
     # PMI
-    report.append("PMI Settings:")
-    pmiEnabled = AdminConfig.showAttribute("PMIService", "enable")
-    pmiLevel = AdminConfig.showAttribute("PMIService", "statisticSet")
-    report.append("  Enabled: %s" % pmiEnabled)
-    report.append("  Statistic Level: %s" % pmiLevel)
-    report.append("")
-    
-    # Write report to file
-    reportFile = open("/tmp/was_performance_report.txt", "w")
-    for line in report:
-        reportFile.write(line + "\n")
-    reportFile.close()
-    
-    print "Performance report generated at /tmp/was_performance_report.txt"
+    pmiID = configCache.listFirst("PMIService", serverID)
+    if pmiID:
+        for attribute in ["enable", "statisticSet"]:
+            settings.append(["pmi.%s" % attribute, configCache.showAttribute(pmiID, attribute)])
+    return settings
+
+def getCellSettings():
+    """Return the [setting, value] pairs of the cell-scoped resources that the performance report covers"""
+    settings = []
+    for ds in configCache.listObjects("DataSource"):
+        dsName = configCache.showAttribute(ds, "name")
+        connPool = configCache.listFirst("ConnectionPool", ds)
+        if connPool:
+            for attribute in ["minConnections", "maxConnections", "connectionTimeout"]:
+                settings.append(["datasource.%s.%s" % (dsName, attribute), configCache.showAttribute(connPool, attribute)])
+    return settings
+
+def collectPerformanceReport(servers):
+    """Return the report for the servers: {"cell", "generated", "targets": {target: {setting: value}}}"""
+    targets = {"cell": dict(getCellSettings())}
+    for node, server in servers:
+        targets["%s/%s" % (node, server)] = dict(getServerSettings(node, server))
+    return {"cell": cellName, "generated": time.strftime("%Y-%m-%d %H:%M:%S"), "targets": targets}
+
+def generatePerformanceReport(servers=None, reportFormat="text", output=None, baseline=None, approve=False):
+    """Generate a performance report for the servers, compare it with the baseline and return false on regressions"""
+    if servers is None:
+        servers = [[nodeName, serverName]]
+    print "Generating performance report for %d server(s)..." % len(servers)
+    
+    if envConfig.json is None and (reportFormat == "json" or baseline):
+        print "WARNING: No json module in this Jython; JSON output and baseline comparison are unavailable"
+        if reportFormat == "json":
+            reportFormat = "text"
+        baseline = None
+    
+    report = collectPerformanceReport(servers)
+    output = output or tuningReport.getReportPath(reportBasePath, reportFormat)
+    tuningReport.writeReport(report, reportFormat, output)
+    print "Performance report generated at %s" % output
+    
+    regressions = 0
+    if baseline and os.path.exists(baseline) and not approve:
+        lines, regressions = tuningReport.compareReports(tuningReport.loadReport(baseline), report)
+        print "Baseline: %s" % baseline
+        for line in lines:
+            print line
+    elif baseline and not approve:
+        print "No baseline at %s; approve this report with -approve" % baseline
+    
+    if approve and baseline:
+        tuningReport.writeReport(report, "json", baseline)
+        print "Report approved as the baseline at %s" % baseline
+    return regressions == 0
+
+# Tuning steps in the order they are applied by "all"
+tuningSteps = [
+    ["jvm", configureJVMSettings],
+    ["threads", configureThreadPools],
+    ["connections", configureConnectionPools],
+    ["web", configureWebContainer],
+    ["cache", configureDynamicCache],
+    ["async", configureAsyncWorkManager],
+    ["pmi", configurePMI],
+    ["orb", configureORB],
+    ["transactions", configureTransactionService]
+]
+
+def applyTuningTransaction(actions):
+    """Stage the selected tuning steps in one workspace and commit them with a single save"""
+    global singleTransaction
+    print "Applying tuning steps in a single transaction: %s" % ", ".join(actions)
+    
+    # A reset on failure discards everything in the workspace, so refuse to
+    # start on top of changes this script did not make
+    if AdminConfig.hasChanges():
+        print "ERROR: The workspace already contains unsaved changes. Save or discard them first."
+        return False
+    
+    singleTransaction = True
+    try:
+        for stepAction, stepFunction in tuningSteps:
+            if stepAction not in actions:
+                continue
+            try:
+                stepFunction()
+            except:
+                print "Error applying tuning step %s: %s %s" % (stepAction, sys.exc_info()[0], sys.exc_info()[1])
+                print "Discarding all staged tuning changes"
+                AdminConfig.reset()
+                configCache.clear()
+                return False
+    finally:
+        singleTransaction = False
+    
+    # Commit every staged step at once
+    if not AdminConfig.hasChanges():
+        print "Configuration already matches the tuning settings; nothing to save"
+        return True
+    AdminConfig.save()
+    print "Tuning transaction committed successfully"
+    return True
+
+# Tuning steps that apply to the whole cell rather than to one server
+cellScopedSteps = ["connections"]
+
+def tuningWorker(pending, actions, results):
+    """Take servers off the queue and apply the per-server tuning steps to each"""
+    # AdminConfig calls go through configCache, which runs them one at a time
+    while 1:
+        try:
+            node, server = pending.get_nowait()
+        except Queue.Empty:
+            return
+        target = "%s/%s" % (node, server)
+        started = time.time()
+        try:
+            for stepAction, stepFunction in tuningSteps:
+                if stepAction in actions and stepAction not in cellScopedSteps:
+                    stepFunction(node, server)
+            results[target] = ["OK", time.time() - started, ""]
+        except:
+            results[target] = ["FAILED", time.time() - started, "%s %s" % (sys.exc_info()[0], sys.exc_info()[1])]
+
+def applyTuningToServers(actions, servers, workers=maxWorkers, transactional=0):
+    """Apply the selected tuning steps to many servers concurrently and commit them with one save"""
+    global singleTransaction
+    print "Tuning %d server(s) with up to %d worker(s): %s" % (len(servers), workers, ", ".join(actions))
+    
+    if transactional and AdminConfig.hasChanges():
+        print "ERROR: The workspace already contains unsaved changes. Save or discard them first."
+        return False
+    
+    results = {}
+    singleTransaction = True
+    try:
+        # Cell-scoped steps run once, before the per-server work
+        for stepAction, stepFunction in tuningSteps:
+            if stepAction in actions and stepAction in cellScopedSteps:
+                started = time.time()
+                try:
+                    stepFunction()
+                    results["cell:%s" % stepAction] = ["OK", time.time() - started, ""]
+                except:
+                    results["cell:%s" % stepAction] = ["FAILED", time.time() - started, "%s %s" % (sys.exc_info()[0], sys.exc_info()[1])]
+        
+        pending = Queue.Queue()
+        for target in servers:
+            pending.put(target)
+        
+        threads = []
+        for i in range(min(workers, len(servers))):
+            thread = threading.Thread(target=tuningWorker, args=(pending, actions, results))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+    finally:
+        singleTransaction = False
+    
+    # Report results per server
+    print "Tuning results:"
+    targets = results.keys()
+    targets.sort()
+    failures = 0
+    for target in targets:
+        status, elapsed, error = results[target]
+        print "  %-40s %-7s %7.1fs %s" % (target, status, elapsed, error)
+        if status != "OK":
+            failures = failures + 1
+    
+    if failures and transactional:
+        print "%d target(s) failed. Discarding all staged tuning changes" % failures
+        AdminConfig.reset()
+        configCache.clear()
+        return False
+    
+    if not AdminConfig.hasChanges():
+        print "Configuration already matches the tuning settings; nothing to save"
+    else:
+        if failures:
+            # The workspace holds every target's changes, so a failed target cannot be reset on its own
+            print "WARNING: %d target(s) failed; the changes already made to them are saved with the others (use -transaction to discard everything instead)" % failures
+        AdminConfig.save()
+        print "Tuning saved for %d of %d target(s)" % (len(results) - failures, len(results))
+    return failures == 0
+
+def getAffectedNodes(actions, servers):
+    """Return the nodes whose configuration the selected tuning steps changed"""
+    # Cell-scoped resources are used by every node
+    if [a for a in actions if a in cellScopedSteps]:
+        return nodeSync.getManagedNodes()
+    return nodeSync.getNodeNames(servers)
 
 # Main execution
 if __name__ == "__main__":
     action = sys.argv[0] if len(sys.argv) > 0 else "all"
-    
-    if action == "jvm" or action == "all":
-        configureJVMSettings()
-    
-    if action == "threads" or action == "all":
-        configureThreadPools()
-    
-    if action == "connections" or action == "all":
-        configureConnectionPools()
-    
-    if action == "web" or action == "all":
-        configureWebContainer()
-    
-    if action == "cache" or action == "all":
-        configureDynamicCache()
-    
-    if action == "async" or action == "all":
-        configureAsyncWorkManager()
-    
-    if action == "pmi" or action == "all":
-        configurePMI()
-    
-    if action == "orb" or action == "all":
-        configureORB()
-    
-    if action == "transactions" or action == "all":
-        configureTransactionService()
-    
-    if action == "report":
-        generatePerformanceReport()
-    
-    if action not in ["jvm", "threads", "connections", "web", "cache", "async", "pmi", "orb", "transactions", "report", "all"]:
-        print "Usage: wsadmin -f %s [jvm|threads|connections|web|cache|async|pmi|orb|transactions|report|all]" % __file__
+    options = sys.argv[1:]
+    
+    stepActions = [step[0] for step in tuningSteps]
+    if action == "all":
+        actions = stepActions
+    else:
+        actions = action.split(",")
+    
+    invalidActions = [a for a in actions if a not in stepActions + ["report"]]
+    servers = [[nodeName, serverName]]  # Replaced by -cell or -cluster
+    if "-recommendations" in options:
+        poolRecommendations = envConfig.loadConfig(envConfig.getOption(options, "-recommendations"), "")
+    
+    if invalidActions:
+        print "Usage: wsadmin -f %s [jvm|threads|connections|web|cache|async|pmi|orb|transactions|report|all] [-transaction] [-cell|-cluster name] [-workers n] [-sync [-synctimeout seconds]] [-recommendations file] [-trace]" % __file__
+        print "       wsadmin -f %s report [-cell|-cluster name] [-format text|json|csv] [-output file] [-baseline file] [-approve]" % __file__
         print "  jvm          - Configure JVM settings"
         print "  threads      - Configure thread pools"
         print "  connections  - Configure connection pools"
@@ -447,5 +550,55 @@ if __name__ == "__main__":
         print "  pmi          - Configure PMI"
         print "  orb          - Configure ORB settings"
         print "  transactions - Configure transaction service"
-        print "  report       - Generate performance report"
+        print "  report       - Generate a performance report and compare it with the approved baseline"
         print "  all          - Configure all performance settings (default)"
+        print ""
+        print "  Several steps can be combined with commas, e.g. jvm,threads,web"
+        print "  -transaction - Stage the selected steps and commit them with a single save,"
+        print "                 discarding all of them if any step fails"
+        print "  -cell        - Apply the steps to every application server in the cell"
+        print "  -cluster     - Apply the steps to every member of the named cluster"
+        print "  -workers     - Number of servers tuned concurrently (default %d)" % maxWorkers
+        print "  -sync        - Synchronize the affected nodes in parallel once the changes are saved"
+        print "  -synctimeout - Deadline for every node to finish synchronizing (default %d seconds)" % nodeSync.syncTimeout
+        print "  -recommendations - Pool, heap and cache sizes from websphere_pool_recommender.py, websphere_gc_analyzer.py"
+        print "                     or websphere_cachespec_generator.py"
+        print "  -format      - Report format (default text)"
+        print "  -output      - Report file (default %s.<format>)" % reportBasePath
+        print "  -baseline    - Approved JSON report to compare with (default %s);" % reportBaseline
+        print "                 the script exits with status 1 if a tuning setting changed"
+        print "  -approve     - Store this report as the new baseline"
+        print "  -trace       - Record every wsadmin call and print a call profile at exit (websphere_call_trace.py)"
+        sys.exit(1)
+    
+    tuneActions = [a for a in actions if a in stepActions]
+    if "-cell" in options or "-cluster" in options:
+        servers = configCache.findApplicationServers(envConfig.getOption(options, "-cluster"))
+        if not servers:
+            print "ERROR: No application servers found to tune"
+            sys.exit(1)
+        if tuneActions:
+            workers = int(envConfig.getOption(options, "-workers", maxWorkers))
+            if not applyTuningToServers(tuneActions, servers, workers, "-transaction" in options):
+                sys.exit(1)
+    elif "-transaction" in options:
+        if not applyTuningTransaction(tuneActions):
+            sys.exit(1)
+    else:
+        for stepAction, stepFunction in tuningSteps:
+            if stepAction in actions:
+                stepFunction()
+    
+    if desiredState.results:
+        desiredState.printSummary()
+    
+    # Push the saved changes to the affected nodes instead of waiting for
+    # their automatic synchronization interval
+    if "-sync" in options and desiredState.changedCount():
+        if not nodeSync.syncNodes(getAffectedNodes(actions, servers), int(envConfig.getOption(options, "-synctimeout", nodeSync.syncTimeout))):
+            sys.exit(1)
+    
+    if "report" in actions:
+        if not generatePerformanceReport(servers, envConfig.getOption(options, "-format", "text"), envConfig.getOption(options, "-output"),
+                                         envConfig.getOption(options, "-baseline", reportBaseline), "-approve" in options):
+            sys.exit(1)
@@ -0,0 +1,235 @@
+"""
+WebSphere PMI Collector (Jython)
+Samples the PMI statistics enabled by configurePMI in
+websphere_performance_tuning.py from many servers at a fixed interval and
+appends them to a websphere_pmi_store.py time-series file.
+
+Collected per server: thread pool size and active count, connection pool
+size, free connections, waiting threads, wait and use time, allocations, web
+application and servlet request count and response time, and CPU usage.
+Times are the mean over the sampling interval in milliseconds; RequestCount
+and AllocateCount are the number of requests and allocations in the interval.
+
+Query the samples with:
+    python websphere_pmi_store.py query "*|ActiveCount" -from -1h
+"""
+
+# Import required modules
+import sys
+import os
+import time
+import threading
+import Queue
+import java.lang.Boolean
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_config_cache as configCache
+import websphere_env_config as envConfig
+import websphere_pmi_store as pmiStore
+configCache.bindAdminObjects(globals())
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+nodeName = env.get("was.node")
+serverName = env.get("server.name")
+sampleInterval = env.getInt("pmi.collector.interval")  # Seconds between samples
+storeFile = env.get("pmi.collector.file")
+liveWindow = env.getInt("pmi.collector.window")        # Samples per metric in the live view
+maxWorkers = env.getInt("pmi.collector.workers")       # Servers sampled concurrently
+
+# Statistics collected from each PMI module enabled by configurePMI
+collectedStatistics = {
+    "threadPoolModule": ["PoolSize", "ActiveCount"],
+    "connectionPoolModule": ["PoolSize", "FreePoolSize", "WaitingThreadCount", "WaitTime", "UseTime", "AllocateCount"],
+    "webAppModule": ["RequestCount", "ServiceTime"],
+    "systemModule": ["CPUUsageSinceLastMeasurement", "FreeMemory"]
+}
+
+# Counters stored as the increase since the previous sample
+intervalCounts = ["RequestCount", "AllocateCount"]
+
+# Statistics shown in the live view printed after each sample
+liveStatistics = ["ActiveCount", "WaitingThreadCount", "ServiceTime", "CPUUsageSinceLastMeasurement"]
+
+# Perf and Server MBean object names per [node, server]
+perfObjectNames = {}
+
+def getPerfObjectNames(node, server):
+    """Return the Perf and Server MBean object names of a server"""
+    key = (node, server)
+    if key not in perfObjectNames.keys():
+        perfName = AdminControl.completeObjectName("type=Perf,node=%s,process=%s,*" % (node, server))
+        serverMBean = AdminControl.completeObjectName("type=Server,node=%s,process=%s,*" % (node, server))
+        if not perfName or not serverMBean:
+            raise Exception("%s/%s is not running" % (node, server))
+        perfObjectNames[key] = [AdminControl.makeObjectName(perfName), AdminControl.makeObjectName(serverMBean)]
+    return perfObjectNames[key]
+
+def getStatisticValue(metric, statistic, previous):
+    """Return the value to store for a PMI statistic, or None if there is none for this interval"""
+    # Bounded range and range statistics: the current level
+    if hasattr(statistic, "getCurrent"):
+        return statistic.getCurrent()
+    
+    # Time and average statistics: the mean of the requests in this interval
+    if hasattr(statistic, "getMean"):
+        total, count = statistic.getTotal(), statistic.getCount()
+        last = previous.get(metric)
+        previous[metric] = [total, count]
+        if last is None:
+            return None
+        if count < last[1]:
+            # Counters restarted with the server
+            last = [0, 0]
+        if count == last[1]:
+            return None
+        return float(total - last[0]) / (count - last[1])
+    
+    # Count statistics
+    count = statistic.getCount()
+    if statistic.getName() not in intervalCounts:
+        return count
+    last = previous.get(metric)
+    previous[metric] = count
+    if last is None:
+        return None
+    if count < last:
+        return count
+    return count - last
+
+def collectStats(stats, path, names, prefix, previous, points):
+    """Add [metric, value] points for the named statistics of a PMI stats tree"""
+    for statistic in stats.getStatistics():
+        if statistic.getName() in names:
+            metric = "%s|%s|%s" % (prefix, path, statistic.getName())
+            value = getStatisticValue(metric, statistic, previous)
+            if value is not None:
+                points.append([metric, value])
+    for subStats in stats.getSubStats():
+        collectStats(subStats, "%s/%s" % (path, subStats.getName()), names, prefix, previous, points)
+
+def sampleServer(node, server, previous):
+    """Return the [metric, value] points of one server"""
+    perfName, serverMBean = getPerfObjectNames(node, server)
+    try:
+        stats = AdminControl.invoke_jmx(perfName, "getStatsObject", [serverMBean, java.lang.Boolean("true")],
+                                        ["javax.management.ObjectName", "java.lang.Boolean"])
+    except:
+        # The server may have restarted with new MBean identifiers
+        del perfObjectNames[(node, server)]
+        raise
+    
+    points = []
+    if stats is None:
+        return points
+    for module in collectedStatistics.keys():
+        moduleStats = stats.getStats(module)
+        if moduleStats is not None:
+            collectStats(moduleStats, module, collectedStatistics[module], "%s/%s" % (node, server), previous, points)
+    return points
+
+def samplingWorker(pending, previous, points, failures):
+    """Take servers off the queue and sample each"""
+    while 1:
+        try:
+            node, server = pending.get_nowait()
+        except Queue.Empty:
+            return
+        try:
+            points.extend(sampleServer(node, server, previous))
+        except:
+            failures.append("%s/%s: %s" % (node, server, sys.exc_info()[1]))
+
+def sampleServers(servers, previous, workers):
+    """Sample every server concurrently and return [points, failures]"""
+    pending = Queue.Queue()
+    for target in servers:
+        pending.put(target)
+    
+    points = []
+    failures = []
+    threads = []
+    for i in range(min(workers, len(servers))):
+        thread = threading.Thread(target=samplingWorker, args=(pending, previous, points, failures))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return [points, failures]
+
+def isLiveMetric(metric):
+    """Return true for the pool, application and CPU level metrics shown in the live view"""
+    # Servlet-level entries are left to queries
+    return metric.split("|")[-1] in liveStatistics and metric.find("webAppModule.servlets") < 0
+
+def printLiveView(timestamp, buffers, pointCount, failures, elapsed):
+    """Print the latest value and the window average and maximum of the live metrics"""
+    print "%s: %d sample(s) in %.1fs" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)), pointCount, elapsed)
+    metrics = buffers.keys()
+    metrics.sort()
+    for metric in metrics:
+        values = buffers[metric].items()
+        print "  %-70s now %10s  avg %10s  max %10s" % (metric, pmiStore.formatValue(values[-1]),
+              pmiStore.formatValue(float(sum(values)) / len(values)), pmiStore.formatValue(max(values)))
+    for failure in failures:
+        print "  WARNING: %s" % failure
+
+def collectMetrics(servers, interval=sampleInterval, samples=0, path=storeFile, workers=maxWorkers):
+    """Sample the servers every interval seconds and append the samples to the store (samples=0 runs until interrupted)"""
+    print "Collecting PMI statistics from %d server(s) every %d seconds into %s" % (len(servers), interval, path)
+    writer = pmiStore.MetricWriter(path)
+    previous = {}
+    buffers = {}
+    taken = 0
+    try:
+        while samples <= 0 or taken < samples:
+            started = time.time()
+            points, failures = sampleServers(servers, previous, workers)
+            writer.append(started, points)
+            
+            for metric, value in points:
+                if isLiveMetric(metric):
+                    if metric not in buffers.keys():
+                        buffers[metric] = pmiStore.RingBuffer(liveWindow)
+                    buffers[metric].append(value)
+            printLiveView(started, buffers, len(points), failures, time.time() - started)
+            
+            taken = taken + 1
+            if samples <= 0 or taken < samples:
+                time.sleep(max(interval - (time.time() - started), 0))
+    finally:
+        writer.close()
+    print "Collected %d interval(s)" % taken
+
+# Main execution
+if __name__ == "__main__":
+    options = sys.argv
+    
+    if "-help" in options:
+        print "Usage: wsadmin -f %s [-cell|-cluster name] [-interval seconds] [-samples n] [-file path] [-workers n]" % __file__
+        print "  -cell     - Sample every application server in the cell"
+        print "  -cluster  - Sample every member of the named cluster"
+        print "  -interval - Seconds between samples (default %d)" % sampleInterval
+        print "  -samples  - Number of samples to take (default: until interrupted)"
+        print "  -file     - Time-series file to append to (default %s)" % storeFile
+        print "  -workers  - Number of servers sampled concurrently (default %d)" % maxWorkers
+        sys.exit(1)
+    
+    if "-cell" in options or "-cluster" in options:
+        servers = configCache.findApplicationServers(envConfig.getOption(options, "-cluster"))
+    else:
+        servers = [[nodeName, serverName]]
+    if not servers:
+        print "ERROR: No application servers found to sample"
+        sys.exit(1)
+    
+    try:
+        collectMetrics(servers, int(envConfig.getOption(options, "-interval", sampleInterval)), int(envConfig.getOption(options, "-samples", 0)),
+                       envConfig.getOption(options, "-file", storeFile), int(envConfig.getOption(options, "-workers", maxWorkers)))
+    except KeyboardInterrupt:
+        print "Collection stopped"
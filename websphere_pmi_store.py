@@ -0,0 +1,330 @@
+"""
+WebSphere PMI Metric Store (Jython/Python)
+Append-only binary time-series file for the PMI samples written by
+websphere_pmi_collector.py, with a query command for ranges and percentiles.
+
+File layout (big-endian):
+    header:  "WASPMI1\\n"
+    metric:  "M" <uint32 id> <uint16 length> <utf-8 name>
+    batch:   "B" <uint32 epoch seconds> <uint16 count> count x (<uint32 id> <float64 value>)
+
+Metric names are written once and referenced by id, so a sample costs 12
+bytes. Readers stream the file record by record and stop at a truncated
+trailing record, so memory does not grow with the file.
+
+Usage:
+    python websphere_pmi_store.py [-file path] metrics [pattern]
+    python websphere_pmi_store.py [-file path] query pattern [-from time] [-to time] [-percentiles 50,90,99]
+    python websphere_pmi_store.py [-file path] series metric [-from time] [-to time]
+    python websphere_pmi_store.py [-file path] live [pattern] [-window n]
+
+Times are epoch seconds, "YYYY-MM-DD HH:MM[:SS]" or relative to now ("-15m", "-2h", "-1d").
+Patterns are shell-style, e.g. "*/server1|threadPoolModule/*|ActiveCount".
+"""
+
+# Import required modules
+import sys
+import os
+import time
+import math
+import struct
+import random
+import fnmatch
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_env_config as envConfig
+
+# Configuration parameters
+defaultStoreFile = "/tmp/was_pmi_metrics.dat"
+fileHeader = "WASPMI1\n".encode("ascii")
+maxQueryValues = 100000  # Values kept per metric for percentiles; larger ranges are sampled
+liveWindow = 20          # Samples per metric shown by the live view
+livePollInterval = 2     # Seconds between checks for new records in the live view
+
+metricRecord = struct.Struct("!cIH")
+batchRecord = struct.Struct("!cIH")
+pointRecord = struct.Struct("!Id")
+
+class RingBuffer:
+    """Fixed-size buffer of the most recent values"""
+    def __init__(self, size):
+        self.size = size
+        self.values = []
+        self.next = 0
+
+    def append(self, value):
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            self.values[self.next] = value
+        self.next = (self.next + 1) % self.size
+
+    def latest(self):
+        if not self.values:
+            return None
+        return self.values[(self.next - 1) % len(self.values)]
+
+    def items(self):
+        """Return the values from oldest to newest"""
+        if len(self.values) < self.size:
+            return list(self.values)
+        return self.values[self.next:] + self.values[:self.next]
+
+class MetricWriter:
+    """Appends sample batches to a store file, registering new metric names as they appear"""
+    def __init__(self, path=defaultStoreFile):
+        self.path = path
+        self.metricIds = {}
+        validLength = 0
+        if os.path.exists(path):
+            for record in readRecords(path):
+                if record[0] == "M":
+                    self.metricIds[record[2]] = record[1]
+                validLength = record[-1]
+        self.output = open(path, "ab")
+        if validLength:
+            # Drop a record cut short by an interrupted write
+            self.output.truncate(validLength)
+            self.output.seek(validLength)
+        elif self.output.tell() == 0 or not self.metricIds:
+            self.output.truncate(0)
+            self.output.write(fileHeader)
+
+    def getMetricId(self, name):
+        """Return the id for a metric name, writing its definition the first time"""
+        if name not in self.metricIds:
+            metricId = len(self.metricIds) + 1
+            encoded = name.encode("utf-8")
+            self.output.write(metricRecord.pack("M".encode("ascii"), metricId, len(encoded)) + encoded)
+            self.metricIds[name] = metricId
+        return self.metricIds[name]
+
+    def append(self, timestamp, points):
+        """Write one batch of [name, value] points sampled at timestamp (epoch seconds)"""
+        # The uint16 count limits a batch, so large samples are split
+        for start in range(0, len(points), 65535):
+            chunk = [[self.getMetricId(name), float(value)] for name, value in points[start:start + 65535]]
+            data = [batchRecord.pack("B".encode("ascii"), int(timestamp), len(chunk))]
+            for metricId, value in chunk:
+                data.append(pointRecord.pack(metricId, value))
+            self.output.write("".encode("ascii").join(data))
+        self.output.flush()
+
+    def close(self):
+        self.output.close()
+
+def readRecords(path, offset=0):
+    """Yield ["M", id, name, end] and ["B", timestamp, [[id, value], ...], end] records from offset"""
+    storeIn = open(path, "rb")
+    try:
+        if offset == 0:
+            if storeIn.read(len(fileHeader)) != fileHeader:
+                raise Exception("%s is not a PMI metric store" % path)
+        else:
+            storeIn.seek(offset)
+        while 1:
+            start = storeIn.tell()
+            head = storeIn.read(metricRecord.size)
+            if len(head) < metricRecord.size:
+                return
+            kind, first, count = metricRecord.unpack(head)
+            kind = kind.decode("ascii")
+            if kind == "M":
+                name = storeIn.read(count)
+                if len(name) < count:
+                    return
+                yield ["M", first, name.decode("utf-8"), storeIn.tell()]
+            elif kind == "B":
+                data = storeIn.read(count * pointRecord.size)
+                if len(data) < count * pointRecord.size:
+                    return
+                points = []
+                for index in range(count):
+                    points.append(list(pointRecord.unpack_from(data, index * pointRecord.size)))
+                yield ["B", first, points, storeIn.tell()]
+            else:
+                raise Exception("Corrupt record at offset %d of %s" % (start, path))
+    finally:
+        storeIn.close()
+
+def readSamples(path, pattern="*", start=None, end=None):
+    """Yield [timestamp, name, value] for the metrics matching pattern within [start, end]"""
+    names = {}
+    for record in readRecords(path):
+        if record[0] == "M":
+            if fnmatch.fnmatchcase(record[2], pattern):
+                names[record[1]] = record[2]
+            continue
+        timestamp = record[1]
+        if (start is not None and timestamp < start) or (end is not None and timestamp > end):
+            continue
+        for metricId, value in record[2]:
+            if metricId in names:
+                yield [timestamp, names[metricId], value]
+
+def percentile(sortedValues, percent):
+    """Return the nearest-rank percentile of sorted values"""
+    if not sortedValues:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(sortedValues))) - 1
+    return sortedValues[min(max(rank, 0), len(sortedValues) - 1)]
+
+def summarize(path, pattern="*", start=None, end=None, percents=[50, 90, 99]):
+    """Return {name: [count, min, mean, max, {percent: value}]} for the matching metrics"""
+    stats = {}
+    generator = random.Random(0)
+    for timestamp, name, value in readSamples(path, pattern, start, end):
+        if name not in stats:
+            stats[name] = [0, value, 0.0, value, []]
+        entry = stats[name]
+        entry[0] = entry[0] + 1
+        entry[1] = min(entry[1], value)
+        entry[2] = entry[2] + value
+        entry[3] = max(entry[3], value)
+        # Reservoir sampling keeps percentile memory bounded
+        if len(entry[4]) < maxQueryValues:
+            entry[4].append(value)
+        else:
+            slot = generator.randint(0, entry[0] - 1)
+            if slot < maxQueryValues:
+                entry[4][slot] = value
+    
+    summary = {}
+    for name in stats.keys():
+        count, low, total, high, values = stats[name]
+        values.sort()
+        summary[name] = [count, low, total / count, high, dict([[p, percentile(values, p)] for p in percents])]
+    return summary
+
+def parseTime(text):
+    """Return epoch seconds for an absolute, epoch or relative ("-15m") time"""
+    if text.startswith("-") and text[-1] in "smhd":
+        units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+        try:
+            return int(time.time() - float(text[1:-1]) * units[text[-1]])
+        except ValueError:
+            raise Exception("Unrecognized time: %s" % text)
+    try:
+        return int(float(text))
+    except ValueError:
+        pass
+    for layout in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"]:
+        try:
+            return int(time.mktime(time.strptime(text, layout)))
+        except ValueError:
+            pass
+    raise Exception("Unrecognized time: %s" % text)
+
+def formatTime(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+def formatValue(value):
+    if value is None:
+        return "-"
+    if value == int(value) and abs(value) < 1e12:
+        return "%d" % value
+    return "%.2f" % value
+
+def listMetrics(path, pattern="*"):
+    """Print the metric names in the store"""
+    for record in readRecords(path):
+        if record[0] == "M" and fnmatch.fnmatchcase(record[2], pattern):
+            print(record[2])
+
+def printSummary(path, pattern, start, end, percents):
+    """Print count, min, mean, max and percentiles per matching metric"""
+    summary = summarize(path, pattern, start, end, percents)
+    if not summary:
+        print("No samples match %s" % pattern)
+        return
+    names = list(summary.keys())
+    names.sort()
+    width = max([len(name) for name in names])
+    print("%-*s %8s %10s %10s %10s %s" % (width, "Metric", "Samples", "Min", "Mean", "Max",
+                                          " ".join(["%10s" % ("p%s" % p) for p in percents])))
+    for name in names:
+        count, low, mean, high, values = summary[name]
+        print("%-*s %8d %10s %10s %10s %s" % (width, name, count, formatValue(low), formatValue(mean), formatValue(high),
+                                              " ".join(["%10s" % formatValue(values[p]) for p in percents])))
+
+def printSeries(path, metric, start, end):
+    """Print the raw samples of one metric"""
+    for timestamp, name, value in readSamples(path, metric, start, end):
+        print("%s %s %s" % (formatTime(timestamp), name, formatValue(value)))
+
+def followStore(path, pattern, window):
+    """Print a rolling view of the matching metrics as the collector appends batches"""
+    names = {}
+    buffers = {}
+    offset = 0
+    while 1:
+        latest = None
+        for record in readRecords(path, offset):
+            offset = record[-1]
+            if record[0] == "M":
+                if fnmatch.fnmatchcase(record[2], pattern):
+                    names[record[1]] = record[2]
+                continue
+            latest = record[1]
+            for metricId, value in record[2]:
+                if metricId in names:
+                    if metricId not in buffers:
+                        buffers[metricId] = RingBuffer(window)
+                    buffers[metricId].append(value)
+        
+        # One view per poll, however many batches arrived since the last one
+        if latest is not None:
+            print("%s (last %d samples)" % (formatTime(latest), window))
+            metricIds = list(buffers.keys())
+            metricIds.sort()
+            for metricId in metricIds:
+                values = buffers[metricId].items()
+                print("  %-70s now %10s  avg %10s  max %10s" % (names[metricId], formatValue(values[-1]),
+                      formatValue(sum(values) / len(values)), formatValue(max(values))))
+            sys.stdout.flush()
+        time.sleep(livePollInterval)
+
+# Main execution
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    path = defaultStoreFile
+    if arguments[:1] == ["-file"] and len(arguments) > 1:
+        path = arguments[1]
+        arguments = arguments[2:]
+    command = arguments[:1] and arguments[0] or ""
+    positional = [a for a in arguments[1:2] if not a.startswith("-")]
+    options = arguments[1:]
+    
+    try:
+        start = envConfig.getOption(options, "-from") and parseTime(envConfig.getOption(options, "-from"))
+        end = envConfig.getOption(options, "-to") and parseTime(envConfig.getOption(options, "-to"))
+    except Exception:
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    try:
+        if command == "metrics":
+            listMetrics(path, (positional + ["*"])[0])
+        elif command == "query" and positional:
+            percents = [float(p) for p in envConfig.getOption(options, "-percentiles", "50,90,99").split(",")]
+            printSummary(path, positional[0], start, end, [int(p) == p and int(p) or p for p in percents])
+        elif command == "series" and positional:
+            printSeries(path, positional[0], start, end)
+        elif command == "live":
+            followStore(path, (positional + ["*"])[0], int(envConfig.getOption(options, "-window", liveWindow)))
+        else:
+            print("Usage: %s [-file path] metrics|query|series|live ..." % sys.argv[0])
+            print("  metrics [pattern]                                   - List the metric names")
+            print("  query pattern [-from t] [-to t] [-percentiles list] - Min, mean, max and percentiles per metric")
+            print("  series metric [-from t] [-to t]                     - Raw samples of one metric")
+            print("  live [pattern] [-window n]                          - Follow the store as samples arrive")
+            sys.exit(2)
+    except KeyboardInterrupt:
+        pass
+    except (IOError, OSError):
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
@@ -0,0 +1,247 @@
+"""
+WebSphere Pool Size Recommender (Jython/Python)
+Recommends per-server thread pool and per-datasource connection pool sizes
+from the PMI samples recorded by websphere_pmi_collector.py.
+
+Demand is estimated with Little's law, L = arrival rate x time in system:
+    WebContainer threads: sum(requests x mean service time) / interval
+    Connections:          allocations / interval x mean use time, or the
+                          connections in use plus the threads waiting for
+                          one when that is higher
+Other thread pools have no request statistics and are sized from their
+observed active count. The recommended maximum is the chosen percentile of
+demand plus headroom; the minimum is the median demand.
+
+The recommendations are written as a properties file that
+websphere_performance_tuning.py reads with -recommendations:
+    tuning.threadpool.<node>.<server>.<pool>.min/max
+    tuning.datasource.<jndi name>.min/max
+
+Usage:
+    python websphere_pool_recommender.py [-file store] [-from time] [-to time] [-percentile n] [-headroom factor] [-output file]
+"""
+
+# Import required modules
+import sys
+import os
+import math
+import time
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_env_config as envConfig
+import websphere_pmi_store as pmiStore
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+storeFile = env.get("pmi.collector.file")
+demandPercentile = env.getInt("pool.recommender.percentile")  # Demand percentile the maximum must cover
+headroom = float(env.get("pool.recommender.headroom"))         # Multiplier applied to that demand
+minimumPoolSize = env.getInt("pool.recommender.minimum")      # Smallest maximum ever recommended
+
+# Thread pool whose demand is derived from web request statistics
+webContainerPool = "WebContainer"
+
+class PoolDemand:
+    """Per-interval demand and utilization observed for one pool"""
+    def __init__(self, kind, server, pool):
+        self.kind = kind
+        self.server = server
+        self.pool = pool
+        self.demand = []
+        self.active = []
+        self.saturatedIntervals = 0
+
+    def record(self, demand, active, saturated):
+        self.demand.append(demand)
+        self.active.append(active)
+        if saturated:
+            self.saturatedIntervals = self.saturatedIntervals + 1
+
+def getDemand(demands, kind, server, pool):
+    """Return the PoolDemand for a pool, creating it on first use"""
+    key = (kind, server, pool)
+    if key not in demands:
+        demands[key] = PoolDemand(kind, server, pool)
+    return demands[key]
+
+def analyzeThreadPools(server, values, interval, demands):
+    """Record the demand of each thread pool of a server for one interval"""
+    # Busy time of the web container: requests x mean service time (ms)
+    busyTime = 0.0
+    for (path, statistic), value in values.items():
+        if statistic == "ServiceTime" and path.startswith("webAppModule/") and path.count("/") == 1:
+            busyTime = busyTime + values.get((path, "RequestCount"), 0) * value
+    
+    for (path, statistic), active in values.items():
+        if statistic != "ActiveCount" or not path.startswith("threadPoolModule/"):
+            continue
+        pool = path.split("/", 1)[1]
+        poolSize = values.get((path, "PoolSize"), 0)
+        demand = active
+        if pool == webContainerPool and interval:
+            demand = max(active, busyTime / (interval * 1000.0))
+        getDemand(demands, "thread", server, pool).record(demand, active, poolSize and active >= poolSize)
+
+def analyzeConnectionPools(server, values, interval, demands):
+    """Record the demand of each connection pool of a server for one interval"""
+    for (path, statistic), poolSize in values.items():
+        if statistic != "PoolSize" or not path.startswith("connectionPoolModule/") or path.count("/") < 2:
+            continue
+        jndiName = path.split("/", 2)[2]
+        inUse = poolSize - values.get((path, "FreePoolSize"), 0)
+        waiting = values.get((path, "WaitingThreadCount"), 0)
+        demand = inUse + waiting
+        allocations = values.get((path, "AllocateCount"))
+        useTime = values.get((path, "UseTime"))
+        if interval and allocations is not None and useTime is not None:
+            demand = max(demand, allocations / float(interval) * useTime / 1000.0)
+        getDemand(demands, "connection", server, jndiName).record(demand, inUse, waiting > 0)
+
+def analyzeStore(path, start=None, end=None):
+    """Return {(kind, server, pool): PoolDemand} for the samples in [start, end]"""
+    names = {}
+    lastSample = {}
+    demands = {}
+    for record in pmiStore.readRecords(path):
+        if record[0] == "M":
+            names[record[1]] = record[2].split("|")
+            continue
+        timestamp = record[1]
+        if (start is not None and timestamp < start) or (end is not None and timestamp > end):
+            continue
+        
+        # Group the batch by server: {server: {(path, statistic): value}}
+        servers = {}
+        for metricId, value in record[2]:
+            server, statPath, statistic = names[metricId]
+            if server not in servers:
+                servers[server] = {}
+            servers[server][(statPath, statistic)] = value
+        
+        for server, values in servers.items():
+            interval = 0
+            if server in lastSample:
+                interval = timestamp - lastSample[server]
+            lastSample[server] = timestamp
+            analyzeThreadPools(server, values, interval, demands)
+            analyzeConnectionPools(server, values, interval, demands)
+    return demands
+
+def recommend(poolDemand, percent=demandPercentile, factor=headroom):
+    """Return [min, max, demand at the percentile] for a pool"""
+    demand = list(poolDemand.demand)
+    demand.sort()
+    peak = pmiStore.percentile(demand, percent)
+    typical = pmiStore.percentile(demand, 50)
+    maximum = max(int(math.ceil(peak * factor)), minimumPoolSize)
+    minimum = min(max(int(math.ceil(typical)), 1), maximum)
+    return [minimum, maximum, peak]
+
+def escapeKey(key):
+    """Escape the characters that end or comment a properties key"""
+    for char in "\\ =:#!":
+        key = key.replace(char, "\\" + char)
+    return key
+
+def buildRecommendations(demands, percent=demandPercentile, factor=headroom):
+    """Return [key, min, max, note] rows, one per thread pool and per datasource"""
+    rows = []
+    keys = list(demands.keys())
+    keys.sort()
+    
+    # A datasource's pool exists in every server that uses it; its maximum covers the
+    # busiest server and its minimum the quietest
+    datasources = {}
+    for key in keys:
+        poolDemand = demands[key]
+        minimum, maximum, peak = recommend(poolDemand, percent, factor)
+        share = 100.0 * poolDemand.saturatedIntervals / len(poolDemand.demand)
+        if poolDemand.kind == "thread":
+            node, server = poolDemand.server.split("/", 1)
+            note = "%s %s: p%s demand %s, peak active %s, all threads busy in %.0f%% of %d intervals" % (
+                poolDemand.server, poolDemand.pool, percent, pmiStore.formatValue(peak),
+                pmiStore.formatValue(max(poolDemand.active)), share, len(poolDemand.demand))
+            rows.append(["tuning.threadpool.%s.%s.%s" % (node, server, poolDemand.pool), minimum, maximum, note])
+        else:
+            note = "%s on %s: p%s demand %s, peak in use %s, threads waiting in %.0f%% of %d intervals" % (
+                poolDemand.pool, poolDemand.server, percent, pmiStore.formatValue(peak),
+                pmiStore.formatValue(max(poolDemand.active)), share, len(poolDemand.demand))
+            if poolDemand.pool in datasources:
+                row = datasources[poolDemand.pool]
+                row[1] = min(row[1], minimum)
+                row[2] = max(row[2], maximum)
+                row[3] = row[3] + "\n" + note
+            else:
+                datasources[poolDemand.pool] = ["tuning.datasource.%s" % poolDemand.pool, minimum, maximum, note]
+    
+    names = list(datasources.keys())
+    names.sort()
+    return rows + [datasources[name] for name in names]
+
+def writeRecommendations(rows, output, description, source="websphere_pool_recommender.py"):
+    """Write the recommendations as a properties file for websphere_performance_tuning.py"""
+    out = open(output, "w")
+    try:
+        out.write("# Pool size recommendations from %s\n" % source)
+        out.write("# %s\n" % description)
+        for key, minimum, maximum, note in rows:
+            out.write("\n")
+            for line in note.split("\n"):
+                out.write("# %s\n" % line)
+            out.write("%s.min=%d\n" % (escapeKey(key), minimum))
+            out.write("%s.max=%d\n" % (escapeKey(key), maximum))
+    finally:
+        out.close()
+
+def printRecommendations(rows):
+    """Print the recommendations as a table"""
+    width = max([len(row[0]) for row in rows])
+    print("%-*s %6s %6s" % (width, "Pool", "Min", "Max"))
+    for key, minimum, maximum, note in rows:
+        print("%-*s %6d %6d" % (width, key, minimum, maximum))
+        for line in note.split("\n"):
+            print("%*s  %s" % (width, "", line))
+
+# Main execution
+if __name__ == "__main__":
+    options = sys.argv[1:]
+    if "-help" in options:
+        print("Usage: %s [-file store] [-from time] [-to time] [-percentile n] [-headroom factor] [-output file]" % sys.argv[0])
+        print("  -file       - PMI store written by websphere_pmi_collector.py (default %s)" % storeFile)
+        print("  -from, -to  - Sample range; epoch seconds, \"YYYY-MM-DD HH:MM\" or relative (\"-7d\")")
+        print("  -percentile - Demand percentile the maximum must cover (default %d)" % demandPercentile)
+        print("  -headroom   - Multiplier applied to that demand (default %s)" % headroom)
+        print("  -output     - Properties file for websphere_performance_tuning.py -recommendations")
+        sys.exit(2)
+    
+    path = envConfig.getOption(options, "-file", storeFile)
+    try:
+        start = envConfig.getOption(options, "-from") and pmiStore.parseTime(envConfig.getOption(options, "-from"))
+        end = envConfig.getOption(options, "-to") and pmiStore.parseTime(envConfig.getOption(options, "-to"))
+    except Exception:
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    percent = int(envConfig.getOption(options, "-percentile", demandPercentile))
+    factor = float(envConfig.getOption(options, "-headroom", headroom))
+    
+    try:
+        demands = analyzeStore(path, start, end)
+    except (IOError, OSError):
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    if not demands:
+        print("ERROR: No thread or connection pool samples in %s" % path)
+        sys.exit(1)
+    
+    rows = buildRecommendations(demands, percent, factor)
+    printRecommendations(rows)
+    output = envConfig.getOption(options, "-output")
+    if output:
+        description = "Source: %s, p%d demand x %s headroom, generated %s" % (path, percent, factor, time.strftime("%Y-%m-%d %H:%M:%S"))
+        writeRecommendations(rows, output, description)
+        print("Recommendations written to %s" % output)
@@ -7,28 +7,41 @@ This script demonstrates how to configure security settings in WebSphere
 import sys
 import os
 
-# Configuration parameters
-cellName = "YourCellName"
-nodeName = "YourNodeName"
-serverName = "YourServerName"
-ldapHost = "ldap.example.com"
-ldapPort = "389"
-ldapBindDN = "cn=wasadmin,dc=example,dc=com"
-ldapBindPassword = "password"
-ldapBaseDN = "dc=example,dc=com"
-ldapUserFilter = "(&(uid=%v)(objectclass=inetOrgPerson))"
-ldapGroupFilter = "(&(cn=%v)(objectclass=groupOfUniqueNames))"
-sslKeystore = "/path/to/keystore.p12"
-sslKeystorePassword = "keystorePassword"
-sslTruststore = "/path/to/truststore.p12"
-sslTruststorePassword = "truststorePassword"
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_config_cache as configCache
+import websphere_env_config as envConfig
+import websphere_call_trace as callTrace
+callTrace.install(globals())
+configCache.bindAdminObjects(globals())
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+cellName = env.get("was.cell")
+nodeName = env.get("was.node")
+serverName = env.get("server.name")
+ldapHost = env.get("ldap.host")
+ldapPort = env.get("ldap.port")
+ldapBindDN = env.get("ldap.bind.dn")
+ldapBindPassword = env.get("ldap.bind.password")
+ldapBaseDN = env.get("ldap.base.dn")
+ldapUserFilter = env.get("ldap.user.filter")
+ldapGroupFilter = env.get("ldap.group.filter")
+sslKeystore = env.get("ssl.keystore.path")
+sslKeystorePassword = env.get("ssl.keystore.password")
+sslTruststore = env.get("ssl.truststore.path")
+sslTruststorePassword = env.get("ssl.truststore.password")
 
 def configureLDAPRegistry():
     """Configure LDAP user registry"""
     print "Configuring LDAP user registry..."
     
     # Get security configuration
-    securityID = AdminConfig.getid("/Cell:%s/Security:/" % cellName)
+    securityID = configCache.getid("/Cell:%s/Security:/" % cellName)
     
     # Check if LDAP is already configured
     userRegistries = AdminTask.listUserRegistries(["-cell", cellName])
@@ -36,10 +49,10 @@ def configureLDAPRegistry():
         print "LDAP registry already configured. Updating settings..."
         
         # Get LDAP registry ID
-        ldapID = AdminConfig.getid("/Cell:%s/LDAPUserRegistry:/" % cellName)
+        ldapID = configCache.getid("/Cell:%s/LDAPUserRegistry:/" % cellName)
         
         # Update LDAP settings
-        AdminConfig.modify(ldapID, [
+        configCache.modify(ldapID, [
             ["host", ldapHost],
             ["port", ldapPort],
             ["baseDN", ldapBaseDN],
@@ -78,7 +91,7 @@ def configureSSL():
     print "Configuring SSL settings..."
     
     # Get security configuration
-    securityID = AdminConfig.getid("/Cell:%s/Security:/" % cellName)
+    securityID = configCache.getid("/Cell:%s/Security:/" % cellName)
     
     # Configure SSL
     sslConfigID = AdminTask.createSSLConfig([
@@ -100,7 +113,7 @@ def configureGlobalSecurity():
     print "Configuring global security settings..."
     
     # Get security configuration
-    securityID = AdminConfig.getid("/Cell:%s/Security:/" % cellName)
+    securityID = configCache.getid("/Cell:%s/Security:/" % cellName)
     
     # Enable global security
     AdminTask.setGlobalSecurity([
@@ -155,8 +168,8 @@ def configureApplicationSecurity():
     # This is typically done per application, but here's a general example
     
     # Get application deployment ID
-    appName = "YourApplication"
-    appID = AdminConfig.getid("/Deployment:%s/" % appName)
+    appName = env.get("app.name")
+    appID = configCache.getid("/Deployment:%s/" % appName)
     
     if appID:
         # Map roles
@@ -179,7 +192,7 @@ def configureCSRF():
     print "Configuring CSRF protection..."
     
     # Get security configuration
-    securityID = AdminConfig.getid("/Cell:%s/Security:/" % cellName)
+    securityID = configCache.getid("/Cell:%s/Security:/" % cellName)
     
     # Configure CSRF protection
     AdminTask.configureCSRFProtection([
@@ -211,7 +224,7 @@ def configureAudit():
     print "Configuring security auditing..."
     
     # Get security configuration
-    securityID = AdminConfig.getid("/Cell:%s/Security:/" % cellName)
+    securityID = configCache.getid("/Cell:%s/Security:/" % cellName)
     
     # Configure audit
     AdminTask.configureAudit([
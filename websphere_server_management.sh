@@ -3,12 +3,37 @@
 # This script provides functions to start, stop, and check status of WebSphere servers
 
 # Configuration
-WAS_HOME="/opt/IBM/WebSphere/AppServer"
-PROFILE_NAME="AppSrv01"
-NODE_NAME="Node01"
-SERVER_NAME="server1"
-ADMIN_USER="wasadmin"
-ADMIN_PASSWORD="password"
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+# Settings come from websphere_environment.properties; set WAS_ENV to apply
+# an env.<name>.* overlay and WAS_ENV_PROPERTIES to use another file
+PYTHON="$(command -v python3 || command -v python)"
+if [ -n "${PYTHON}" ]; then
+    ENV_SETTINGS="$("${PYTHON}" "${SCRIPT_DIR}/websphere_env_config.py" shell \
+        WAS_HOME=was.home PROFILE_NAME=was.profile NODE_NAME=was.node SERVER_NAME=server.name \
+        ADMIN_USER=was.admin.user ADMIN_PASSWORD=was.admin.password)"
+    if [ $? -ne 0 ]; then
+        echo "${ENV_SETTINGS}"
+        exit 1
+    fi
+    eval "${ENV_SETTINGS}"
+else
+    # Without python the properties file cannot be read; keep the defaults
+    # so that servers can still be started and stopped
+    echo "WARNING: python not found; using the default settings instead of websphere_environment.properties"
+    WAS_HOME="/opt/IBM/WebSphere/AppServer"
+    PROFILE_NAME="AppSrv01"
+    NODE_NAME="Node01"
+    SERVER_NAME="server1"
+    ADMIN_USER="wasadmin"
+    ADMIN_PASSWORD="password"
+fi
+
+# wsadmin command server
+COMMAND_SERVER_PORT=9809
+COMMAND_SERVER_TOKEN="${HOME}/.websphere_command_server"
+COMMAND_SERVER_LOG="/tmp/websphere_command_server.log"
+COMMAND_SERVER_START_TIMEOUT=180
 
 # Source WebSphere environment
 if [ -f "${WAS_HOME}/profiles/${PROFILE_NAME}/bin/setupCmdLine.sh" ]; then
@@ -75,54 +100,147 @@ restart_server() {
     start_server
 }
 
+# Function to submit a job to the wsadmin command server
+# Returns the job's exit status, or 3 if the command server is not running
+submit_job() {
+    if [ ! -f "${COMMAND_SERVER_TOKEN}" ]; then
+        return 3
+    fi
+    
+    # The job is sent as one line, so its arguments cannot hold line breaks
+    local arg
+    for arg in "$@"; do
+        case "$arg" in
+            *$'\n'*|*$'\r'*)
+                echo "ERROR: Job arguments cannot contain line breaks"
+                return 2
+                ;;
+        esac
+    done
+    exec 3<>"/dev/tcp/127.0.0.1/${COMMAND_SERVER_PORT}" || return 3
+    
+    # Token line, then the job with each argument single-quoted (' as '\''),
+    # which the server's shlex.split reads back unchanged
+    printf '%s\n' "$(cat "${COMMAND_SERVER_TOKEN}")" >&3
+    for arg in "$@"; do
+        printf "'%s' " "${arg//\'/\'\\\'\'}" >&3
+    done
+    printf '\n' >&3
+    
+    local status=1
+    while IFS= read -r line <&3; do
+        case "$line" in
+            "EXIT "*)
+                status="${line#EXIT }"
+                break
+                ;;
+            *)
+                echo "$line"
+                ;;
+        esac
+    done
+    exec 3<&-
+    return ${status}
+}
+
+# Function to check if the command server is answering
+command_server_running() {
+    submit_job ping >/dev/null 2>&1
+}
+
+# Function to start the wsadmin command server in the background
+start_command_server() {
+    if command_server_running; then
+        echo "Command server is already running on port ${COMMAND_SERVER_PORT}."
+        return 0
+    fi
+    
+    echo "Starting wsadmin command server on port ${COMMAND_SERVER_PORT}..."
+    nohup "${WAS_HOME}/profiles/${PROFILE_NAME}/bin/wsadmin.sh" -lang jython -username ${ADMIN_USER} -password ${ADMIN_PASSWORD} -f "${SCRIPT_DIR}/websphere_command_server.py" ${COMMAND_SERVER_PORT} > "${COMMAND_SERVER_LOG}" 2>&1 &
+    
+    # Wait for the session to connect and start listening
+    waited=0
+    while [ ${waited} -lt ${COMMAND_SERVER_START_TIMEOUT} ]; do
+        if command_server_running; then
+            echo "Command server started (log: ${COMMAND_SERVER_LOG})."
+            return 0
+        fi
+        sleep 2
+        waited=$((waited + 2))
+    done
+    echo "ERROR: Command server did not start within ${COMMAND_SERVER_START_TIMEOUT} seconds. See ${COMMAND_SERVER_LOG}."
+    exit 1
+}
+
+# Function to stop the wsadmin command server
+stop_command_server() {
+    if command_server_running; then
+        submit_job shutdown
+    else
+        echo "Command server is not running."
+    fi
+}
+
+# Function to manage the wsadmin command server
+manage_command_server() {
+    case "$1" in
+        start)
+            start_command_server
+            ;;
+        stop)
+            stop_command_server
+            ;;
+        status)
+            if command_server_running; then
+                echo "Command server is running on port ${COMMAND_SERVER_PORT}."
+            else
+                echo "Command server is not running."
+                exit 1
+            fi
+            ;;
+        *)
+            echo "Usage: $0 daemon {start|stop|status}"
+            exit 1
+            ;;
+    esac
+}
+
 # Function to deploy an application using wsadmin
 deploy_application() {
     if [ -z "$1" ]; then
         echo "ERROR: No EAR file specified for deployment."
-        echo "Usage: $0 deploy /path/to/application.ear ApplicationName"
+        echo "Usage: $0 deploy /path/to/application.ear ApplicationName [incremental|full]"
         exit 1
     fi
     
     EAR_FILE="$1"
     APP_NAME="${2:-$(basename ${EAR_FILE%.*})}"
     
+    # Incremental deploys update only the modules that changed since the last
+    # deploy; full deploys uninstall and reinstall the application
+    case "${3:-incremental}" in
+        full)
+            DEPLOY_ACTION="deploy"
+            ;;
+        incremental)
+            DEPLOY_ACTION="incremental"
+            ;;
+        *)
+            echo "ERROR: Unknown deployment mode $3 (expected incremental or full)."
+            exit 1
+            ;;
+    esac
+    
     echo "Deploying application ${APP_NAME} from ${EAR_FILE}..."
     
-    # Create a temporary Jython script for deployment
-    TEMP_SCRIPT=$(mktemp)
-    cat > ${TEMP_SCRIPT} << EOF
-appName = "${APP_NAME}"
-earFile = "${EAR_FILE}"
-nodeName = "${NODE_NAME}"
-serverName = "${SERVER_NAME}"
-
-print "Checking if application already exists..."
-appList = AdminApp.list().splitlines()
-if appName in appList:
-    print "Application %s already exists. Uninstalling..." % appName
-    AdminApp.uninstall(appName)
-    AdminConfig.save()
-
-print "Installing application %s from %s" % (appName, earFile)
-options = ['-appname', appName, 
-           '-node', nodeName, 
-           '-server', serverName, 
-           '-usedefaultbindings']
-AdminApp.install(earFile, options)
-AdminConfig.save()
-
-print "Starting application..."
-appManager = AdminControl.queryNames('type=ApplicationManager,node=%s,process=%s,*' % (nodeName, serverName))
-AdminControl.invoke(appManager, 'startApplication', appName)
-
-print "Application %s deployed successfully" % appName
-EOF
+    # Reuse the open wsadmin session when the command server is running
+    if command_server_running; then
+        submit_job deploy ${DEPLOY_ACTION} -ear "${EAR_FILE}" -app "${APP_NAME}" -node "${NODE_NAME}" -server "${SERVER_NAME}" -usedefaultcontextroot
+        return $?
+    fi
     
     # Run the deployment script
-    "${WAS_HOME}/profiles/${PROFILE_NAME}/bin/wsadmin.sh" -lang jython -f ${TEMP_SCRIPT} -username ${ADMIN_USER} -password ${ADMIN_PASSWORD}
-    
-    # Clean up
-    rm ${TEMP_SCRIPT}
+    "${WAS_HOME}/profiles/${PROFILE_NAME}/bin/wsadmin.sh" -lang jython -username ${ADMIN_USER} -password ${ADMIN_PASSWORD} -f "${SCRIPT_DIR}/websphere_deploy_app.py" ${DEPLOY_ACTION} -ear "${EAR_FILE}" -app "${APP_NAME}" -node "${NODE_NAME}" -server "${SERVER_NAME}" -usedefaultcontextroot
 }
 
 # Function to show server logs
@@ -133,14 +251,27 @@ show_logs() {
         if command -v tail >/dev/null 2>&1; then
             echo "Showing last 50 lines of ${SERVER_NAME} logs..."
             tail -n 50 "${LOG_FILE}"
-            
+        else
+            echo "Last 50 lines of ${SERVER_NAME} logs:"
+            cat "${LOG_FILE}" | tail -n 50
+        fi
+        
+        # Hung threads, pool exhaustion, transaction timeouts and OutOfMemory
+        # errors written since the last check; only new log data is read
+        if [ -n "${PYTHON}" ]; then
+            echo ""
+            echo "Performance events since the last check:"
+            "${PYTHON}" "${SCRIPT_DIR}/websphere_log_analyzer.py" -server "${SERVER_NAME}" events -new
+        fi
+        
+        # Follow on request, or when asked at an interactive terminal
+        if [ "$1" = "follow" ]; then
+            tail -f "${LOG_FILE}"
+        elif [ -t 0 ] && [ -t 1 ]; then
             read -p "Do you want to follow the logs? (y/n): " follow_logs
             if [ "$follow_logs" = "y" ]; then
                 tail -f "${LOG_FILE}"
             fi
-        else
-            echo "Last 50 lines of ${SERVER_NAME} logs:"
-            cat "${LOG_FILE}" | tail -n 50
         fi
     else
         echo "ERROR: Log file not found at ${LOG_FILE}"
@@ -162,19 +293,33 @@ case "$1" in
         check_server_status
         ;;
     deploy)
-        deploy_application "$2" "$3"
+        deploy_application "$2" "$3" "$4"
         ;;
     logs)
-        show_logs
+        show_logs "$2"
+        ;;
+    daemon)
+        manage_command_server "$2"
+        ;;
+    job)
+        shift
+        submit_job "$@"
+        status=$?
+        if [ ${status} -eq 3 ]; then
+            echo "ERROR: Command server is not running. Start it with: $0 daemon start"
+        fi
+        exit ${status}
         ;;
     *)
-        echo "Usage: $0 {start|stop|restart|status|deploy|logs}"
+        echo "Usage: $0 {start|stop|restart|status|deploy|logs|daemon|job}"
         echo "  start   - Start the WebSphere server"
         echo "  stop    - Stop the WebSphere server"
         echo "  restart - Restart the WebSphere server"
         echo "  status  - Check the status of the WebSphere server"
-        echo "  deploy  - Deploy an application (requires EAR file path)"
-        echo "  logs    - Show server logs"
+        echo "  deploy  - Deploy an application (requires EAR file path; add 'full' to reinstall instead of updating changed modules)"
+        echo "  logs    - Show server logs and new performance events (add 'follow' to follow the log)"
+        echo "  daemon  - Start, stop or check the wsadmin command server (start|stop|status)"
+        echo "  job     - Run a job in the command server, e.g. job tune all -transaction"
         exit 1
         ;;
 esac
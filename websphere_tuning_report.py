@@ -0,0 +1,134 @@
+"""
+WebSphere Tuning Report (Jython/Python)
+Writes the performance configuration report produced by
+websphere_performance_tuning.py (live, through wsadmin) and
+websphere_config_analyzer.py (offline, from the config repository), and
+compares a report with the last approved baseline.
+
+A report is {"cell", "generated", "targets": {target: {setting: value}}},
+where a target is "node/server" or "cell" and a setting is a name such as
+jvm.maximumHeapSize or threadpool.WebContainer.maximumSize.
+
+The module makes no wsadmin calls, so it also runs under Python:
+    import websphere_tuning_report as tuningReport
+    tuningReport.writeReport(report, "json", "/tmp/was_performance_report.json")
+"""
+
+# Import required modules
+import csv
+import fnmatch
+
+import websphere_env_config as envConfig
+
+# Settings whose change since the approved baseline is flagged as a tuning regression
+regressionSettings = [
+    "jvm.*HeapSize",
+    "threadpool.*.minimumSize",
+    "threadpool.*.maximumSize",
+    "datasource.*.minConnections",
+    "datasource.*.maxConnections",
+    "dynamiccache.*",
+    "session.invalidationTimeout",
+    "pmi.*"
+]
+
+# File extension per report format
+reportExtensions = {"text": "txt", "json": "json", "csv": "csv"}
+
+def getReportPath(basePath, reportFormat):
+    """Return the report file for a base path such as /tmp/was_performance_report"""
+    return "%s.%s" % (basePath, reportExtensions.get(reportFormat, reportFormat))
+
+def sortedKeys(dictionary):
+    keys = list(dictionary.keys())
+    keys.sort()
+    return keys
+
+def getReportRows(report):
+    """Return the report as sorted [target, setting, value] rows"""
+    rows = []
+    for target in sortedKeys(report["targets"]):
+        settings = report["targets"][target]
+        for setting in sortedKeys(settings):
+            rows.append([target, setting, settings[setting]])
+    return rows
+
+def writeReport(report, reportFormat, path):
+    """Write the report as text, JSON or CSV"""
+    reportFile = open(path, "w")
+    try:
+        if reportFormat == "json":
+            envConfig.json.dump(report, reportFile, indent=2, sort_keys=True)
+            reportFile.write("\n")
+        elif reportFormat == "csv":
+            writer = csv.writer(reportFile)
+            writer.writerow(["target", "setting", "value"])
+            for row in getReportRows(report):
+                writer.writerow(row)
+        else:
+            reportFile.write("WebSphere Performance Configuration Report\n")
+            reportFile.write("=========================================\n")
+            reportFile.write("Cell %s, generated %s\n" % (report["cell"], report["generated"]))
+            lastTarget = None
+            for target, setting, value in getReportRows(report):
+                if target != lastTarget:
+                    reportFile.write("\n%s:\n" % target)
+                    lastTarget = target
+                reportFile.write("  %s: %s\n" % (setting, value))
+    finally:
+        reportFile.close()
+
+def loadReport(path):
+    """Return a report written in JSON format"""
+    reportFile = open(path)
+    try:
+        return envConfig.json.load(reportFile)
+    finally:
+        reportFile.close()
+
+def isRegressionSetting(setting):
+    """Return true if a change to the setting is reported as a tuning regression"""
+    for pattern in regressionSettings:
+        if fnmatch.fnmatchcase(setting, pattern):
+            return True
+    return False
+
+def diffReports(baseline, report):
+    """Return [target, setting, baseline value, current value, regression] for every difference"""
+    differences = []
+    targets = {}
+    for target in list(baseline["targets"].keys()) + list(report["targets"].keys()):
+        targets[target] = 1
+    for target in sortedKeys(targets):
+        before = baseline["targets"].get(target)
+        after = report["targets"].get(target)
+        if before is None or after is None:
+            # A server added to or removed from the cell
+            differences.append([target, "*", before is None and "(absent)" or "(present)",
+                                after is None and "(absent)" or "(present)", False])
+            continue
+        settings = {}
+        for setting in list(before.keys()) + list(after.keys()):
+            settings[setting] = 1
+        for setting in sortedKeys(settings):
+            old = before.get(setting, "(unset)")
+            new = after.get(setting, "(unset)")
+            if old != new:
+                differences.append([target, setting, old, new, isRegressionSetting(setting)])
+    return differences
+
+def compareReports(baseline, report):
+    """Return [lines describing each difference, number of regressions]"""
+    differences = diffReports(baseline, report)
+    lines = ["Compared with the baseline generated %s: %d difference(s)" % (baseline["generated"], len(differences))]
+    regressions = 0
+    for target, setting, old, new, regression in differences:
+        if regression:
+            regressions = regressions + 1
+            label = "REGRESSION"
+        else:
+            label = "changed"
+        lines.append("  %-10s %s %s: %s -> %s" % (label, target, setting, old, new))
+    if regressions:
+        lines.append("%d tuning setting(s) changed since the approved baseline" % regressions)
+    return [lines, regressions]
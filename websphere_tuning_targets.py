@@ -0,0 +1,352 @@
+"""
+WebSphere Tuning Targets (Jython/Python)
+The attribute values websphere_performance_tuning.py applies, kept as plain
+data so the wsadmin tuning steps and the offline repository tools work from
+the same definitions.
+
+Each function returns [attribute, value] pairs in the form
+websphere_desired_state.py applies; a list value is a nested object such as
+tuningParams. Values come from websphere_environment.properties, and pool
+sizes may be overridden per server or datasource (tuning.threadpool.* and
+tuning.datasource.* keys, or a websphere_pool_recommender.py file), the
+heap and nursery sizes by a websphere_gc_analyzer.py file and the cache
+entries by a websphere_cachespec_generator.py file.
+
+A tuning profile (tuning.profile.<profile>.* in the properties file) replaces
+the tuning.* values it names for the whole cell, a cluster or one server, and
+tuning.cluster.<cluster>.* and tuning.server.<node>.<server>.* keys override
+single values on top of it. getTargetConfig returns the configuration with
+these layers applied, to pass to the functions below in place of env.
+
+The module makes no wsadmin calls, so it also runs under Python:
+    import websphere_tuning_targets as tuningTargets
+    tuningTargets.getJvmTargets(tuningTargets.getTargetConfig(env, cluster, node, server))
+
+Standalone, it prints the tuning values a target resolves to:
+    python websphere_tuning_targets.py [-env name] [-cluster name] [-server node/server]
+"""
+
+# Import required modules
+import sys
+import os
+
+# JVM arguments applied with the heap sizes; %s is the nursery size (tuning.jvm.nursery)
+genericJvmArguments = "-Xgcpolicy:gencon -Xmn%s -Xcompressedrefs -Xgc:preferredHeapBase=0x100000000 -Xdisableexplicitgc -XX:+UseParallelGC -XX:ParallelGCThreads=8 -Dcom.ibm.websphere.pmirm.timeout=180"
+
+# Thread pools tuned by name: [pool name, minimum, maximum]; a size may name
+# a property instead of giving a number
+threadPoolSizes = [
+    ["WebContainer", "tuning.thread.pool.min", "tuning.thread.pool.max"],
+    ["Default", "tuning.default.thread.pool.min", "tuning.default.thread.pool.max"],
+    ["ORB.thread.pool", "tuning.orb.thread.pool.min", "tuning.orb.thread.pool.max"]
+]
+
+# Minimum and maximum properties that must stay in order once a target's
+# profile and overrides are applied
+sizeLimits = [
+    ["tuning.jvm.initial.heap", "tuning.jvm.max.heap"],
+    ["tuning.connection.pool.min", "tuning.connection.pool.max"],
+    ["tuning.async.work.manager.min.threads", "tuning.async.work.manager.threads"],
+    ["tuning.orb.connection.cache.min", "tuning.orb.connection.cache.max"]
+] + [[minSize, maxSize] for poolName, minSize, maxSize in threadPoolSizes if not minSize.isdigit() and not maxSize.isdigit()]
+
+# Config object types the tuning steps modify, in the order the steps run
+tunedTypes = [
+    "JavaVirtualMachine",
+    "ThreadPool",
+    "ConnectionPool",
+    "WebContainer",
+    "SessionManager",
+    "HTTPInboundChannel",
+    "DynamicCache",
+    "AsyncWorkManager",
+    "PMIService",
+    "ObjectRequestBroker",
+    "TransactionService"
+]
+
+# Config types each tuning step of websphere_performance_tuning.py modifies
+stepTypes = [
+    ["jvm", ["JavaVirtualMachine"]],
+    ["threads", ["ThreadPool"]],
+    ["connections", ["ConnectionPool"]],
+    ["web", ["WebContainer", "SessionManager", "HTTPInboundChannel"]],
+    ["cache", ["DynamicCache"]],
+    ["async", ["AsyncWorkManager"]],
+    ["pmi", ["PMIService"]],
+    ["orb", ["ObjectRequestBroker"]],
+    ["transactions", ["TransactionService"]]
+]
+
+def getProfileName(env, cluster=None, node=None, server=None):
+    """Return the profile of a target: its server's, else its cluster's, else the cell's ("" for none)"""
+    keys = []
+    if node and server:
+        keys.append("tuning.server.%s.%s.profile" % (node, server))
+    if cluster:
+        keys.append("tuning.cluster.%s.profile" % cluster)
+    keys.append("tuning.profile")
+    for key in keys:
+        if env.has(key):
+            return env.get(key)
+    return ""
+
+def getTargetConfig(env, cluster=None, node=None, server=None):
+    """Return env with the profile, cluster and server overrides of a target applied to its tuning.* keys"""
+    layers = []
+    profile = getProfileName(env, cluster, node, server)
+    if profile:
+        if not env.getSubset("tuning.profile.%s." % profile).keys():
+            raise Exception("Tuning profile %s is not defined in %s" % (profile, env.path))
+        layers.append("tuning.profile.%s." % profile)
+    if cluster:
+        layers.append("tuning.cluster.%s." % cluster)
+    if node and server:
+        layers.append("tuning.server.%s.%s." % (node, server))
+    
+    # Later layers are more specific and win
+    overrides = {}
+    for prefix in layers:
+        layer = env.getSubset(prefix)
+        for key in layer.keys():
+            if key != "profile":
+                overrides["tuning." + key] = layer.get(key)
+    config = env.withValues(overrides)
+    
+    # A profile minimum above an override maximum, or the reverse, is rejected
+    # rather than clamped, so the layers are fixed where they are defined
+    for minKey, maxKey in sizeLimits:
+        if config.has(minKey) and config.has(maxKey) and config.getInt(minKey) > config.getInt(maxKey):
+            raise Exception("%s=%s is greater than %s=%s for %s (from %s)" % (minKey, config.get(minKey), maxKey, config.get(maxKey),
+                            describeTarget(cluster, node, server), ", ".join([prefix + "*" for prefix in ["tuning."] + layers])))
+    return config
+
+def describeTarget(cluster=None, node=None, server=None):
+    """Return a target as text for messages: server node/server, cluster name or the cell"""
+    if node and server:
+        return "server %s/%s" % (node, server)
+    if cluster:
+        return "cluster %s" % cluster
+    return "the cell"
+
+def checkPoolSizes(description, minimum, maximum):
+    """Raise an exception if a pool's minimum size is greater than its maximum"""
+    if minimum > maximum:
+        raise Exception("%s: minimum size %d is greater than maximum size %d (check the tuning.* and recommendation values)"
+                        % (description, minimum, maximum))
+
+def getScopeCluster(path):
+    """Return the cluster of a cluster-scoped config ID or resources.xml path, or None"""
+    parts = path.split("|")[0].replace("\\", "/").split("/")
+    for index in range(2, len(parts) - 1):
+        if parts[index] == "clusters" and parts[index - 2].endswith("cells"):
+            return parts[index + 1]
+    return None
+
+def getPoolSize(configs, key, default):
+    """Return the integer pool size for key from the first configuration that defines it, or default"""
+    for config in configs:
+        if config is not None and config.has(key):
+            return config.getInt(key)
+    return default
+
+def getSetting(configs, key):
+    """Return the value of key from the first configuration that defines it"""
+    for config in configs:
+        if config is not None and config.has(key):
+            return config.get(key)
+    return configs[-1].get(key)
+
+def resolveSize(env, size):
+    """Return a threadPoolSizes entry as a number, looking up property names"""
+    if size.isdigit():
+        return int(size)
+    return env.getInt(size)
+
+def getJvmTargets(env, recommendations=None):
+    """Return the JavaVirtualMachine attributes"""
+    configs = [recommendations, env]
+    return [
+        ["initialHeapSize", int(getSetting(configs, "tuning.jvm.initial.heap"))],
+        ["maximumHeapSize", int(getSetting(configs, "tuning.jvm.max.heap"))],
+        ["genericJvmArguments", genericJvmArguments % getSetting(configs, "tuning.jvm.nursery")]
+    ]
+
+def getMemberJvmTargets(env):
+    """Return the JavaVirtualMachine attributes websphere_cluster_management.py gives new cluster members"""
+    return [
+        ["initialHeapSize", env.getInt("jvm.initial.heap")],
+        ["maximumHeapSize", env.getInt("jvm.max.heap")],
+        ["genericJvmArguments", env.get("jvm.generic.args")]
+    ]
+
+def getThreadPoolTargets(env, node, server, recommendations=None):
+    """Return [pool name, attributes] for each tuned thread pool of a server"""
+    targets = []
+    for poolName, minSize, maxSize in threadPoolSizes:
+        poolKey = "tuning.threadpool.%s.%s.%s" % (node, server, poolName)
+        minimum = getPoolSize([recommendations, env], poolKey + ".min", resolveSize(env, minSize))
+        maximum = getPoolSize([recommendations, env], poolKey + ".max", resolveSize(env, maxSize))
+        checkPoolSizes("Thread pool %s of %s/%s" % (poolName, node, server), minimum, maximum)
+        targets.append([poolName, [
+            ["minimumSize", minimum],
+            ["maximumSize", maximum],
+            ["inactivityTimeout", env.get("thread.pool.inactivity.timeout")],
+            ["isGrowable", "true"]
+        ]])
+    return targets
+
+def getConnectionPoolTargets(env, jndiName, recommendations=None):
+    """Return the ConnectionPool attributes of the datasource with a JNDI name"""
+    poolKey = "tuning.datasource.%s" % jndiName
+    minimum = getPoolSize([recommendations, env], poolKey + ".min", env.getInt("tuning.connection.pool.min"))
+    maximum = getPoolSize([recommendations, env], poolKey + ".max", env.getInt("tuning.connection.pool.max"))
+    checkPoolSizes("Connection pool of %s" % jndiName, minimum, maximum)
+    return [
+        ["minConnections", minimum],
+        ["maxConnections", maximum],
+        ["connectionTimeout", env.getInt("tuning.connection.pool.timeout")],
+        ["agedTimeout", env.get("connection.pool.aged.timeout")],
+        ["purgePolicy", env.get("connection.pool.purge.policy")],
+        ["reapTime", env.get("connection.pool.reap.time")],
+        ["unusedTimeout", env.getInt("tuning.connection.pool.unused.timeout")],
+        ["stuckTime", "0"],
+        ["stuckThreshold", "0"]
+    ]
+
+def getWebContainerTargets(env):
+    """Return the WebContainer attributes"""
+    return [
+        ["enableServletCaching", "true"],
+        ["disablePooling", "false"]
+    ]
+
+def getSessionManagerTargets(env):
+    """Return the SessionManager attributes, including its nested tuningParams"""
+    return [
+        ["enableUrlRewriting", "false"],
+        ["enableCookies", "true"],
+        ["enableSSLTracking", "false"],
+        ["enableProtocolSwitchRewriting", "false"],
+        ["sessionPersistenceMode", "NONE"],
+        ["tuningParams", [["allowOverflow", "false"], ["invalidationTimeout", str(env.getInt("tuning.http.session.timeout") * 60)], ["maxInMemorySessionCount", env.getInt("tuning.session.max.in.memory")]]]
+    ]
+
+def getHttpChannelTargets(env):
+    """Return the HTTPInboundChannel attributes"""
+    return [
+        ["keepAlive", env.get("tuning.http.keepalive")],
+        ["maximumPersistentRequests", env.getInt("tuning.http.max.keepalive.connections")],
+        ["readTimeout", env.getInt("tuning.http.read.timeout")],
+        ["writeTimeout", env.getInt("tuning.http.write.timeout")],
+        ["persistentTimeout", env.getInt("tuning.http.persistent.timeout")]
+    ]
+
+def getDynamicCacheTargets(env, recommendations=None):
+    """Return the DynamicCache attributes, with the recommended entry count"""
+    cacheSize = env.getInt("tuning.dynamic.cache.size")
+    return [
+        ["enableCacheReplication", "false"],
+        ["enableDiskOffload", env.get("tuning.cache.disk.offload")],
+        ["flushToDisk", "false"],
+        ["memoryCacheSizeInMB", cacheSize],
+        ["diskCacheSizeInMB", str(cacheSize * 2)],
+        ["diskCacheSizeInEntries", env.getInt("tuning.cache.disk.entries")],
+        ["memoryCacheSizeInEntries", int(getSetting([recommendations, env], "tuning.cache.memory.entries"))],
+        ["cacheSize", cacheSize]
+    ]
+
+def getAsyncWorkManagerTargets(env):
+    """Return the AsyncWorkManager attributes"""
+    return [
+        ["minThreads", env.getInt("tuning.async.work.manager.min.threads")],
+        ["maxThreads", env.getInt("tuning.async.work.manager.threads")],
+        ["threadPriority", "5"],
+        ["isGrowable", "true"]
+    ]
+
+def getPmiTargets(env):
+    """Return the PMIService attributes"""
+    return [
+        ["enable", env.get("tuning.pmi.enable")],
+        ["statisticSet", env.get("tuning.pmi.statistic.level")]
+    ]
+
+def getOrbTargets(env):
+    """Return the ObjectRequestBroker attributes"""
+    return [
+        ["requestTimeout", env.getInt("tuning.orb.request.timeout")],
+        ["connectionCacheMinimum", env.getInt("tuning.orb.connection.cache.min")],
+        ["connectionCacheMaximum", env.getInt("tuning.orb.connection.cache.max")],
+        ["noLocalCopies", "false"],
+        ["cacheTimeout", "180"]
+    ]
+
+def getTransactionServiceTargets(env):
+    """Return the TransactionService attributes"""
+    return [
+        ["totalTranLifetimeTimeout", env.getInt("tuning.transaction.lifetime.timeout")],
+        ["clientInactivityTimeout", env.getInt("tuning.transaction.client.inactivity.timeout")],
+        ["transactionLogDirectory", "${USER_INSTALL_ROOT}/tranlog"],
+        ["heuristicRetryLimit", "0"],
+        ["heuristicRetryWait", "0"]
+    ]
+
+# Server-scoped object types with one attribute set each
+serverTargets = {
+    "JavaVirtualMachine": getJvmTargets,
+    "WebContainer": getWebContainerTargets,
+    "SessionManager": getSessionManagerTargets,
+    "HTTPInboundChannel": getHttpChannelTargets,
+    "DynamicCache": getDynamicCacheTargets,
+    "AsyncWorkManager": getAsyncWorkManagerTargets,
+    "PMIService": getPmiTargets,
+    "ObjectRequestBroker": getOrbTargets,
+    "TransactionService": getTransactionServiceTargets
+}
+
+def getServerTypeTargets(env, configType, recommendations=None):
+    """Return the attributes of a server-scoped type, with the recommended JVM heap and cache sizes"""
+    if configType == "JavaVirtualMachine":
+        return getJvmTargets(env, recommendations)
+    if configType == "DynamicCache":
+        return getDynamicCacheTargets(env, recommendations)
+    return serverTargets[configType](env)
+
+# Main execution
+if __name__ == "__main__":
+    # Make the shared helper modules next to this script importable
+    try:
+        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    except NameError:
+        sys.path.append(os.getcwd())
+    import websphere_env_config as envConfig
+    
+    def getOption(options, name, default=None):
+        if name in options:
+            index = options.index(name)
+            if index + 1 < len(options):
+                return options[index + 1]
+        return default
+    
+    options = sys.argv[1:]
+    if "-help" in options or "-h" in options:
+        print("Usage: %s [-env name] [-cluster name] [-server node/server]" % sys.argv[0])
+        print("  Prints the tuning.* values, and the profile they come from, for the cell, a cluster or a server")
+        sys.exit(2)
+    
+    node = None
+    server = None
+    if getOption(options, "-server"):
+        node, server = getOption(options, "-server").split("/", 1)
+    cluster = getOption(options, "-cluster")
+    try:
+        env = envConfig.loadConfig()
+        config = getTargetConfig(env, cluster, node, server)
+    except Exception:
+        print("ERROR: %s" % sys.exc_info()[1])
+        sys.exit(1)
+    print("# Profile: %s" % (getProfileName(env, cluster, node, server) or "(none)"))
+    for key in config.keys():
+        if key.startswith("tuning.") and not key.split(".")[1] in ["profile", "cluster", "server"]:
+            print("%s=%s" % (key, config.get(key)))
@@ -0,0 +1,401 @@
+"""
+WebSphere wsadmin Call Benchmark (Jython/Python 2)
+Runs every action of websphere_performance_tuning.py,
+websphere_cluster_management.py, websphere_security_config.py and
+websphere_deploy_app.py against the wsadmin stand-ins of
+websphere_wsadmin_mock.py, and reports the AdminConfig, AdminControl,
+AdminTask and AdminApp calls each one makes and the time it would take
+against a deployment manager that answers with the latency set in
+benchmark.latency.
+
+Admin round trips set the run time of the scripts, so the call counts are
+the measure to guard: every scenario's calls per scripting object and its
+simulated time are compared with the approved baseline
+(fixtures/wsadmin_benchmark.json), and the benchmark exits with status 1
+when any of them grew by more than benchmark.tolerance percent or a
+scenario that passed before now fails. After an intended change, store the
+new counts with -approve.
+
+Each scenario starts from a fresh copy of the repository (fixtures/config
+unless -repository names another); some first run other actions, uncounted,
+to reach the state they measure, such as an already tuned cell, a stopped
+cluster or an installed application. The simulated time is the injected
+latency plus the waits the scripts poll with, as if every call ran after the
+one before; the worker threads of the sync step and the AdminControl calls
+of the tuning workers overlap against a real deployment manager and finish
+sooner. With -sleep the latency
+is slept instead of simulated, so the wall time shows that overlap.
+Under Python the stand-ins supply the Java classes the scripts import
+(wsadminMock.javaClasses); a scenario whose script imports any other Java
+class is reported as skipped, and a skipped scenario the baseline has is
+listed as not checked and fails the run unless -allowskip is given.
+
+Usage:
+    jython websphere_wsadmin_benchmark.py [-scenario pattern,...] [-repository dir] [-latency spec] [-sleep] [-baseline file] [-approve] [-tolerance percent] [-allowskip] [-detail] [-verbose]
+"""
+
+# Import required modules
+import sys
+import os
+import time
+import shutil
+import fnmatch
+import zipfile
+import tempfile
+import StringIO
+
+# Imported before any script runs, so they keep the real time module
+import threading
+import Queue
+
+
+# Make the shared helper modules next to this script importable
+try:
+    scriptDir = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    scriptDir = os.getcwd()
+sys.path.append(scriptDir)
+
+import websphere_env_config as envConfig
+import websphere_config_cache as configCache
+import websphere_desired_state as desiredState
+import websphere_wsadmin_mock as wsadminMock
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+tolerance = env.getInt("benchmark.tolerance")  # Percent growth allowed over the baseline
+defaultRepository = os.path.join(scriptDir, "fixtures", "config")
+defaultBaseline = os.path.join(scriptDir, "fixtures", "wsadmin_benchmark.json")
+
+tuningScript = "websphere_performance_tuning.py"
+clusterScript = "websphere_cluster_management.py"
+securityScript = "websphere_security_config.py"
+deployScript = "websphere_deploy_app.py"
+
+# Scenarios: [name, script, arguments, set-up runs of [script, arguments]];
+# %(work)s, %(ear)s and %(changedEar)s name files in the scenario's work directory
+scenarios = [
+    ["tuning.jvm", tuningScript, ["jvm"], []],
+    ["tuning.threads", tuningScript, ["threads"], []],
+    ["tuning.connections", tuningScript, ["connections"], []],
+    ["tuning.web", tuningScript, ["web"], []],
+    ["tuning.cache", tuningScript, ["cache"], []],
+    ["tuning.async", tuningScript, ["async"], []],
+    ["tuning.pmi", tuningScript, ["pmi"], []],
+    ["tuning.orb", tuningScript, ["orb"], []],
+    ["tuning.transactions", tuningScript, ["transactions"], []],
+    ["tuning.all", tuningScript, ["all"], []],
+    ["tuning.all.unchanged", tuningScript, ["all"], [[tuningScript, ["all"]]]],
+    ["tuning.all.transaction", tuningScript, ["all", "-transaction"], []],
+    ["tuning.cluster", tuningScript, ["all", "-cluster", "WebCluster01", "-sync"], []],
+    ["tuning.cell", tuningScript, ["all", "-cell"], []],
+    ["tuning.report", tuningScript, ["report", "-cell", "-output", "%(work)s/report.txt", "-baseline", "%(work)s/baseline.json"], []],
+    ["cluster.create", clusterScript, ["create"], []],
+    ["cluster.create.new", clusterScript, ["create", "-members", "4"], []],
+    ["cluster.scale", clusterScript, ["scale", "-members", "4"], []],
+    ["cluster.start", clusterScript, ["start", "-sync"], [[clusterScript, ["stop"]]]],
+    ["cluster.stop", clusterScript, ["stop"], []],
+    ["cluster.status", clusterScript, ["status"], []],
+    ["security.ldap", securityScript, ["ldap"], []],
+    ["security.ssl", securityScript, ["ssl"], []],
+    ["security.global", securityScript, ["global"], []],
+    ["security.jaas", securityScript, ["jaas"], []],
+    ["security.app", securityScript, ["app"], [[deployScript, ["deploy", "-ear", "%(ear)s"]]]],
+    ["security.csrf", securityScript, ["csrf"], []],
+    ["security.realms", securityScript, ["realms"], []],
+    ["security.audit", securityScript, ["audit"], []],
+    ["security.all", securityScript, ["all"], []],
+    ["deploy.server", deployScript, ["deploy", "-ear", "%(ear)s"], []],
+    ["deploy.cluster", deployScript, ["deploy", "-cluster", "-ear", "%(ear)s"], []],
+    ["deploy.incremental", deployScript, ["incremental", "-ear", "%(changedEar)s"], [[deployScript, ["deploy", "-ear", "%(ear)s"]]]],
+    ["deploy.rolling", deployScript, ["rolling", "-ear", "%(changedEar)s"], [[deployScript, ["deploy", "-cluster", "-ear", "%(ear)s"]]]]
+]
+
+# Properties a scenario runs with in place of those in websphere_environment.properties;
+# cluster.create finds WebCluster01 in the repository, cluster.create.new creates its members
+scenarioProperties = {
+    "cluster.create.new": {"cluster.name": "BenchCluster", "cluster.members": "", "cluster.member.prefix": "BenchMember"}
+}
+
+class ScenarioResult:
+    """The outcome of one scenario: its status, calls per method and times in seconds"""
+    def __init__(self, name, status, calls, latency, waits, simulated, output):
+        self.name = name
+        self.status = status
+        self.calls = calls
+        self.latency = latency      # Injected latency of the counted calls
+        self.waits = waits          # Time the script spent polling
+        self.simulated = simulated  # Run time against the simulated deployment manager
+        self.output = output
+
+    def getCalls(self, objectName=None):
+        """Return the calls to one scripting object, or to all of them"""
+        return sum([count for name, count in self.calls.items() if objectName is None or name.split(".")[0] == objectName])
+
+def writeEar(path, version):
+    """Write a small EAR with a web module, an EJB module and a shared library; version changes the web module"""
+    ear = zipfile.ZipFile(path, "w")
+    try:
+        ear.writestr("META-INF/application.xml", "<application><module><web><web-uri>web.war</web-uri></web></module>"
+                     "<module><ejb>ejb.jar</ejb></module></application>")
+        ear.writestr("web.war", "web module, version %d" % version)
+        ear.writestr("ejb.jar", "EJB module")
+        ear.writestr("lib/common.jar", "shared library")
+    finally:
+        ear.close()
+
+def useClock(clock):
+    """Make the simulated clock the time module of the scripts and of the helper modules already imported"""
+    for name, module in list(sys.modules.items()):
+        if name.startswith("websphere_") and module is not wsadminMock and getattr(module, "time", None) is time:
+            module.time = clock
+    sys.modules["time"] = clock
+
+def restoreClock():
+    """Give every helper module the real time module back, including those a script imported"""
+    for name, module in list(sys.modules.items()):
+        if name.startswith("websphere_") and isinstance(getattr(module, "time", None), wsadminMock.SimulatedClock):
+            module.time = time
+    sys.modules["time"] = time
+
+def runScript(admin, script, arguments, verbose=False):
+    """Run a script as wsadmin would, with the stand-ins bound, and return [status, printed output]"""
+    path = os.path.join(scriptDir, script)
+    namespace = {"__name__": "__main__", "__file__": path}
+    admin.bind(namespace)
+    
+    # The helper modules keep state between scripts that wsadmin would start afresh
+    configCache.clear()
+    desiredState.clearResults()
+    
+    savedArguments = sys.argv
+    savedOutput = sys.stdout
+    output = StringIO.StringIO()
+    sys.argv = arguments
+    if not verbose:
+        sys.stdout = output
+    status = "OK"
+    try:
+        try:
+            execfile(path, namespace)
+        except SystemExit:
+            if sys.exc_info()[1].code:
+                status = "EXIT %s" % sys.exc_info()[1].code
+        except ImportError:
+            if str(sys.exc_info()[1]).find("java") >= 0 and not sys.platform.startswith("java"):
+                status = "SKIPPED"
+            else:
+                status = "ERROR: %s" % sys.exc_info()[1]
+        except:
+            status = "ERROR: %s %s" % (sys.exc_info()[0], sys.exc_info()[1])
+    finally:
+        sys.argv = savedArguments
+        sys.stdout = savedOutput
+    return [status, output.getvalue()]
+
+def writeProperties(path, overrides):
+    """Write a copy of the properties file the scripts read, with some keys replaced, and return its path"""
+    propertiesIn = open(env.path)
+    try:
+        text = propertiesIn.read()
+    finally:
+        propertiesIn.close()
+    keys = list(overrides.keys())
+    keys.sort()
+    propertiesOut = open(path, "w")
+    try:
+        # Later definitions of a key win
+        propertiesOut.write(text.rstrip("\n") + "\n\n# Benchmark scenario overrides\n")
+        for key in keys:
+            propertiesOut.write("%s=%s\n" % (key, overrides[key]))
+    finally:
+        propertiesOut.close()
+    return path
+
+def runScenario(scenario, repository, latency, sleep, verbose=False):
+    """Run a scenario's set-up, then its measured run, against a fresh stand-in environment"""
+    name, script, arguments, setupRuns = scenario
+    workDir = tempfile.mkdtemp(prefix="wsadmin_benchmark_")
+    paths = {"work": workDir, "ear": os.path.join(workDir, "application.ear"), "changedEar": os.path.join(workDir, "changed.ear")}
+    writeEar(paths["ear"], 1)
+    writeEar(paths["changedEar"], 2)
+    
+    # websphere_deploy_app.py records module hashes under the home directory
+    savedEnvironment = {"HOME": os.environ.get("HOME"), "WAS_ENV_PROPERTIES": os.environ.get("WAS_ENV_PROPERTIES")}
+    os.environ["HOME"] = workDir
+    if name in scenarioProperties:
+        os.environ["WAS_ENV_PROPERTIES"] = writeProperties(os.path.join(workDir, "environment.properties"), scenarioProperties[name])
+    admin = wsadminMock.WsadminEnvironment(repository, None, latency, sleep)
+    useClock(admin.clock)
+    try:
+        status = "OK"
+        for setupScript, setupArguments in setupRuns:
+            status, output = runScript(admin, setupScript, [argument % paths for argument in setupArguments], verbose)
+            if status != "OK":
+                if status != "SKIPPED":
+                    status = "SET-UP %s" % status
+                break
+        if status == "OK":
+            admin.resetCounts()
+            status, output = runScript(admin, script, [argument % paths for argument in arguments], verbose)
+    finally:
+        restoreClock()
+        for variable, value in savedEnvironment.items():
+            if value is None:
+                if variable in os.environ:
+                    del os.environ[variable]
+            else:
+                os.environ[variable] = value
+        shutil.rmtree(workDir, True)
+    # Without -sleep the run itself takes next to no time, so the simulated
+    # time is the latency and waits alone, and repeats exactly
+    simulated = admin.adminTime + admin.clock.waited
+    if sleep:
+        simulated = admin.clock.elapsed()
+    return ScenarioResult(name, status, admin.getCallCounts(), admin.adminTime, admin.clock.waited, simulated, output)
+
+def printResults(results, detail=False):
+    """Print the calls and times of every scenario"""
+    print("%-24s %-8s %7s %7s %6s %6s %7s %6s %9s %8s %10s" % ("Scenario", "Status", "Config", "Control", "Task", "App",
+                                                             "Total", "Saves", "Latency s", "Waits s", "Simulated s"))
+    for result in results:
+        if result.status in ["OK", "SKIPPED"] or result.calls:
+            print("%-24s %-8s %7d %7d %6d %6d %7d %6d %9.1f %8.1f %10.1f" % (result.name, result.status[:8],
+                  result.getCalls("AdminConfig"), result.getCalls("AdminControl"), result.getCalls("AdminTask"),
+                  result.getCalls("AdminApp"), result.getCalls(), result.calls.get("AdminConfig.save", 0),
+                  result.latency, result.waits, result.simulated))
+        if result.status not in ["OK", "SKIPPED"]:
+            print("  %s" % result.status)
+            for line in result.output.splitlines()[-5:]:
+                print("  | %s" % line)
+        if detail and result.calls:
+            names = list(result.calls.keys())
+            names.sort()
+            for name in names:
+                print("    %-40s %6d" % (name, result.calls[name]))
+
+def loadBaseline(path):
+    """Return the approved baseline, or None if there is none"""
+    if not os.path.exists(path):
+        return None
+    baselineIn = open(path)
+    try:
+        return envConfig.json.load(baselineIn)
+    finally:
+        baselineIn.close()
+
+def writeBaseline(results, path, latency, baseline=None):
+    """Store the counts and times of the scenarios that ran, keeping the baseline of the others"""
+    if baseline is None or baseline.get("latency") != latency:
+        baseline = {"scenarios": {}}
+    baseline["generated"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    baseline["latency"] = latency
+    for result in results:
+        if result.status == "OK":
+            baseline["scenarios"][result.name] = {"calls": result.calls, "simulated": round(result.simulated, 1)}
+    baselineOut = open(path, "w")
+    try:
+        envConfig.json.dump(baseline, baselineOut, indent=2, sort_keys=True, separators=(",", ": "))
+        baselineOut.write("\n")
+    finally:
+        baselineOut.close()
+
+def isWorse(before, after, allowed):
+    """Return true if after exceeds before by more than allowed percent"""
+    return after > before and after > before * (1 + allowed / 100.0)
+
+def compareResults(results, baseline, latency, allowed):
+    """Return [lines describing each change against the baseline, number of regressions, scenarios not checked]"""
+    lines = ["Compared with the baseline generated %s (tolerance %d%%):" % (baseline["generated"], allowed)]
+    compareTimes = baseline.get("latency") == latency
+    if not compareTimes:
+        lines.append("  Latency differs from the baseline's (%s); comparing call counts only" % baseline.get("latency"))
+    regressions = 0
+    unchecked = 0
+    for result in results:
+        approved = baseline["scenarios"].get(result.name)
+        if result.status == "SKIPPED":
+            if approved is not None:
+                lines.append("  %-10s %s: skipped, so its baseline was not checked (imports a Java class; needs Jython)" % ("unchecked", result.name))
+                unchecked = unchecked + 1
+            continue
+        if approved is None:
+            lines.append("  %-10s %s: not in the baseline" % ("new", result.name))
+            continue
+        if result.status != "OK":
+            lines.append("  %-10s %s: %s" % ("REGRESSION", result.name, result.status))
+            regressions = regressions + 1
+            continue
+        before = ScenarioResult(result.name, "OK", approved["calls"], 0, 0, approved["simulated"], "")
+        measures = [[objectName, before.getCalls(objectName), result.getCalls(objectName)] for objectName in wsadminMock.adminObjects]
+        measures.append(["calls", before.getCalls(), result.getCalls()])
+        if compareTimes:
+            measures.append(["simulated s", before.simulated, round(result.simulated, 1)])
+        for measure, old, new in measures:
+            if isWorse(old, new, allowed):
+                lines.append("  %-10s %s %s: %s -> %s" % ("REGRESSION", result.name, measure, old, new))
+                regressions = regressions + 1
+            elif new < old:
+                lines.append("  %-10s %s %s: %s -> %s" % ("improved", result.name, measure, old, new))
+    if regressions:
+        lines.append("%d measure(s) grew by more than %d%% over the approved baseline" % (regressions, allowed))
+    if unchecked:
+        lines.append("%d scenario(s) in the baseline were not checked; run under Jython, or pass -allowskip" % unchecked)
+    return [lines, regressions, unchecked]
+
+# Main execution
+if __name__ == "__main__":
+    options = sys.argv[1:]
+    
+    if "-help" in options or "-h" in options:
+        print("Usage: %s [-scenario pattern,...] [-repository dir] [-latency spec] [-sleep] [-baseline file] [-approve] [-tolerance percent] [-allowskip] [-detail] [-verbose]" % sys.argv[0])
+        print("  -scenario   - Scenarios to run, e.g. tuning.*,cluster.start (default all)")
+        print("  -repository - Config directory the stand-ins serve (default %s)" % defaultRepository)
+        print("  -latency    - Milliseconds per call, e.g. *=20,AdminConfig.save=2000 (default benchmark.latency)")
+        print("  -sleep      - Sleep the latency instead of adding it to the simulated clock")
+        print("  -baseline   - Approved counts to compare with (default %s)" % defaultBaseline)
+        print("  -approve    - Store the counts of this run as the new baseline")
+        print("  -tolerance  - Percent growth allowed over the baseline (default %d)" % tolerance)
+        print("  -allowskip  - Exit with status 0 even if scenarios in the baseline were skipped")
+        print("                (scripts importing Java classes the stand-ins lack, under Python)")
+        print("  -detail     - Print the calls per method of every scenario")
+        print("  -verbose    - Show the output of the scripts")
+        sys.exit(2)
+    
+    if envConfig.json is None:
+        print("ERROR: No json module in this interpreter; the baseline cannot be read or written")
+        sys.exit(1)
+    
+    patterns = envConfig.getOption(options, "-scenario", "*").split(",")
+    selected = [scenario for scenario in scenarios if [pattern for pattern in patterns if fnmatch.fnmatchcase(scenario[0], pattern)]]
+    if not selected:
+        print("ERROR: No scenario matches %s" % ",".join(patterns))
+        sys.exit(1)
+    repository = envConfig.getOption(options, "-repository", defaultRepository)
+    latency = envConfig.getOption(options, "-latency", wsadminMock.defaultLatency)
+    baselineFile = envConfig.getOption(options, "-baseline", defaultBaseline)
+    allowed = int(envConfig.getOption(options, "-tolerance", tolerance))
+    
+    results = []
+    for scenario in selected:
+        results.append(runScenario(scenario, repository, latency, "-sleep" in options, "-verbose" in options))
+    printResults(results, "-detail" in options)
+    
+    failures = [result for result in results if result.status not in ["OK", "SKIPPED"]]
+    baseline = loadBaseline(baselineFile)
+    if "-approve" in options:
+        if failures:
+            print("ERROR: %d scenario(s) failed; the baseline is left unchanged" % len(failures))
+            sys.exit(1)
+        writeBaseline(results, baselineFile, latency, baseline)
+        print("Baseline written to %s" % baselineFile)
+        sys.exit(0)
+    
+    if baseline is None:
+        print("No baseline at %s; approve these counts with -approve" % baselineFile)
+        sys.exit(len(failures) and 1 or 0)
+    lines, regressions, unchecked = compareResults(results, baseline, latency, allowed)
+    for line in lines:
+        print(line)
+    if regressions or failures or (unchecked and "-allowskip" not in options):
+        sys.exit(1)
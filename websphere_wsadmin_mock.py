@@ -0,0 +1,904 @@
+"""
+WebSphere wsadmin Stand-In (Jython/Python)
+In-process stand-ins for the AdminConfig, AdminControl, AdminTask and
+AdminApp scripting objects, backed by a configuration repository on disk
+(fixtures/config, or a copy of a profile's config directory), so the wsadmin
+scripts run without a deployment manager.
+
+AdminConfig serves config IDs, containment paths, list, show, showall and
+showAttribute from the elements of the cell's cell.xml, serverindex.xml,
+server.xml, cluster.xml and resources.xml files, and modify, create and
+remove change them in a workspace that save commits and reset discards.
+Nothing is written back to the repository.
+
+AdminControl models the running cell: every server in the repository starts
+out running, with the MBeans the scripts query (Server, ClusterMgr, Cluster,
+ClusterMember, NodeSync, ApplicationManager, Application, PMIService and the
+WebContainer ThreadPool). startServer and stopServer return once the server
+has changed state; members of a cluster started or stopped through the
+ClusterMgr MBean get there benchmark.member.start.time or
+benchmark.member.stop.time simulated seconds later. AdminTask and AdminApp
+accept every command; the ones that change what the scripts read back
+(createClusterMember, AdminApp install and uninstall) are modelled and the
+rest return "". Under Python, bind also makes the Java classes the scripts
+import without calling (javaClasses) importable as empty modules.
+
+Every call is counted per method ("AdminConfig.show") and charged the
+latency benchmark.latency sets for it, added to a simulated clock or, with
+sleep=True, slept. The clock can stand in for the time module while a script
+runs, so the script's polling waits are skipped rather than slept
+(websphere_wsadmin_benchmark.py does this).
+
+Usage from Jython or Python:
+    import websphere_wsadmin_mock as wsadminMock
+    admin = wsadminMock.WsadminEnvironment("fixtures/config")
+    admin.bind(globals())
+    AdminConfig.list("Server")
+    admin.getCallCounts()
+"""
+
+# Import required modules
+import sys
+import os
+import imp
+import time
+import copy
+import threading
+
+# Make the shared helper modules next to this script importable
+try:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    sys.path.append(os.getcwd())
+
+import websphere_env_config as envConfig
+import websphere_config_cache as configCache
+import websphere_config_analyzer as configAnalyzer
+
+# Configuration parameters (websphere_environment.properties)
+env = envConfig.loadConfig()
+defaultLatency = env.get("benchmark.latency")              # <object>[.<method>]=ms,...
+memberStartTime = env.getInt("benchmark.member.start.time")  # Seconds for a cluster member to start
+memberStopTime = env.getInt("benchmark.member.stop.time")    # Seconds for a cluster member to stop
+
+# The scripting objects, in the order they are reported
+adminObjects = ["AdminConfig", "AdminControl", "AdminTask", "AdminApp"]
+
+# Nested attributes that hold one object; the others (threadPools, jvmEntries,
+# services) are shown as a list of config IDs
+singleReferences = ["tuningParams", "cacheSettings", "defaultCookieSettings", "threadPool", "connectionPool",
+                    "propertySet", "stateManagement", "mapping", "sessionDatabasePersistence", "invalidationSchedule"]
+
+# Config types WebSphere keeps in a document of their own: [directory, file]
+documentTypes = {
+    "ServerCluster": ["clusters", "cluster.xml"],
+    "Server": ["servers", "server.xml"]
+}
+
+# Commands whose names start with these only read the configuration
+readOnlyPrefixes = ["list", "get", "show", "help", "is", "query", "check"]
+
+# Java classes the scripts import without calling (websphere_deploy_app.py)
+javaClasses = ["java.lang.System"]
+
+def parseLatency(spec):
+    """Return {call: milliseconds} for a spec such as *=20,AdminConfig.save=1500,AdminTask=250"""
+    latency = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            latency[name.strip()] = float(value)
+    return latency
+
+def isNestedObject(value):
+    """Return true for a [[name value] ...] list: the attributes of a nested object"""
+    if type(value) != type([]) or not value:
+        return False
+    for item in value:
+        if type(item) != type([]) or len(item) != 2 or not envConfig.isString(item[0]):
+            return False
+    return True
+
+def getArgument(arguments, name, default=None):
+    """Return the value following name in AdminTask or AdminApp arguments, given as a list or a string"""
+    if envConfig.isString(arguments):
+        arguments = configCache.parseGroups(configCache.tokenize(arguments))
+        if len(arguments) == 1 and type(arguments[0]) == type([]):
+            arguments = arguments[0]
+    if name in arguments:
+        index = list(arguments).index(name)
+        if index + 1 < len(arguments):
+            return arguments[index + 1]
+    return default
+
+def stubJavaClasses():
+    """Make the Java classes the scripts only import importable under Python, as empty modules"""
+    if sys.platform.startswith("java"):
+        return
+    for className in javaClasses:
+        parent = None
+        parts = className.split(".")
+        for index in range(len(parts)):
+            name = ".".join(parts[:index + 1])
+            if name not in sys.modules:
+                sys.modules[name] = imp.new_module(name)
+            if parent is not None:
+                setattr(parent, parts[index], sys.modules[name])
+            parent = sys.modules[name]
+
+def quoteID(configID):
+    """Return a config ID the way wsadmin lists it: quoted when the name contains spaces"""
+    if configID.find(" ") >= 0:
+        return '"%s"' % configID
+    return configID
+
+class SimulatedClock:
+    """Stands in for the time module: sleep and injected latency advance the clock instead of waiting"""
+    def __init__(self):
+        self.started = time.time()
+        self.offset = 0.0   # Simulated seconds added to the real time
+        self.waited = 0.0   # Seconds the scripts asked to sleep
+        self.lock = threading.Lock()
+
+    def time(self):
+        return time.time() + self.offset
+
+    def sleep(self, seconds):
+        self.lock.acquire()
+        try:
+            self.offset = self.offset + seconds
+            self.waited = self.waited + seconds
+        finally:
+            self.lock.release()
+
+    def advance(self, seconds):
+        self.lock.acquire()
+        try:
+            self.offset = self.offset + seconds
+        finally:
+            self.lock.release()
+
+    def elapsed(self):
+        return self.time() - self.started
+
+    def restart(self):
+        self.lock.acquire()
+        try:
+            self.started = self.time()
+            self.waited = 0.0
+        finally:
+            self.lock.release()
+
+    def __getattr__(self, name):
+        # strftime, localtime and the rest come from the real module
+        return getattr(time, name)
+
+class RepositoryObject:
+    """One config object: its type, attributes, containing object and the document it is stored in"""
+    def __init__(self, configType, attributes, parent, parentAttribute, document, xmiId):
+        self.type = configType
+        self.attributes = attributes
+        self.parent = parent
+        self.parentAttribute = parentAttribute  # Attribute of the parent that holds it; None for a document root
+        self.document = document                # e.g. cells/Cell01/nodes/Node01/servers/server1|server.xml
+        self.xmiId = xmiId
+        self.children = []
+
+    def getKey(self):
+        return "%s#%s" % (self.document, self.xmiId)
+
+    def getID(self):
+        return "%s(%s)" % (self.attributes.get("name", ""), self.getKey())
+
+    def isWithin(self, scope):
+        """Return true if the object is scope or contained in it"""
+        configObject = self
+        while configObject is not None:
+            if configObject is scope:
+                return True
+            configObject = configObject.parent
+        return False
+
+    def getChildren(self, attribute):
+        return [child for child in self.children if child.parentAttribute == attribute]
+
+    def getNodeName(self):
+        configObject = self
+        while configObject is not None:
+            if configObject.type == "Node":
+                return configObject.attributes.get("name", "")
+            configObject = configObject.parent
+        return ""
+
+class ConfigRepository:
+    """The config objects of one cell, with a workspace that save commits and reset discards"""
+    def __init__(self, cellDir):
+        self.cellDir = os.path.abspath(cellDir)
+        self.configDir = os.path.dirname(os.path.dirname(self.cellDir))
+        self.objects = []  # In document order
+        self.index = {}    # "document#xmi id" -> object
+        self.nextId = 1
+        self.saved = None  # [objects, index] at the last save, once the workspace changes
+        self.load()
+
+    def getDocument(self, path):
+        """Return the document reference of a file, e.g. cells/Cell01/nodes/Node01|serverindex.xml"""
+        directory = os.path.relpath(os.path.dirname(path), self.configDir).replace(os.sep, "/")
+        return "%s|%s" % (directory, os.path.basename(path))
+
+    def newXmiId(self, configType):
+        self.nextId = self.nextId + 1
+        return "%s_%d" % (configType, 1700000000000 + self.nextId)
+
+    def add(self, configObject):
+        self.objects.append(configObject)
+        self.index[configObject.getKey()] = configObject
+        if configObject.parent is not None:
+            configObject.parent.children.append(configObject)
+        return configObject
+
+    def loadDocument(self, path, scope):
+        """Add the elements of a document under scope and return its root objects"""
+        document = self.getDocument(path)
+        loaded = {}
+        roots = []
+        for element in configAnalyzer.readConfigFile(path):
+            # Text elements (classpath) and the xmi:XMI wrapper are not config objects
+            if "xmi:id" not in element.attributes:
+                continue
+            parent = element.parent
+            while parent is not None and id(parent) not in loaded:
+                parent = parent.parent
+            attributes = {}
+            for name, value in element.attributes.items():
+                if name.find(":") < 0:
+                    attributes[name] = value
+            if parent is None:
+                configObject = RepositoryObject(element.type, attributes, scope, None, document, element.get("xmi:id"))
+                roots.append(configObject)
+            else:
+                configObject = RepositoryObject(element.type, attributes, loaded[id(parent)], element.tag.split(":")[-1],
+                                                document, element.get("xmi:id"))
+            loaded[id(element)] = self.add(configObject)
+        return roots
+
+    def load(self):
+        """Read every document of the cell that the scripts look at"""
+        cellFile = os.path.join(self.cellDir, "cell.xml")
+        if os.path.exists(cellFile):
+            cell = self.loadDocument(cellFile, None)[0]
+        else:
+            cell = self.add(RepositoryObject("Cell", {"name": os.path.basename(self.cellDir)}, None, None,
+                                             self.getDocument(cellFile), "Cell_1"))
+        scopes = {self.cellDir: cell}
+        for name in ["security.xml", "virtualhosts.xml"]:
+            if os.path.exists(os.path.join(self.cellDir, name)):
+                self.loadDocument(os.path.join(self.cellDir, name), cell)
+        
+        nodesDir = os.path.join(self.cellDir, "nodes")
+        nodeNames = os.path.isdir(nodesDir) and os.listdir(nodesDir) or []
+        nodeNames.sort()
+        for nodeName in nodeNames:
+            nodeDir = os.path.join(nodesDir, nodeName)
+            nodeFile = os.path.join(nodeDir, "node.xml")
+            if os.path.exists(nodeFile):
+                node = self.loadDocument(nodeFile, cell)[0]
+            else:
+                node = self.add(RepositoryObject("Node", {"name": nodeName}, cell, None, self.getDocument(nodeFile), "Node_1"))
+            scopes[nodeDir] = node
+            if os.path.exists(os.path.join(nodeDir, "serverindex.xml")):
+                self.loadDocument(os.path.join(nodeDir, "serverindex.xml"), node)
+            serversDir = os.path.join(nodeDir, "servers")
+            serverNames = os.path.isdir(serversDir) and os.listdir(serversDir) or []
+            serverNames.sort()
+            for serverName in serverNames:
+                serverFile = os.path.join(serversDir, serverName, "server.xml")
+                if os.path.exists(serverFile):
+                    scopes[os.path.dirname(serverFile)] = self.loadDocument(serverFile, node)[0]
+        
+        clustersDir = os.path.join(self.cellDir, "clusters")
+        clusterNames = os.path.isdir(clustersDir) and os.listdir(clustersDir) or []
+        clusterNames.sort()
+        for clusterName in clusterNames:
+            clusterFile = os.path.join(clustersDir, clusterName, "cluster.xml")
+            if os.path.exists(clusterFile):
+                scopes[os.path.dirname(clusterFile)] = self.loadDocument(clusterFile, cell)[0]
+        
+        for resourceFile in configAnalyzer.findResourceFiles(self.cellDir):
+            scope = scopes.get(os.path.dirname(os.path.abspath(resourceFile)))
+            if scope is not None:
+                self.loadDocument(resourceFile, scope)
+        
+        applicationsDir = os.path.join(self.cellDir, "applications")
+        for directory, subdirectories, files in os.walk(applicationsDir):
+            if "deployment.xml" in files:
+                self.loadDocument(os.path.join(directory, "deployment.xml"), cell)
+        self.deriveServerAttributes()
+
+    def deriveServerAttributes(self):
+        """Set serverType and clusterName on servers whose server.xml leaves them to serverindex.xml and cluster.xml"""
+        serverTypes = {}
+        for entry in self.listObjects("ServerEntry"):
+            serverTypes[(entry.getNodeName(), entry.attributes.get("serverName"))] = entry.attributes.get("serverType", "")
+        clusters = {}
+        for member in self.listObjects("ClusterMember"):
+            clusters[(member.attributes.get("nodeName"), member.attributes.get("memberName"))] = member.parent.attributes.get("name", "")
+        for server in self.listObjects("Server"):
+            key = (server.getNodeName(), server.attributes.get("name"))
+            if "serverType" not in server.attributes:
+                server.attributes["serverType"] = serverTypes.get(key, "APPLICATION_SERVER")
+            if "clusterName" not in server.attributes and key in clusters:
+                server.attributes["clusterName"] = clusters[key]
+
+    def find(self, configID):
+        """Return the object of a config ID, raising an error like wsadmin's for an unknown one"""
+        configID = configID.strip().strip('"')
+        configObject = self.index.get(configID.split("(")[-1].rstrip(")"))
+        if configObject is None:
+            raise Exception("WASX7077E: Incomplete config id: %s" % configID)
+        return configObject
+
+    def listObjects(self, configType, scope=None):
+        return [configObject for configObject in self.objects
+                if configObject.type == configType and (scope is None or configObject.isWithin(scope))]
+
+    def resolvePath(self, containmentPath):
+        """Return the objects a containment path such as /Cell:c/Node:n/Server:s/ names"""
+        matches = None
+        for segment in [segment for segment in containmentPath.split("/") if segment]:
+            configType, name = (segment.split(":", 1) + [""])[:2]
+            candidates = []
+            for configObject in self.listObjects(configType):
+                if name and configObject.attributes.get("name") != name:
+                    continue
+                if matches is None or [scope for scope in matches if scope is not configObject and configObject.isWithin(scope)]:
+                    candidates.append(configObject)
+            matches = candidates
+        return matches or []
+
+    def touch(self):
+        """Keep the saved state before the first change to the workspace"""
+        if self.saved is None:
+            self.saved = copy.deepcopy([self.objects, self.index])
+
+    def hasChanges(self):
+        return self.saved is not None
+
+    def save(self):
+        self.saved = None
+
+    def reset(self):
+        if self.saved is not None:
+            self.objects, self.index = self.saved
+            self.saved = None
+
+    def setAttributes(self, configObject, attributes):
+        """Set [name, value] pairs on an object; a nested [[name value] ...] value sets a child object"""
+        for name, value in attributes:
+            if isNestedObject(value):
+                children = configObject.getChildren(name)
+                if children:
+                    child = children[0]
+                else:
+                    childType = configAnalyzer.elementTypes.get(name, name[:1].upper() + name[1:])
+                    child = self.add(RepositoryObject(childType, {}, configObject, name, configObject.document, self.newXmiId(childType)))
+                self.setAttributes(child, value)
+            elif type(value) == type([]):
+                configObject.attributes[name] = configCache.formatAttribute([str(item) for item in value])
+            elif value is None:
+                configObject.attributes[name] = ""
+            else:
+                configObject.attributes[name] = str(value)
+
+    def create(self, configType, parent, attributes, parentAttribute=None):
+        """Add an object under parent; a server or cluster gets a document of its own"""
+        names = dict([[item[0], item[1]] for item in attributes if not isNestedObject(item[1])])
+        document = parent.document
+        if configType in documentTypes:
+            directory, fileName = documentTypes[configType]
+            document = "%s/%s/%s|%s" % (parent.document.split("|")[0], directory, names.get("name", ""), fileName)
+        if parent.type in ["Cell", "Node"]:
+            # Top-level objects of a scope are not an attribute of it
+            parentAttribute = None
+        elif not parentAttribute:
+            parentAttribute = configType[:1].lower() + configType[1:]
+        configObject = self.add(RepositoryObject(configType, {}, parent, parentAttribute, document, self.newXmiId(configType)))
+        self.setAttributes(configObject, attributes)
+        return configObject
+
+    def remove(self, configObject):
+        """Remove an object and everything it contains"""
+        removed = [other for other in self.objects if other.isWithin(configObject)]
+        for other in removed:
+            self.objects.remove(other)
+            del self.index[other.getKey()]
+        if configObject.parent is not None:
+            configObject.parent.children.remove(configObject)
+
+    def cloneServer(self, template, node, serverName, clusterName):
+        """Create a server on node as a copy of the template server's document"""
+        document = "%s/servers/%s|server.xml" % (node.document.split("|")[0], serverName)
+        clones = {}
+        server = None
+        for configObject in self.objects[:]:
+            if configObject.document != template.document or not configObject.isWithin(template):
+                continue
+            parent = clones.get(id(configObject.parent), node)
+            clone = RepositoryObject(configObject.type, configObject.attributes.copy(), parent,
+                                     configObject.parentAttribute, document, self.newXmiId(configObject.type))
+            clones[id(configObject)] = self.add(clone)
+            if configObject is template:
+                server = clone
+        server.attributes.update({"name": serverName, "serverType": "APPLICATION_SERVER", "clusterName": clusterName})
+        return server
+
+    def formatValue(self, configObject, name, expand):
+        """Return one attribute in show form: a value, a config ID, or a list or expansion of child objects"""
+        children = configObject.getChildren(name)
+        if not children:
+            value = configObject.attributes.get(name, "")
+            if not value or [char for char in " []" if value.find(char) >= 0]:
+                return '"%s"' % value
+            return value
+        if expand:
+            values = ["[%s]" % " ".join(self.formatObject(child, True)) for child in children]
+        else:
+            values = [quoteID(child.getID()) for child in children]
+        if len(children) == 1 and name in singleReferences:
+            return values[0]
+        return "[%s]" % " ".join(values)
+
+    def formatObject(self, configObject, expand=False):
+        """Return the [name value] groups of AdminConfig.show, or of showall with expand"""
+        names = list(configObject.attributes.keys())
+        for child in configObject.children:
+            if child.parentAttribute and child.parentAttribute not in names:
+                names.append(child.parentAttribute)
+        names.sort()
+        return ["[%s %s]" % (name, self.formatValue(configObject, name, expand)) for name in names]
+
+class MockAdminConfig:
+    """AdminConfig backed by the repository"""
+    def __init__(self, environment):
+        self.environment = environment
+
+    def getid(self, containmentPath):
+        self.environment.call("AdminConfig.getid")
+        return "\n".join([quoteID(configObject.getID()) for configObject in self.environment.repository.resolvePath(containmentPath)])
+
+    def list(self, configType, scope=None):
+        self.environment.call("AdminConfig.list")
+        repository = self.environment.repository
+        if scope:
+            scope = repository.find(scope)
+        return "\n".join([quoteID(configObject.getID()) for configObject in repository.listObjects(configType, scope)])
+
+    def show(self, configID):
+        self.environment.call("AdminConfig.show")
+        return "\n".join(self.environment.repository.formatObject(self.environment.repository.find(configID)))
+
+    def showall(self, configID):
+        self.environment.call("AdminConfig.showall")
+        return "\n".join(self.environment.repository.formatObject(self.environment.repository.find(configID), True))
+
+    def showAttribute(self, configID, attribute):
+        self.environment.call("AdminConfig.showAttribute")
+        value = self.environment.repository.formatValue(self.environment.repository.find(configID), attribute, False)
+        if value.startswith('"'):
+            return value[1:-1]
+        return value
+
+    def modify(self, configID, attributes):
+        self.environment.call("AdminConfig.modify")
+        repository = self.environment.repository
+        configObject = repository.find(configID)
+        if envConfig.isString(attributes):
+            attributes = configCache.parseGroups(configCache.tokenize(attributes))
+        self.environment.lock.acquire()
+        try:
+            repository.touch()
+            repository.setAttributes(configObject, attributes)
+        finally:
+            self.environment.lock.release()
+        return ""
+
+    def create(self, configType, parent, attributes, parentAttribute=None):
+        self.environment.call("AdminConfig.create")
+        repository = self.environment.repository
+        if envConfig.isString(attributes):
+            attributes = configCache.parseGroups(configCache.tokenize(attributes))
+        parentObject = repository.find(parent)
+        self.environment.lock.acquire()
+        try:
+            repository.touch()
+            return quoteID(repository.create(configType, parentObject, attributes, parentAttribute).getID())
+        finally:
+            self.environment.lock.release()
+
+    def remove(self, configID):
+        self.environment.call("AdminConfig.remove")
+        repository = self.environment.repository
+        configObject = repository.find(configID)
+        self.environment.lock.acquire()
+        try:
+            repository.touch()
+            repository.remove(configObject)
+        finally:
+            self.environment.lock.release()
+        return ""
+
+    def hasChanges(self):
+        self.environment.call("AdminConfig.hasChanges")
+        if self.environment.repository.hasChanges():
+            return 1
+        return 0
+
+    def save(self):
+        self.environment.call("AdminConfig.save")
+        self.environment.repository.save()
+        return ""
+
+    def reset(self):
+        self.environment.call("AdminConfig.reset")
+        self.environment.repository.reset()
+        return ""
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.environment.getGenericCommand("AdminConfig", name)
+
+class MockAdminControl:
+    """AdminControl backed by the modelled state of the cell's processes"""
+    def __init__(self, environment):
+        self.environment = environment
+
+    def queryNames(self, pattern):
+        self.environment.call("AdminControl.queryNames")
+        return "\n".join([mbean[0] for mbean in self.environment.runtime.queryMBeans(pattern)])
+
+    def completeObjectName(self, pattern):
+        self.environment.call("AdminControl.completeObjectName")
+        mbeans = self.environment.runtime.queryMBeans(pattern)
+        if mbeans:
+            return mbeans[0][0]
+        return ""
+
+    def makeObjectName(self, name):
+        self.environment.call("AdminControl.makeObjectName")
+        return name
+
+    def getAttribute(self, objectName, attribute):
+        self.environment.call("AdminControl.getAttribute")
+        return self.environment.runtime.findMBean(objectName)[2].get(attribute, "")
+
+    def setAttribute(self, objectName, attribute, value):
+        self.environment.call("AdminControl.setAttribute")
+        self.environment.runtime.setAttribute(self.environment.runtime.findMBean(objectName), attribute, value)
+        return ""
+
+    def invoke(self, objectName, operation, arguments="", signature=None):
+        self.environment.call("AdminControl.invoke")
+        return self.environment.runtime.invoke(self.environment.runtime.findMBean(objectName), operation, arguments)
+
+    def startServer(self, serverName, nodeName, *arguments):
+        self.environment.call("AdminControl.startServer")
+        self.environment.runtime.setRunning(nodeName, serverName, True)
+        return ""
+
+    def stopServer(self, serverName, nodeName, *arguments):
+        self.environment.call("AdminControl.stopServer")
+        self.environment.runtime.setRunning(nodeName, serverName, False)
+        return ""
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.environment.getGenericCommand("AdminControl", name)
+
+class MockAdminTask:
+    """AdminTask: cluster members are created in the repository, other commands only mark the workspace changed"""
+    def __init__(self, environment):
+        self.environment = environment
+        self.userRegistries = []
+
+    def createClusterMember(self, arguments):
+        self.environment.call("AdminTask.createClusterMember")
+        repository = self.environment.repository
+        clusterName = getArgument(arguments, "-clusterName")
+        memberConfig = getArgument(arguments, "-memberConfig")
+        clusters = repository.resolvePath("/ServerCluster:%s/" % clusterName)
+        if not clusters:
+            raise Exception("ADMG9248E: Cluster %s does not exist" % clusterName)
+        nodeName = getArgument(memberConfig, "-memberNode")
+        serverName = getArgument(memberConfig, "-memberName")
+        nodes = repository.resolvePath("/Node:%s/" % nodeName)
+        if not nodes:
+            raise Exception("ADMG9219E: Node %s does not exist" % nodeName)
+        
+        # A member is a copy of an existing member, or for the first member of
+        # an application server standing in for the server template
+        members = repository.listObjects("ClusterMember", clusters[0])
+        templates = []
+        for member in members:
+            templates.extend(repository.resolvePath("/Node:%s/Server:%s/" % (member.attributes.get("nodeName"), member.attributes.get("memberName"))))
+        if not templates:
+            templates = [server for server in repository.listObjects("Server") if server.attributes.get("serverType") == "APPLICATION_SERVER"]
+        if not templates:
+            raise Exception("ADMG9220E: No server template to create %s from" % serverName)
+        
+        repository.touch()
+        repository.cloneServer(templates[0], nodes[0], serverName, clusterName)
+        member = repository.create("ClusterMember", clusters[0], [["memberName", serverName], ["nodeName", nodeName],
+                                   ["weight", getArgument(memberConfig, "-memberWeight", "2")]], "members")
+        return quoteID(member.getID())
+
+    def configureAdminLDAPUserRegistry(self, arguments):
+        self.environment.call("AdminTask.configureAdminLDAPUserRegistry")
+        self.environment.repository.touch()
+        if "LDAPUserRegistry" not in self.userRegistries:
+            self.userRegistries.append("LDAPUserRegistry")
+        return ""
+
+    def listUserRegistries(self, arguments=None):
+        self.environment.call("AdminTask.listUserRegistries")
+        return "\n".join(self.userRegistries)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.environment.getGenericCommand("AdminTask", name)
+
+class MockAdminApp:
+    """AdminApp: installed applications are Deployment objects in the repository"""
+    def __init__(self, environment):
+        self.environment = environment
+
+    def list(self, target=None):
+        self.environment.call("AdminApp.list")
+        return "\n".join([deployment.attributes.get("name", "") for deployment in self.environment.repository.listObjects("Deployment")])
+
+    def install(self, earFile, options=None):
+        self.environment.call("AdminApp.install")
+        repository = self.environment.repository
+        options = options or []
+        appName = getArgument(options, "-appname", os.path.splitext(os.path.basename(earFile))[0])
+        if repository.resolvePath("/Deployment:%s/" % appName):
+            raise Exception("ADMA5016E: Installation of %s failed: the application already exists" % appName)
+        
+        # Deployment targets as node/server pairs
+        targets = []
+        clusterName = getArgument(options, "-cluster")
+        if clusterName:
+            for member in repository.listObjects("ClusterMember"):
+                if member.parent.attributes.get("name") == clusterName:
+                    targets.append("%s/%s" % (member.attributes.get("nodeName"), member.attributes.get("memberName")))
+        else:
+            targets.append("%s/%s" % (getArgument(options, "-node", ""), getArgument(options, "-server", "server1")))
+        
+        repository.touch()
+        cell = repository.listObjects("Cell")[0]
+        document = "%s/applications/%s.ear/deployments/%s|deployment.xml" % (cell.document.split("|")[0], appName, appName)
+        deployment = RepositoryObject("Deployment", {"name": appName, "binariesURL": earFile, "targets": ",".join(targets)},
+                                      cell, None, document, repository.newXmiId("Deployment"))
+        repository.add(deployment)
+        return ""
+
+    def uninstall(self, appName, options=None):
+        self.environment.call("AdminApp.uninstall")
+        repository = self.environment.repository
+        deployments = repository.resolvePath("/Deployment:%s/" % appName)
+        if not deployments:
+            raise Exception("ADMA5106E: Application %s not found" % appName)
+        repository.touch()
+        repository.remove(deployments[0])
+        self.environment.runtime.stopApplication(appName)
+        return ""
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.environment.getGenericCommand("AdminApp", name)
+
+class RuntimeState:
+    """The processes of the cell and the MBeans they register"""
+    def __init__(self, environment):
+        self.environment = environment
+        self.states = {}           # (node, server) -> [running, simulated time it gets there]
+        self.startedApps = {}      # (application, node, server) -> 1
+        self.attributes = {}       # MBean object name -> {attribute: value} set with setAttribute
+        for server in environment.repository.listObjects("Server"):
+            self.states[(server.getNodeName(), server.attributes.get("name"))] = [True, 0]
+
+    def isRunning(self, node, server):
+        running, readyAt = self.states.get((node, server), [False, 0])
+        if self.environment.clock.time() >= readyAt:
+            return running
+        return not running
+
+    def setRunning(self, node, server, running, delay=0):
+        """Move a server towards running or stopped; its applications start with it"""
+        self.states[(node, server)] = [running, self.environment.clock.time() + delay]
+        for deployment in self.environment.repository.listObjects("Deployment"):
+            appName = deployment.attributes.get("name")
+            if "%s/%s" % (node, server) in deployment.attributes.get("targets", "").split(","):
+                if running:
+                    self.startedApps[(appName, node, server)] = 1
+                elif (appName, node, server) in self.startedApps:
+                    del self.startedApps[(appName, node, server)]
+
+    def stopApplication(self, appName):
+        for key in list(self.startedApps.keys()):
+            if key[0] == appName:
+                del self.startedApps[key]
+
+    def getMBeans(self):
+        """Return [object name, {key property: value}, {attribute: value}] for every registered MBean"""
+        repository = self.environment.repository
+        cellName = repository.listObjects("Cell")[0].attributes.get("name", "")
+        mbeans = []
+
+        def register(properties, attributes):
+            keys = [key for key in ["name", "cluster", "memberName", "process", "node", "type"] if key in properties]
+            objectName = "WebSphere:%s,cell=%s" % (",".join(["%s=%s" % (key, properties[key]) for key in keys]), cellName)
+            properties["cell"] = cellName
+            attributes.update(self.attributes.get(objectName, {}))
+            mbeans.append([objectName, properties, attributes])
+        
+        register({"name": "ClusterMgr", "process": "dmgr", "type": "ClusterMgr"}, {})
+        for cluster in repository.listObjects("ServerCluster"):
+            clusterName = cluster.attributes.get("name", "")
+            members = repository.listObjects("ClusterMember", cluster)
+            running = 0
+            for member in members:
+                nodeName, memberName = member.attributes.get("nodeName"), member.attributes.get("memberName")
+                state = "websphere.cluster.member.stopped"
+                if self.isRunning(nodeName, memberName):
+                    state = "websphere.cluster.member.started"
+                    running = running + 1
+                register({"name": memberName, "cluster": clusterName, "memberName": memberName, "node": nodeName,
+                          "process": "dmgr", "type": "ClusterMember"},
+                         {"memberName": memberName, "state": state, "weight": member.attributes.get("weight", "")})
+            state = "websphere.cluster.partial.start"
+            if running == len(members):
+                state = "websphere.cluster.running"
+            elif running == 0:
+                state = "websphere.cluster.stopped"
+            register({"name": clusterName, "process": "dmgr", "type": "Cluster"}, {"state": state})
+        
+        for server in repository.listObjects("Server"):
+            nodeName, serverName = server.getNodeName(), server.attributes.get("name")
+            if not self.isRunning(nodeName, serverName):
+                continue
+            process = {"process": serverName, "node": nodeName}
+            register(dict(process, name=serverName, type="Server"), {"name": serverName, "state": "STARTED"})
+            serverType = server.attributes.get("serverType")
+            if serverType == "NODE_AGENT":
+                register(dict(process, name="nodeSync", type="NodeSync"), {"nodeName": nodeName})
+            elif serverType == "APPLICATION_SERVER":
+                register(dict(process, name="ApplicationManager", type="ApplicationManager"), {})
+                register(dict(process, name="PMIService", type="PMIService"), {})
+                register(dict(process, name="WebContainer", type="ThreadPool"),
+                         {"stats": "Stats name=WebContainer, type=threadPoolModule\n{name=ActiveCount, ID=3, unit=N/A, type=BoundedRangeStatistic, current=0}"})
+                for appName, appNode, appServer in self.startedApps.keys():
+                    if appNode == nodeName and appServer == serverName:
+                        register(dict(process, name=appName, type="Application"), {"name": appName})
+        return mbeans
+
+    def queryMBeans(self, pattern):
+        """Return the MBeans whose key properties match a pattern such as type=NodeSync,node=Node01,*"""
+        if pattern.find(":") >= 0:
+            pattern = pattern.split(":", 1)[1]
+        wanted = [item.split("=", 1) for item in pattern.split(",") if item.find("=") > 0]
+        matches = []
+        for mbean in self.getMBeans():
+            if len([1 for key, value in wanted if mbean[1].get(key) != value]) == 0:
+                matches.append(mbean)
+        return matches
+
+    def findMBean(self, objectName):
+        mbeans = self.queryMBeans(objectName)
+        if not mbeans:
+            raise Exception("javax.management.InstanceNotFoundException: %s" % objectName)
+        return mbeans[0]
+
+    def setAttribute(self, mbean, attribute, value):
+        self.attributes.setdefault(mbean[0], {})[attribute] = value
+
+    def invoke(self, mbean, operation, arguments):
+        """Run an MBean operation; those that change the cell's state are modelled"""
+        properties = mbean[1]
+        mbeanType = properties.get("type")
+        if mbeanType == "ClusterMgr" and operation in ["startCluster", "stopCluster"]:
+            # Members get there in the background; the caller polls their state
+            running = operation == "startCluster"
+            for cluster in self.environment.repository.resolvePath("/ServerCluster:%s/" % str(arguments).strip("[]")):
+                for member in self.environment.repository.listObjects("ClusterMember", cluster):
+                    nodeName, memberName = member.attributes.get("nodeName"), member.attributes.get("memberName")
+                    if self.isRunning(nodeName, memberName) != running:
+                        delay = memberStopTime
+                        if running:
+                            delay = memberStartTime
+                        self.setRunning(nodeName, memberName, running, delay)
+            return ""
+        if mbeanType == "NodeSync" and operation in ["sync", "isNodeSynchronized"]:
+            return "true"
+        if mbeanType == "ApplicationManager" and operation == "startApplication":
+            self.startedApps[(str(arguments).strip("[]"), properties["node"], properties["process"])] = 1
+            return ""
+        if mbeanType == "ApplicationManager" and operation == "stopApplication":
+            key = (str(arguments).strip("[]"), properties["node"], properties["process"])
+            if key in self.startedApps:
+                del self.startedApps[key]
+            return ""
+        return ""
+
+class WsadminEnvironment:
+    """The four scripting objects over one repository, with call counts and injected latency"""
+    def __init__(self, repository, cell=None, latency=None, sleep=False):
+        self.clock = SimulatedClock()
+        self.latency = parseLatency(latency or defaultLatency)
+        self.sleep = sleep
+        self.lock = threading.RLock()
+        self.counts = {}        # "AdminConfig.show" -> calls
+        self.adminTime = 0.0    # Seconds of injected latency
+        self.repository = ConfigRepository(configAnalyzer.findCellDir(repository, cell))
+        self.runtime = RuntimeState(self)
+        self.AdminConfig = MockAdminConfig(self)
+        self.AdminControl = MockAdminControl(self)
+        self.AdminTask = MockAdminTask(self)
+        self.AdminApp = MockAdminApp(self)
+
+    def getLatency(self, name):
+        """Return the latency of a call in seconds: its method's, else its object's, else the default (*)"""
+        for key in [name, name.split(".")[0], "*"]:
+            if key in self.latency:
+                return self.latency[key] / 1000.0
+        return 0.0
+
+    def call(self, name):
+        """Count a call and charge its latency"""
+        latency = self.getLatency(name)
+        self.lock.acquire()
+        try:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            self.adminTime = self.adminTime + latency
+        finally:
+            self.lock.release()
+        if self.sleep:
+            time.sleep(latency)
+        else:
+            self.clock.advance(latency)
+
+    def getGenericCommand(self, objectName, command):
+        """Return a stand-in for a command that is only counted; one that is not read-only changes the workspace"""
+        name = "%s.%s" % (objectName, command)
+
+        def run(*arguments):
+            self.call(name)
+            if objectName != "AdminControl" and not [prefix for prefix in readOnlyPrefixes if command.startswith(prefix)]:
+                self.repository.touch()
+            return ""
+        return run
+
+    def bind(self, namespace):
+        """Put the scripting objects into a script's global namespace, and stand in for the Java classes it imports"""
+        stubJavaClasses()
+        for name in adminObjects:
+            namespace[name] = getattr(self, name)
+
+    def resetCounts(self):
+        """Start counting calls and time afresh, e.g. after the set-up for a measured run"""
+        self.lock.acquire()
+        try:
+            self.counts = {}
+            self.adminTime = 0.0
+            self.clock.restart()
+        finally:
+            self.lock.release()
+
+    def getCallCounts(self, objectName=None):
+        """Return {call: count}, or the total for one scripting object"""
+        if objectName is None:
+            return self.counts.copy()
+        return sum([count for name, count in self.counts.items() if name.split(".")[0] == objectName])